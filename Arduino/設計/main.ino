@@ -38,6 +38,18 @@ struct {
 #define MAX_DATA_LENGTH 32
 // SDカード関連
 char dataFileName[13];
+File logFile;                     // バイナリログは開いたまま書き続ける
+unsigned long timeLastFlushMs;
+#define LOG_MODE_BINARY 4
+#define LOG_FLUSH_INTERVAL_MS 1000  // 電源断で失うのは最大この間の記録
+// センシングモードの周期（バルブ制御と GPS の受信は毎ループ）
+#define DEPTH_INTERVAL_MS     100   // 水圧・内圧の読み取りと加圧制御
+#define TEMP_INTERVAL_MS      1000  // DS18B20 の変換（12 bit で 750 ms）を待たずに次を要求
+#define RTC_INTERVAL_MS       1000
+#define LCD_INTERVAL_MS       500
+#define TEXT_LOG_INTERVAL_MS  1000  // logMode 0-3（バルブ操作時はすぐ書く）
+#define BINARY_LOG_INTERVAL_MS DEPTH_INTERVAL_MS
+#define GPS_TIME_SYNC_INTERVAL_MS 10000
 // 水の密度設定
 #define FLUID_DENSITY 997
 
@@ -54,6 +66,8 @@ char dataFileName[13];
 #define PIN_IR_REMOTE     14
 
 SoftwareSerial gpsSerial(3, 2);
+OneWire oneWire(PIN_ONEWIRE);
+DallasTemperature tempSensor(&oneWire);
 TinyGPSPlus gps;
 MS5837 DepthSensor;
 RTC_RX8025NB rtc;
@@ -74,6 +88,28 @@ uint16_t gpsAltitude;
 uint8_t gpsSatellites;
 float gpsLat, gpsLng;
 
+//============================================================
+// バイナリログ（logMode 4）の 1 記録。ファイル先頭の 1 行に並びを書く
+// （PC_App/logparser.py がこの行から読み方を決めるので、変えるときは両方を揃える）
+#define LOG_BINARY_HEADER "TRLB,1,49,time_ms:u4,rtc_year:u2,rtc_month:u1,rtc_day:u1,rtc_hour:u1,rtc_minute:u1,rtc_second:u1," \
+  "LAT:f4,LNG:f4,SATNUM:u1,ALT:u2,PIN_RAW:u2,PIN_MBAR:f4,POUT:f4,POUT_DEPTH:f4,POUT_TMP:f4,TMP:f4," \
+  "VCTRL_STATE:i1,MOV_STATE:i1,DIVE_COUNT:u2,FLAGS:u1\n"
+// FLAGS: bit0 V1SUP, bit1 V2EXH, bit2 V3PRS, bit3 バルブ操作あり（テキストの CTRL 行に相当）
+struct __attribute__((packed)) LogRecord {
+  uint32_t timeMs;
+  uint16_t year;
+  uint8_t  month, day, hour, minute, second;
+  float    lat, lng;
+  uint8_t  satellites;
+  uint16_t altitude;
+  uint16_t prsInternalRaw;
+  float    prsInternalMbar, prsExternal, prsExternalDepth, prsExternalTmp, temp;
+  int8_t   valveCtrlState, movementState;
+  uint16_t divedCount;
+  uint8_t  flags;
+};
+static_assert(sizeof(LogRecord) == 49, "LOG_BINARY_HEADER と合わせる");
+
 //============================================================
 // RTC変数
 uint16_t rtcYear;
@@ -88,6 +124,28 @@ int8_t valveCtrlState = 0;
 int8_t movementState;
 unsigned int divedCount = 0;
 bool isSensingMode = false;
+bool isLcdValveUpdate;  // handleSDcard() が isControllingValve を下ろしても LCD に伝える
+unsigned long timeLastLogMs, timeLastTimeSyncMs;
+
+//============================================================
+// 周期タスク（1 ループで実行するのは期限の来た 1 つだけ）
+struct Task {
+  void (*run)();
+  unsigned long periodMs;
+  unsigned long lastMs;
+};
+void readDepthAndPressurize();
+void readTemperature();
+void readRTC();
+void handleLcdDisp();
+Task tasks[] = {
+  {readDepthAndPressurize, DEPTH_INTERVAL_MS, 0},
+  {readTemperature,        TEMP_INTERVAL_MS,  0},
+  {readRTC,                RTC_INTERVAL_MS,   0},
+  {handleLcdDisp,          LCD_INTERVAL_MS,   0},
+};
+#define TASK_COUNT (sizeof(tasks) / sizeof(tasks[0]))
+uint8_t nextTask = 0;
 
 //============================================================
 // 準備処理
@@ -114,6 +172,11 @@ void setup() {
   DepthSensor.setModel(MS5837::MS5837_30BA);
   DepthSensor.setFluidDensity(FLUID_DENSITY);
 
+  // 水温センサ：変換完了を待たずに戻り、readTemperature() で結果を取る
+  tempSensor.begin();
+  tempSensor.setWaitForConversion(false);
+  tempSensor.requestTemperatures();
+
   pinMode(PIN_LED_GREEN, OUTPUT);
   pinMode(PIN_LED_RED, OUTPUT);
   pinMode(PIN_VALVE1_SUPPLY, OUTPUT);
@@ -128,6 +191,7 @@ void setup() {
   }
 
   readEEPROM();
+  readRTC();
   timeLastControlMs = millis();
 
   lcd.clear();
@@ -162,46 +226,55 @@ void loop() {
   if (isSensingMode) {
     digitalWrite(PIN_LED_GREEN, HIGH);
     digitalWrite(PIN_LED_RED, LOW);
+    if (!gpsSerial.isListening()) gpsSerial.begin(9600);
 
-    // センサデータ取得
-    DepthSensor.read();
-    prsExternal = DepthSensor.pressure();
-    prsExternalDepth = DepthSensor.depth();
-    prsExternalTmp = DepthSensor.temperature();
-
-    prsInternalRaw = analogRead(PIN_IN_PRESSURE);
-    float v = prsInternalRaw * 0.00488 - 0.25; // /1024*5を最適化
-    prsInternalMbar = v * 6.667; // /4.5*30を最適化
-    float prsDiff = (prsInternalMbar * 68.94 + 1013.25) - prsExternal;
-    // 加圧制御
-    if (prsDiff+cfg.inPressThresh < 0) {
-      digitalWrite(PIN_VALVE3_PRESS, HIGH);
-      isValve3PressOpen = true;
-      isControllingValve = true;
-      movementState = 3;
-      delay(100);
-    } else {
-      digitalWrite(PIN_VALVE3_PRESS, LOW);
-      isValve3PressOpen = false;
-    }
-    
+    // 毎ループ：GPS の受信済みバイトの解析とバルブ制御
     getGPSData();
-    getTemperatureData();
     ctrlValve();
-    handleLcdDisp();
-    handleSDcard();
+    runNextTask();
+    if (isControllingValve) isLcdValveUpdate = true;
+
+    // ログはバルブ操作があればすぐ、なければ周期で書く
+    unsigned long logIntervalMs = cfg.logMode == LOG_MODE_BINARY ? BINARY_LOG_INTERVAL_MS : TEXT_LOG_INTERVAL_MS;
+    if (isControllingValve || timeNowMs - timeLastLogMs >= logIntervalMs) {
+      timeLastLogMs = timeNowMs;
+      getGPSData();  // タスク（水圧の読み取りは約 40 ms）の間に溜まった分を SD の書き込み前に空ける
+      handleSDcard();
+      isControllingValve = false;  // logMode 2/3 は CTRL 行を書かないのでここで下ろす
+    }
   } else {
     digitalWrite(PIN_LED_GREEN, LOW);
     digitalWrite(PIN_LED_RED, HIGH);
+    gpsSerial.end();  // 待機中は SoftwareSerial の割り込みを止める
+    closeLogFile();
     handleEEPROMSerial();
   }
 }
 
+// 期限の来たタスクを 1 つだけ実行する（バルブ制御の間隔を最長のタスク 1 つ分に抑える）
+void runNextTask() {
+  for (uint8_t i = 0; i < TASK_COUNT; i++) {
+    Task &task = tasks[nextTask];
+    nextTask = (nextTask + 1) % TASK_COUNT;
+    if (timeNowMs - task.lastMs >= task.periodMs) {
+      task.lastMs = timeNowMs;
+      task.run();
+      return;
+    }
+  }
+}
+
 //============================================================
 // EEPROM関連（簡略化）
 void handleEEPROMSerial() {
   if (Serial.available() > 0) {
     String data = Serial.readStringUntil('\n');
+    data.trim();
+    // 読み出しコマンド：保存済みフレームを返すだけで RTC・設定・EEPROM には触れない
+    if (data == "R") {
+      dumpEEPROM();
+      return;
+    }
     Serial.print("Recieved: ");
     Serial.println(data);
     writeEEPROM(data);
@@ -226,33 +299,60 @@ bool writeEEPROM(String &str) {
 
   decodeData(buf);
 
-  EEPROM.write(0, 0xAA);
-  EEPROM.write(1, len);
+  // 同じ設定の再送では書き換えないようにして EEPROM の消耗を防ぐ
+  EEPROM.update(0, 0xAA);
+  EEPROM.update(1, len);
   for (uint8_t i = 0; i < len; i++) {
-    EEPROM.write(i + 2, buf[i]);
+    EEPROM.update(i + 2, buf[i]);
   }
   return true;
 }
 
-bool readEEPROM() {
+// 保存済みフレームを buf に読み出す。検査に通らなければ 0 を返す
+uint8_t loadEEPROMFrame(uint8_t* buf) {
   uint8_t len = EEPROM.read(1);
-  if (EEPROM.read(2) != 0x24) return false;
+  if (len > MAX_DATA_LENGTH || len < 3) return 0;
+  if (EEPROM.read(2) != 0x24) return 0;
 
-  uint8_t buf[len];
   for (uint8_t i = 0; i < len; i++) {
     buf[i] = EEPROM.read(i+2);
   }
 
-  if (buf[len-1] != 0x3B) return false;
+  if (buf[len-1] != 0x3B) return 0;
 
   uint8_t sum = 0;
   for (uint8_t i = 0; i <= len-3; i++) sum += buf[i];
-  if ((sum & 0xFF) != buf[len-2]) return false;
+  if ((sum & 0xFF) != buf[len-2]) return 0;
+
+  return len;
+}
+
+bool readEEPROM() {
+  uint8_t buf[MAX_DATA_LENGTH];
+  if (loadEEPROMFrame(buf) == 0) return false;
 
   decodeData(buf);
   return true;
 }
 
+// 保存済みフレームを送信時と同じ16進文字列で返す（例: "Stored: 2419...3B"、無効なら "Stored: NONE"）
+void dumpEEPROM() {
+  uint8_t buf[MAX_DATA_LENGTH];
+  uint8_t len = loadEEPROMFrame(buf);
+
+  Serial.print(F("Stored: "));
+  if (len == 0) {
+    Serial.println(F("NONE"));
+    return;
+  }
+  char hex[3];
+  for (uint8_t i = 0; i < len; i++) {
+    sprintf(hex, "%02X", buf[i]);
+    Serial.print(hex);
+  }
+  Serial.println();
+}
+
 void decodeData(const uint8_t* d) {
   uint16_t yr = 2000 + d[1];
   uint8_t mo = d[2], dy = d[3], hr = d[4], mn = d[5], sc = d[6];
@@ -285,40 +385,75 @@ void decodeData(const uint8_t* d) {
   Serial.print("Dive Cnt : "); Serial.println(cfg.diveCount);
   Serial.print("Thresh   : "); Serial.println(cfg.inPressThresh);
 
-  sprintf(dataFileName, "%02d%02d_%02d.csv", mo, dy, hr);
+  sprintf(dataFileName, cfg.logMode == LOG_MODE_BINARY ? "%02d%02d_%02d.bin" : "%02d%02d_%02d.csv", mo, dy, hr);
 }
 
 //============================================================
 // センシング関連
-void getTemperatureData() {
-  OneWire ow(PIN_ONEWIRE);
-  DallasTemperature s(&ow);
-  s.begin();
-  s.requestTemperatures();
-  noramlTemp = s.getTempCByIndex(0);
+// 水圧・内圧を読み、内圧が足りなければ加圧バルブを開く。
+// 次の読み取りまで DEPTH_INTERVAL_MS は開いたままになる（以前の delay(100) の代わり）
+void readDepthAndPressurize() {
+  DepthSensor.read();
+  prsExternal = DepthSensor.pressure();
+  prsExternalDepth = DepthSensor.depth();
+  prsExternalTmp = DepthSensor.temperature();
+
+  prsInternalRaw = analogRead(PIN_IN_PRESSURE);
+  float v = prsInternalRaw * 0.00488 - 0.25; // /1024*5を最適化
+  prsInternalMbar = v * 6.667; // /4.5*30を最適化
+  float prsDiff = (prsInternalMbar * 68.94 + 1013.25) - prsExternal;
+  // 加圧制御
+  if (prsDiff+cfg.inPressThresh < 0) {
+    digitalWrite(PIN_VALVE3_PRESS, HIGH);
+    isValve3PressOpen = true;
+    isControllingValve = true;
+    movementState = 3;
+  } else {
+    digitalWrite(PIN_VALVE3_PRESS, LOW);
+    isValve3PressOpen = false;
+  }
 }
 
+void readTemperature() {
+  if (!tempSensor.isConversionComplete()) return;
+  noramlTemp = tempSensor.getTempCByIndex(0);
+  tempSensor.requestTemperatures();
+}
+
+// 受信済みのバイトだけを解析して戻る（待たない）
+// SoftwareSerial の受信バッファは 64 バイトで、9600 baud（960 バイト/秒）では約 66 ms で溢れる。
+// 呼び出しの間に入る処理を 1 つずつに分けて、どれも 66 ms に収める：
+//   周期タスク 1 つ（最長は readDepthAndPressurize() の MS5837 の変換 2 回で約 40 ms）
+//   SD の書き込み 1 回（テキストは open/println/close、バイナリは 1 秒ごとの flush。通常 10-30 ms。
+//   テキストの CTRL 行と DATA 行の間でも呼ぶ）
+// カードの内部処理（消去など）で書き込みが 66 ms を超えたときはその間の NMEA 文が欠けるが、
+// TinyGPSPlus はチェックサムの合わない文を捨てるだけなので、次の文から位置の更新は続く。
 void getGPSData() {
-  gpsSerial.begin(9600);
-  
-  unsigned long st = millis();
-  while ((millis() - st) < 1000) {
-    while (gpsSerial.available()) {
-      if (gps.encode(gpsSerial.read())) {
-        if (gps.location.isUpdated()) {
-          gpsLat = gps.location.lat();
-          gpsLng = gps.location.lng();
-          gpsAltitude = gps.altitude.meters();
-          gpsSatellites = gps.satellites.value();
-        }
-        if (gps.time.isValid() && gps.date.isValid()) {
-          correctTime();
-          break;
-        }
+  while (gpsSerial.available()) {
+    if (gps.encode(gpsSerial.read())) {
+      if (gps.location.isUpdated()) {
+        gpsLat = gps.location.lat();
+        gpsLng = gps.location.lng();
+        gpsAltitude = gps.altitude.meters();
+        gpsSatellites = gps.satellites.value();
+      }
+      if (gps.time.isUpdated() && gps.date.isValid()
+          && timeNowMs - timeLastTimeSyncMs >= GPS_TIME_SYNC_INTERVAL_MS) {
+        timeLastTimeSyncMs = timeNowMs;
+        correctTime();
       }
     }
   }
-  gpsSerial.end();
+}
+
+void readRTC() {
+  tmElements_t tm = rtc.read();
+  rtcYear = tmYearToCalendar(tm.Year);
+  rtcMonth = tm.Month;
+  rtcDay = tm.Day;
+  rtcHour = tm.Hour;
+  rtcMinute = tm.Minute;
+  rtcSecond = tm.Second;
 }
 
 void correctTime() {
@@ -342,14 +477,7 @@ void correctTime() {
   if (m > 12) { m = 1; y++; }
 
   rtc.setDateTime(y, m, d, h, mn, s);
-  
-  tmElements_t tm = rtc.read();
-  rtcYear = tmYearToCalendar(tm.Year);
-  rtcMonth = tm.Month;
-  rtcDay = tm.Day;
-  rtcHour = tm.Hour;
-  rtcMinute = tm.Minute;
-  rtcSecond = tm.Second;
+  readRTC();
 }
 
 //============================================================
@@ -407,6 +535,8 @@ void ctrlValve() {
 //============================================================
 // SDカード保存関連
 bool handleSDcard() {
+  if (cfg.logMode == LOG_MODE_BINARY) return writeBinaryLog();
+
   char buf[256];
   
   if (isControllingValve && cfg.logMode != 2 && cfg.logMode != 3) {
@@ -421,6 +551,7 @@ bool handleSDcard() {
       f.close();
     }
     isControllingValve = false;
+    getGPSData();  // DATA 行の open/close の前に受信バッファを空ける
   }
   
   // データログ
@@ -449,10 +580,58 @@ bool handleSDcard() {
   return false;
 }
 
+// 1 ループ 1 記録の固定長バイナリ。ファイルは開いたままにし、
+// 書き込みは SD ライブラリのブロックバッファに溜めて一定間隔で flush する
+bool writeBinaryLog() {
+  if (!logFile) {
+    logFile = SD.open(dataFileName, FILE_WRITE);
+    if (!logFile) return false;
+    if (logFile.size() == 0) logFile.print(F(LOG_BINARY_HEADER));
+    timeLastFlushMs = timeNowMs;
+  }
+
+  LogRecord rec;
+  rec.timeMs = timeNowMs;
+  rec.year = rtcYear;
+  rec.month = rtcMonth;
+  rec.day = rtcDay;
+  rec.hour = rtcHour;
+  rec.minute = rtcMinute;
+  rec.second = rtcSecond;
+  rec.lat = gpsLat;
+  rec.lng = gpsLng;
+  rec.satellites = gpsSatellites;
+  rec.altitude = gpsAltitude;
+  rec.prsInternalRaw = prsInternalRaw;
+  rec.prsInternalMbar = prsInternalMbar;
+  rec.prsExternal = prsExternal;
+  rec.prsExternalDepth = prsExternalDepth;
+  rec.prsExternalTmp = prsExternalTmp;
+  rec.temp = noramlTemp;
+  rec.valveCtrlState = valveCtrlState;
+  rec.movementState = movementState;
+  rec.divedCount = divedCount;
+  rec.flags = isValve1SupplyOpen | isValve2ExhaustOpen << 1 | isValve3PressOpen << 2 | isControllingValve << 3;
+  isControllingValve = false;
+
+  bool ok = logFile.write((const uint8_t*)&rec, sizeof(rec)) == sizeof(rec);
+  if (timeNowMs - timeLastFlushMs >= LOG_FLUSH_INTERVAL_MS) {
+    logFile.flush();
+    timeLastFlushMs = timeNowMs;
+  }
+  return ok;
+}
+
+// 待機モードに戻ったら閉じる（閉じるまでの記録も flush される）
+void closeLogFile() {
+  if (logFile) logFile.close();
+}
+
 //============================================================
 // LCD表示関数
 void handleLcdDisp() {
-  if (isControllingValve && cfg.lcdMode == 1) {
+  if (isLcdValveUpdate && cfg.lcdMode == 1) {
+    isLcdValveUpdate = false;
     lcd.clear();
     lcd.print(F("V_CTRL:"));
     lcd.print(movementState==1?F("UP"):movementState==2?F("DOWN"):movementState==3?F("PRESS"):F("UNDEF"));
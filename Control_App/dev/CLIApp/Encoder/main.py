@@ -71,31 +71,32 @@ def get_valid_input(prompt, max_value):
         except ValueError:
             print("Error: Invalid input. Please enter an integer.")
 
-# 現在時刻を取得
-dt_now = datetime.datetime.now()
-
-# ユーザーに入力を求める
-sup_start = get_valid_input("Enter sup_start: ", 65535)
-sup_stop = get_valid_input("Enter sup_stop: ", 65535)
-exh_start = get_valid_input("Enter exh_start: ", 65535)
-exh_stop = get_valid_input("Enter exh_stop: ", 65535)
-lcd_mode = get_valid_input("Enter lcd_mode: ", 15)
-log_mode = get_valid_input("Enter log_mode: ", 15)
-
-# データをエンコード
-data_string = encode_data(
-    year=dt_now.year,
-    month=dt_now.month,
-    day=dt_now.day,
-    hour=dt_now.hour,
-    minute=dt_now.minute,
-    second=dt_now.second,
-    sup_start=sup_start,
-    sup_stop=sup_stop,
-    exh_start=exh_start,
-    exh_stop=exh_stop,
-    lcd_mode=lcd_mode,
-    log_mode=log_mode
-)
-
-print(data_string)
\ No newline at end of file
+if __name__ == "__main__":
+    # 現在時刻を取得
+    dt_now = datetime.datetime.now()
+
+    # ユーザーに入力を求める
+    sup_start = get_valid_input("Enter sup_start: ", 65535)
+    sup_stop = get_valid_input("Enter sup_stop: ", 65535)
+    exh_start = get_valid_input("Enter exh_start: ", 65535)
+    exh_stop = get_valid_input("Enter exh_stop: ", 65535)
+    lcd_mode = get_valid_input("Enter lcd_mode: ", 15)
+    log_mode = get_valid_input("Enter log_mode: ", 15)
+
+    # データをエンコード
+    data_string = encode_data(
+        year=dt_now.year,
+        month=dt_now.month,
+        day=dt_now.day,
+        hour=dt_now.hour,
+        minute=dt_now.minute,
+        second=dt_now.second,
+        sup_start=sup_start,
+        sup_stop=sup_stop,
+        exh_start=exh_start,
+        exh_stop=exh_stop,
+        lcd_mode=lcd_mode,
+        log_mode=log_mode
+    )
+
+    print(data_string)
\ No newline at end of file
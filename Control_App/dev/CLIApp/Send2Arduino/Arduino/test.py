@@ -21,12 +21,13 @@ def get_arduino_ports():
 
     return arduino_ports
 
-# Arduinoが接続されているCOMポートを取得
-arduino_ports = get_arduino_ports()
+if __name__ == "__main__":
+    # Arduinoが接続されているCOMポートを取得
+    arduino_ports = get_arduino_ports()
 
-if arduino_ports:
-    print("Arduinoが接続されているポート:")
-    for port in arduino_ports:
-        print(get_device_description(port))
-else:
-    print("Arduinoが接続されているポートは見つかりませんでした。")
+    if arduino_ports:
+        print("Arduinoが接続されているポート:")
+        for port in arduino_ports:
+            print(get_device_description(port))
+    else:
+        print("Arduinoが接続されているポートは見つかりませんでした。")
@@ -9,7 +9,7 @@ import serial
 import time
 import datetime
 import serial.tools.list_ports
-from utils import encode_data, get_valid_input, select_serial_port, triton_logo
+from utils import encode_data, expected_echo, get_valid_input, select_serial_port, send_with_ack, triton_logo
 
 if __name__ == '__main__':
     triton_logo()
@@ -22,7 +22,7 @@ if __name__ == '__main__':
 
         try:
             # シリアルポートの設定
-            ser = serial.Serial(com_port, 9600)  # 選択されたCOMポートを使用
+            ser = serial.Serial(com_port, 9600, timeout=0.5)  # 選択されたCOMポートを使用
 
             # シリアルポートが開くまで待機
             while not ser.is_open:
@@ -43,6 +43,8 @@ if __name__ == '__main__':
     exh_stop = get_valid_input("Enter exh_stop: ", 65535)
     lcd_mode = get_valid_input("Enter lcd_mode: ", 15)
     log_mode = get_valid_input("Enter log_mode: ", 15)
+    dive_count = get_valid_input("Enter dive_count (0 = unlimited): ", 255)
+    press_threshold = get_valid_input("Enter press_threshold: ", 255)
 
     # データをエンコード
     data_string = encode_data(
@@ -57,25 +59,20 @@ if __name__ == '__main__':
         exh_start=exh_start,
         exh_stop=exh_stop,
         lcd_mode=lcd_mode,
-        log_mode=log_mode
+        log_mode=log_mode,
+        dive_count=dive_count,
+        press_threshold=press_threshold
     )
 
     print(data_string)
 
-    # 送信するデータ
-    data = data_string
-
-    # データを送信
-    ser.write(data.encode())
-    print(f"Data sent to {com_port}")
-
-    # データを受信し続ける
-    while True:
-        if ser.in_waiting > 0:
-            received_data = ser.readline().decode().strip()
-            print(f"Received: {received_data}")
-            if "Checksum valid: true" in received_data:
-                print("Checksum valid. Closing connection...")
-                break
+    # データを送信し，ボードが同じ値を返すまで送り直す
+    attempts = send_with_ack(ser, data_string, expected_echo(sup_start, sup_stop, exh_start, exh_stop, lcd_mode, log_mode, dive_count, press_threshold))
+    for attempt in attempts:
+        print(f"Attempt {attempt['attempt']}: {attempt['status']} ({attempt['rtt_s'] * 1000:.0f} ms)")
+    if attempts[-1]["status"] == "ok":
+        print("Config acknowledged. Closing connection...")
+    else:
+        print("Error: The board did not acknowledge the config. Is it in idle mode (red LED)?")
     ser.close()
-    time.sleep(3)
\ No newline at end of file
+    time.sleep(3)
@@ -5,7 +5,7 @@
 # @brief Triton-Lite用のCLIアプリの関数類 for Windows
 """
 
-import serial.tools.list_ports
+import time
 
 def calculate_checksum(data_bytes):
     """
@@ -15,9 +15,12 @@ def calculate_checksum(data_bytes):
     """
     return sum(data_bytes) & 0xFF
 
-def encode_data(year, month, day, hour, minute, second, sup_start, sup_stop, exh_start, exh_stop, lcd_mode, log_mode):
+def encode_data(year, month, day, hour, minute, second, sup_start, sup_stop, exh_start, exh_stop, lcd_mode, log_mode,
+                dive_count, press_threshold):
     """
-    @brief データをエンコードして送信可能な形式に変換
+    @brief データをエンコードして送信可能な形式に変換（本番ファームウェア main.ino の 20 Byte のフレーム）
+           18 Byte の旧フレームも受け付けられてしまうが，decodeData() はチェックサムとフッターを
+           diveCount と inPressThresh として読むので送ってはいけない
     @param year 年
     @param month 月
     @param day 日
@@ -30,6 +33,8 @@ def encode_data(year, month, day, hour, minute, second, sup_start, sup_stop, exh
     @param exh_stop exh_stop値
     @param lcd_mode lcd_mode値
     @param log_mode log_mode値
+    @param dive_count dive_count値（0 で無制限）
+    @param press_threshold press_threshold値
     @return エンコードされたデータの16進文字列
     """
     # HEADER
@@ -61,6 +66,8 @@ def encode_data(year, month, day, hour, minute, second, sup_start, sup_stop, exh
         *exh_start_bytes,
         *exh_stop_bytes,
         mode_byte,
+        dive_count & 0xFF,
+        press_threshold & 0xFF,
     ]
 
     # Calculate checksum
@@ -77,6 +84,72 @@ def encode_data(year, month, day, hour, minute, second, sup_start, sup_stop, exh
     hex_string = ''.join(f'{byte:02X}' for byte in data_bytes)
     return f'{hex_string}'
 
+def expected_echo(sup_start, sup_stop, exh_start, exh_stop, lcd_mode, log_mode, dive_count, press_threshold):
+    """
+    @brief 本番ファームウェアの decodeData() が表示するはずの値
+    @return {表示の見出し: 値の文字列}
+    """
+    def as_uint32(value):
+        # d[7] << 8 などは 16 bit の int で計算されるので，0x8000 以上は符号拡張される
+        if value & 0x8000:
+            value -= 0x10000
+        return value & 0xFFFFFFFF
+
+    return {
+        "Sup Start": str(as_uint32(as_uint32(sup_start) * 1000)),
+        "Sup Stop": str(as_uint32(sup_stop)),
+        "Exh Start": str(as_uint32(as_uint32(exh_start) * 1000)),
+        "Exh Stop": str(as_uint32(exh_stop)),
+        "LCD Mode": str(lcd_mode),
+        "Log Mode": str(log_mode),
+        "Dive Cnt": str(dive_count),
+        "Thresh": str(press_threshold),
+    }
+
+def send_with_ack(ser, data_string, expected, deadline=15.0, attempt_timeout=3.0, backoff=0.5):
+    """
+    @brief データを送り，ボードの返事を確かめる．返事が無い・値が違う場合は待ち時間を倍々に延ばして送り直す
+           本番ファームウェアは "Recieved: <データ>" の後に decodeData() の表示（最後は "Thresh"）を返す．
+           古い試験用ファームウェア（virtual_serial.py など）の "Checksum valid: true" も受け付ける
+    @param ser シリアルポート（timeout を設定しておく）
+    @param data_string 送る16進文字列
+    @param expected expected_echo() の値．表示された値と比べる
+    @param deadline 全体の期限 [s]
+    @param attempt_timeout 1 回の送信で返事を待つ時間 [s]
+    @param backoff 最初の送り直しまでの待ち時間 [s]
+    @return 試行ごとの記録 {"attempt", "status", "rtt_s"} のリスト（最後が "ok"）
+    """
+    attempts = []
+    end = time.monotonic() + deadline
+    while True:
+        started = time.monotonic()
+        ser.write((data_string + "\n").encode())
+        status, echoed = "timeout", {}
+        limit = min(started + attempt_timeout, end)
+        while time.monotonic() < limit:
+            line = ser.readline().decode(errors="replace").strip()
+            if not line:
+                continue
+            print(f"Received: {line}")
+            if "Checksum valid: true" in line:
+                status = "ok"
+                break
+            if line.startswith("Recieved: ") and line[len("Recieved: "):] != data_string:
+                status = "mismatch"
+                break
+            label, _, value = line.partition(":")
+            echoed[label.strip()] = value.strip()
+            if line.startswith("Thresh"):
+                status = "ok" if all(echoed.get(k) == v for k, v in expected.items()) else "mismatch"
+                break
+        attempts.append({"attempt": len(attempts) + 1, "status": status, "rtt_s": time.monotonic() - started})
+        if status == "ok" or time.monotonic() + backoff >= end:
+            return attempts
+        print(f"Attempt {len(attempts)}: {status}. Retrying in {backoff:.1f} s...")
+        time.sleep(backoff)
+        ser.reset_input_buffer()
+        backoff *= 2
+
 def get_valid_input(prompt, max_value):
     """
     @brief ユーザーからの有効な入力を取得
@@ -99,6 +172,7 @@ def list_serial_ports():
     @brief 利用可能なシリアルポートのリストを取得
     @return 利用可能なシリアルポートのリスト
     """
+    import serial.tools.list_ports  # エンコードだけなら pyserial を読み込まない
     ports = serial.tools.list_ports.comports()
     return [port.device for port in ports]
 
@@ -132,6 +206,7 @@ def get_device_description(com_port):
     @param com_port COMポート名
     @return デバイス説明
     """
+    import serial.tools.list_ports
     ports = serial.tools.list_ports.comports()
     for port in ports:
         if port.device == com_port:
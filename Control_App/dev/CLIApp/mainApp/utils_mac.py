@@ -5,8 +5,6 @@
 # @brief Triton-Lite用のCLIアプリの関数類 for MacOS
 """
 
-import serial.tools.list_ports
-
 def calculate_checksum(data_bytes):
     """
     @brief バイト列の合計下位1Byteを取り，チェックサムを計算
@@ -99,6 +97,7 @@ def list_serial_ports():
     @brief 利用可能なシリアルポートのリストを取得
     @return 利用可能なシリアルポートのリスト
     """
+    import serial.tools.list_ports  # エンコードだけなら pyserial を読み込まない
     ports = serial.tools.list_ports.comports()
     return [port.device for port in ports]
 
@@ -132,6 +131,7 @@ def get_device_description(com_port):
     @param com_port COMポート名
     @return デバイス説明
     """
+    import serial.tools.list_ports
     ports = serial.tools.list_ports.comports()
     for port in ports:
         if port.device == com_port:
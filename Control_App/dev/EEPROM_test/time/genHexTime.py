@@ -25,17 +25,18 @@ def decode_datetime(hex_str):
     
     return datetime.datetime(year, month, day, hour, minute, second)
 
-# 現在時刻を取得
-now = datetime.datetime.now()
+if __name__ == "__main__":
+    # 現在時刻を取得
+    now = datetime.datetime.now()
 
-# 現在時刻をエンコード
-encoded_time = encode_datetime(now)
-print(f"エンコードされた時刻: {encoded_time}")
+    # 現在時刻をエンコード
+    encoded_time = encode_datetime(now)
+    print(f"エンコードされた時刻: {encoded_time}")
 
-# 文字列をバイト列に変換
-data = encoded_time.encode()
-print(f"データ: {data}") # 例: "19010715232c"
+    # 文字列をバイト列に変換
+    data = encoded_time.encode()
+    print(f"データ: {data}") # 例: "19010715232c"
 
-# エンコードされた時刻をデコード
-decoded_time = decode_datetime(encoded_time)
-print(f"デコードされた時刻: {decoded_time.strftime('%Y-%m-%d %H:%M:%S')}")
\ No newline at end of file
+    # エンコードされた時刻をデコード
+    decoded_time = decode_datetime(encoded_time)
+    print(f"デコードされた時刻: {decoded_time.strftime('%Y-%m-%d %H:%M:%S')}")
\ No newline at end of file
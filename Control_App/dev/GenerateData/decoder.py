@@ -59,7 +59,8 @@ def decode_data(encoded_string):
         "checksum_valid": True
     }
 
-# Example usage
-encoded_string = "2419010713093600320D05100033FF3B583B"
-decoded_data = decode_data(encoded_string)
-print(decoded_data)
\ No newline at end of file
+if __name__ == "__main__":
+    # Example usage
+    encoded_string = "2419010713093600320D05100033FF3B583B"
+    decoded_data = decode_data(encoded_string)
+    print(decoded_data)
\ No newline at end of file
@@ -51,20 +51,21 @@ def encode_data(year, month, day, hour, minute, second, sup_start, sup_stop, exh
     hex_string = ''.join(f'{byte:02X}' for byte in data_bytes)
     return f'{hex_string}'
 
-# Example usage
-data_string = encode_data(
-    year=2025,
-    month=1,
-    day=7,
-    hour=19,
-    minute=9,
-    second=54,
-    sup_start=50,
-    sup_stop=3333,
-    exh_start=4096,
-    exh_stop=13311,
-    lcd_mode=3,
-    log_mode=11
-)
+if __name__ == "__main__":
+    # Example usage
+    data_string = encode_data(
+        year=2025,
+        month=1,
+        day=7,
+        hour=19,
+        minute=9,
+        second=54,
+        sup_start=50,
+        sup_stop=3333,
+        exh_start=4096,
+        exh_stop=13311,
+        lcd_mode=3,
+        log_mode=11
+    )
 
-print(data_string)
+    print(data_string)
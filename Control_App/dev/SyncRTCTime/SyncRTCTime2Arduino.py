@@ -22,4 +22,5 @@ def sync_datetime(): # PCの時刻をArduinoに送信
     finally:
         ser.close()
 
-sync_datetime()
\ No newline at end of file
+if __name__ == "__main__":
+    sync_datetime()
\ No newline at end of file
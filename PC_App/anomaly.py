@@ -0,0 +1,323 @@
+"""
+内圧と外圧の差・水深の異常をログ行から逐次検出する（信号ごとに O(1) メモリ）
+
+  - 指数移動平均・分散からの外れ値（spike）: PIN_MBAR, POUT, POUT_DEPTH, prsDiff
+  - CUSUM による水準の変化（drift）: prsDiff（漏れで内圧が下がっていく）, PIN_MBAR
+  - バルブ操作後に水深が変わらない（no_response）: V2EXH 開で沈まない・V1SUP 開で浮かない
+  - 加圧が続く（pressurize_rate）: PRESSURE の CTRL 行の割合が高い（漏れ）
+
+入力は SD カードのログと同じ形式の行（logparser.parse_line() で解析）．
+ログファイルはそのまま最後まで流し込み，--port を与えるとシリアルで受信した行を
+その場で処理する（本番ファームウェアはセンシング中に行を送らないので，
+ログ行を流す送信元が必要．replay などで再生したものも受けられる）．
+
+使い方:
+  python anomaly.py 0615_12.csv 0615_13.csv [--json alerts.jsonl]
+  python anomaly.py --port COM3
+  python anomaly.py --bus triton_bus   (telemetry_bus.py のブローカーが配る解析済みの行を読む)
+"""
+
+import argparse
+import datetime
+import json
+import math
+import sys
+
+from logparser import DATA_COLUMNS, CTRL_COLUMNS, parse_line
+
+_DATA = {name: i for i, name in enumerate(DATA_COLUMNS)}
+_CTRL = {name: i for i, name in enumerate(CTRL_COLUMNS)}
+
+# ログに書かれる値の分解能（handleSDcard() の %.1f）．標準偏差はこれより小さくしない
+RESOLUTIONS = {"PIN_MBAR": 0.1, "POUT": 0.1, "POUT_DEPTH": 0.1, "PRS_DIFF": 0.1 * 68.94 + 0.1}
+
+
+# ------------------------------------------------------------
+# O(1) の統計
+# ------------------------------------------------------------
+class RollingStats:
+    """
+    指数移動平均と分散（alpha が小さいほど長い窓）
+    値が変わらない区間では分散が 0 に近づくので，z の分母は min_sigma を下限にする
+    """
+
+    def __init__(self, alpha=0.05, min_sigma=1e-3):
+        self.alpha = alpha
+        self.min_sigma = min_sigma
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+
+    def zscore(self, value):
+        if self.count < 2:
+            return 0.0
+        return (value - self.mean) / max(math.sqrt(self.var), self.min_sigma)
+
+    def update(self, value):
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+            return
+        delta = value - self.mean
+        self.mean += self.alpha * delta
+        self.var = (1 - self.alpha) * (self.var + self.alpha * delta * delta)
+
+
+class Cusum:
+    """
+    両側 CUSUM．学習区間（warmup 個）の平均と標準偏差を基準に，
+    基準から k σ 以上ずれた分を積算して h σ を超えたら検出し，基準を取り直す
+    """
+
+    def __init__(self, k=0.5, h=8.0, warmup=30, min_sigma=1e-3):
+        self.k = k
+        self.h = h
+        self.warmup = warmup
+        self.min_sigma = min_sigma
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.mean = 0.0
+        self.sigma = 0.0
+        self.high = 0.0
+        self.low = 0.0
+
+    def update(self, value):
+        """@return 検出したら "up" / "down"，それ以外は None"""
+        if self.n < self.warmup:
+            self.n += 1
+            self.total += value
+            self.total_sq += value * value
+            if self.n == self.warmup:
+                self.mean = self.total / self.n
+                variance = max(self.total_sq / self.n - self.mean * self.mean, 0.0)
+                self.sigma = max(math.sqrt(variance), self.min_sigma)
+            return None
+        z = (value - self.mean) / self.sigma
+        self.high = max(0.0, self.high + z - self.k)
+        self.low = max(0.0, self.low - z - self.k)
+        if self.high > self.h or self.low > self.h:
+            direction = "up" if self.high > self.h else "down"
+            self.reset()
+            return direction
+        return None
+
+
+# ------------------------------------------------------------
+# 検出器
+# ------------------------------------------------------------
+class AnomalyDetector:
+    """
+    feed(kind, values) に parse_line() の結果を順に渡すと，検出した警報の辞書のリストを返す
+    警報: {"time_ms", "rtc", "signal", "kind", "value", "detail"}
+    """
+
+    SPIKE_SIGNALS = ("PIN_MBAR", "POUT", "POUT_DEPTH", "PRS_DIFF")
+    DRIFT_SIGNALS = ("PRS_DIFF", "PIN_MBAR")
+    # バルブが開いたときに期待する水深の変化の向き（+ は沈む）
+    RESPONSES = {"V2EXH": +1, "V1SUP": -1}
+
+    def __init__(self, spike_z=6.0, cusum_k=0.5, cusum_h=8.0, warmup=30,
+                 response_s=30.0, response_m=0.3, pressurize_rate=0.5):
+        self.settings = dict(spike_z=spike_z, cusum_k=cusum_k, cusum_h=cusum_h, warmup=warmup,
+                             response_s=response_s, response_m=response_m, pressurize_rate=pressurize_rate)
+        self.spike_z = spike_z
+        self.warmup = warmup
+        self.stats = {name: RollingStats(min_sigma=RESOLUTIONS[name]) for name in self.SPIKE_SIGNALS}
+        self.cusum = {name: Cusum(cusum_k, cusum_h, warmup, RESOLUTIONS[name]) for name in self.DRIFT_SIGNALS}
+        # 同じ向きの drift が続く間は最初の 1 回だけ知らせる（{信号: (向き, 最後に検出した時刻)}）
+        self.drifting = {}
+        self.drift_quiet_ms = 10 * 60 * 1000
+        self.response_ms = response_s * 1000
+        self.response_m = response_m
+        self.pending = {}  # バルブ名 -> (操作時刻, 操作時の水深)
+        self.valves = {"V1SUP": 0.0, "V2EXH": 0.0}
+        self.depth = math.nan
+        self.pressurize = RollingStats(alpha=0.02)
+        self.pressurize_rate = pressurize_rate
+        self.pressurize_alerted = False
+        self.last_time_ms = None
+
+    def _alert(self, time_ms, rtc, signal, kind, value, detail=""):
+        return {"time_ms": time_ms, "rtc": rtc, "signal": signal, "kind": kind, "value": value, "detail": detail}
+
+    def feed(self, kind, values):
+        time_ms = values[0]
+        if self.last_time_ms is not None and time_ms < self.last_time_ms:
+            self.__init__(**self.settings)  # 再起動（millis() が戻った）で学習し直す
+        self.last_time_ms = time_ms
+        if kind == "DATA":
+            return self._feed_data(values)
+        return self._feed_ctrl(values)
+
+    def _feed_data(self, values):
+        time_ms, rtc = values[0], values[1]
+        pin_mbar = values[_DATA["PIN_MBAR"]]
+        pout = values[_DATA["POUT"]]
+        signals = {
+            "PIN_MBAR": pin_mbar,
+            "POUT": pout,
+            "POUT_DEPTH": values[_DATA["POUT_DEPTH"]],
+            "PRS_DIFF": pin_mbar * 68.94 + 1013.25 - pout,
+        }
+        alerts = []
+        for name, value in signals.items():
+            if value != value:  # NaN
+                continue
+            stats = self.stats[name]
+            z = stats.zscore(value)
+            if stats.count >= self.warmup and abs(z) > self.spike_z:
+                alerts.append(self._alert(time_ms, rtc, name, "spike", value, f"z={z:+.1f}"))
+            stats.update(value)
+            if name in self.cusum:
+                direction = self.cusum[name].update(value)
+                if direction:
+                    previous, last_ms = self.drifting.get(name, (None, None))
+                    if direction != previous or time_ms - last_ms > self.drift_quiet_ms:
+                        alerts.append(self._alert(time_ms, rtc, name, "drift", value, direction))
+                    self.drifting[name] = (direction, time_ms)
+
+        depth = signals["POUT_DEPTH"]
+        if depth == depth:
+            self.depth = depth
+            for valve, (start_ms, start_depth) in list(self.pending.items()):
+                change = (depth - start_depth) * self.RESPONSES[valve]
+                if change >= self.response_m:
+                    del self.pending[valve]
+                elif time_ms - start_ms > self.response_ms:
+                    del self.pending[valve]
+                    alerts.append(self._alert(time_ms, rtc, valve, "no_response", depth,
+                                              f"depth changed {depth - start_depth:+.2f} m in {(time_ms - start_ms) / 1000:.0f} s"))
+        return alerts
+
+    def _feed_ctrl(self, values):
+        time_ms, rtc = values[0], values[1]
+        alerts = []
+        for valve in self.RESPONSES:
+            state = values[_CTRL[valve]]
+            if state == 1 and self.valves[valve] != 1 and self.depth == self.depth:
+                self.pending[valve] = (time_ms, self.depth)
+            self.valves[valve] = state
+
+        pressurizing = 1.0 if values[_CTRL["V3PRS"]] == 1 else 0.0
+        self.pressurize.update(pressurizing)
+        rate = self.pressurize.mean
+        if self.pressurize.count >= 20 and rate > self.pressurize_rate and not self.pressurize_alerted:
+            self.pressurize_alerted = True
+            alerts.append(self._alert(time_ms, rtc, "V3PRS", "pressurize_rate", rate,
+                                      f"{rate:.0%} of recent CTRL rows are PRESSURE"))
+        elif rate < self.pressurize_rate / 2:
+            self.pressurize_alerted = False
+        return alerts
+
+
+# ------------------------------------------------------------
+# 入力
+# ------------------------------------------------------------
+def parsed_lines(lines):
+    rtc_cache = {}
+    for line in lines:
+        parsed = parse_line(line, rtc_cache)
+        if parsed is not None:
+            yield parsed
+
+
+def detect_lines(lines, detector=None):
+    """行のイテラブルを処理して警報を順に返す"""
+    yield from detect_parsed(parsed_lines(lines), detector)
+
+
+def detect_parsed(records, detector=None):
+    """parse_line() の結果 (種類, 値) のイテラブルを処理して警報を順に返す"""
+    detector = detector or AnomalyDetector()
+    for kind, values in records:
+        yield from detector.feed(kind, values)
+
+
+def file_lines(path):
+    with open(path, encoding="ascii", errors="replace") as f:
+        yield from f
+
+
+def serial_lines(port):
+    from device import open_port, read_lines
+
+    ser = open_port(port, reset_wait=0)
+    try:
+        while True:
+            yield from read_lines(ser, 1.0)
+    finally:
+        ser.close()
+
+
+def bus_records(name):
+    """telemetry_bus.py のブローカーが解析済みの DATA / CTRL 行"""
+    from telemetry_bus import BusReader
+
+    reader = BusReader(name)
+    try:
+        for kind, values, _ in reader.records():
+            if kind != "TEXT":
+                yield kind, values
+    finally:
+        reader.close()
+
+
+def format_alert(alert, source=""):
+    rtc = alert["rtc"]
+    stamp = "-" if rtc != rtc else datetime.datetime.fromtimestamp(rtc, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    return (f"{source}{stamp} @{alert['time_ms']:.0f} ms  {alert['signal']:<10} {alert['kind']:<15} "
+            f"{alert['value']:.2f}  {alert['detail']}")
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="anomaly", description="Streaming anomaly detection on Triton-Lite log lines")
+    parser.add_argument("logs", nargs="*", help="log files to replay (default: stdin unless --port)")
+    parser.add_argument("--port", help="read log lines from a serial port instead")
+    parser.add_argument("--bus", help="read parsed lines from a telemetry_bus.py broker (shared memory name)")
+    parser.add_argument("--spike-z", type=float, default=6.0)
+    parser.add_argument("--cusum-h", type=float, default=8.0)
+    parser.add_argument("--response-s", type=float, default=30.0, help="time allowed for depth to react to a valve")
+    parser.add_argument("--response-m", type=float, default=0.3, help="depth change expected after a valve opens")
+    parser.add_argument("--json", help="append alerts as JSON lines to this file")
+    args = parser.parse_args(argv)
+
+    def make_detector():
+        return AnomalyDetector(spike_z=args.spike_z, cusum_h=args.cusum_h,
+                               response_s=args.response_s, response_m=args.response_m)
+
+    if args.bus:
+        sources = [(args.bus + ": ", bus_records(args.bus))]
+    elif args.port:
+        sources = [(args.port + ": ", parsed_lines(serial_lines(args.port)))]
+    elif args.logs:
+        sources = [(path + ": ", parsed_lines(file_lines(path))) for path in args.logs]
+    else:
+        sources = [("", parsed_lines(sys.stdin))]
+
+    out = open(args.json, "a", encoding="utf-8") if args.json else None
+    count = 0
+    try:
+        for prefix, records in sources:
+            for alert in detect_parsed(records, make_detector()):
+                count += 1
+                print(format_alert(alert, prefix), flush=True)
+                if out:
+                    rtc = alert["rtc"] if alert["rtc"] == alert["rtc"] else None
+                    out.write(json.dumps({"source": prefix.rstrip(": "), **alert, "rtc": rtc}) + "\n")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if out:
+            out.close()
+    print(f"{count} alerts", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
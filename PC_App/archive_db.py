@@ -0,0 +1,299 @@
+"""
+海上試験のログを 1 つの SQLite データベースにまとめる
+
+  files : 取り込んだログ（機体・パス・サイズ・更新時刻）
+  data  : DATA 行（logparser.DATA_COLUMNS + file_id, vehicle, boot, dive）
+  ctrl  : CTRL 行（logparser.CTRL_COLUMNS + file_id, vehicle, boot, dive）
+  dives : ダイブごとの要約（開始・終了時刻，最大水深，加圧の CTRL 行数）
+
+boot はファイル内の起動の番号（timeNowMs が戻るたびに増える），
+dive はその時点の divedCount（DATA 行の DIVE_COUNT．CTRL 行は直前の DATA 行の値）．
+機体はログの親ディレクトリ名（archive/TL-01/0615_12.csv）か --vehicle で決める．
+サイズと更新時刻が変わっていないファイルは取り込み直さない．
+
+使い方:
+  python archive_db.py import trials.db archive/*/*.csv
+  python archive_db.py dives trials.db --min-depth 10 --pressurized
+  python archive_db.py sql trials.db "SELECT vehicle, COUNT(*) FROM dives GROUP BY vehicle"
+"""
+
+import argparse
+import datetime
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from logparser import CTRL_COLUMNS, DATA_COLUMNS, MOVEMENT_CODES, file_boots, load_log
+
+BATCH_ROWS = 50000
+KEY_COLUMNS = ("file_id", "vehicle", "boot", "dive")
+INDEXES = {
+    "data_vehicle_time": "data(vehicle, rtc)",
+    "data_file_dive": "data(file_id, boot, dive)",
+    "ctrl_vehicle_time": "ctrl(vehicle, rtc)",
+    "ctrl_file_dive": "ctrl(file_id, boot, dive)",
+    "dives_vehicle_depth": "dives(vehicle, max_depth)",
+}
+# 既存の行に対してこの割合以上を取り込むときは索引を消してから入れ，最後に作り直す
+REINDEX_RATIO = 0.5
+
+
+# ------------------------------------------------------------
+# スキーマ
+# ------------------------------------------------------------
+def connect(path):
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(f"""
+        CREATE TABLE IF NOT EXISTS files (
+            id INTEGER PRIMARY KEY, vehicle TEXT, path TEXT UNIQUE,
+            size INTEGER, mtime_ns INTEGER, imported_at TEXT, data_rows INTEGER, ctrl_rows INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS data (
+            file_id INTEGER, vehicle TEXT, boot INTEGER, dive INTEGER,
+            {", ".join(f"{name} REAL" for name in DATA_COLUMNS)}
+        );
+        CREATE TABLE IF NOT EXISTS ctrl (
+            file_id INTEGER, vehicle TEXT, boot INTEGER, dive INTEGER,
+            {", ".join(f"{name} REAL" for name in CTRL_COLUMNS)}
+        );
+        CREATE TABLE IF NOT EXISTS dives (
+            file_id INTEGER, vehicle TEXT, boot INTEGER, dive INTEGER,
+            start_ms REAL, end_ms REAL, start_rtc REAL, end_rtc REAL,
+            rows INTEGER, max_depth REAL, pressurize_events INTEGER,
+            PRIMARY KEY (file_id, boot, dive)
+        );
+    """)
+    return db
+
+
+def drop_indexes(db):
+    for name in INDEXES:
+        db.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def create_indexes(db):
+    for name, target in INDEXES.items():
+        db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+# ------------------------------------------------------------
+# 1 ファイル分の変換
+# ------------------------------------------------------------
+def vehicle_of(path, vehicle=None):
+    return vehicle or os.path.basename(os.path.dirname(os.path.abspath(path)))
+
+
+def ctrl_dives(data, data_boot, ctrl, ctrl_boot):
+    """
+    CTRL 行の dive．ファイルの中で直前の，同じ起動の DATA 行の値を使う
+    （V1SUP の閉はそのダイブの最後の操作になる）
+    """
+    dive = np.full(len(ctrl_boot), np.nan)
+    if len(data_boot):
+        index = np.searchsorted(data["row"], ctrl["row"], side="left") - 1
+        found = (index >= 0) & (data_boot[np.maximum(index, 0)] == ctrl_boot)
+        dive[found] = data["DIVE_COUNT"][index[found]]
+    return dive
+
+
+def dive_summary(data, data_boot, ctrl, ctrl_boot, ctrl_dive):
+    """
+    @return dives テーブルの行（file_id・vehicle を除く）のリスト
+    (boot, dive) の鍵で 1 度だけ並べ替え（安定ソートなのでダイブの中はファイルの順），reduceat で集計する
+    """
+    dive = data["DIVE_COUNT"]
+    rows = np.flatnonzero(np.isfinite(dive))
+    if not len(rows):
+        return []
+    pressurize = np.flatnonzero((ctrl["MOV_STATE"] == MOVEMENT_CODES["PRESSURE"]) & np.isfinite(ctrl_dive))
+    span = int(max(dive[rows].max(), np.max(ctrl_dive[pressurize], initial=0))) + 1
+    key = data_boot[rows] * span + dive[rows].astype(np.int64)
+    sort = np.argsort(key, kind="stable")
+    order = rows[sort]
+    keys, starts, counts = np.unique(key[sort], return_index=True, return_counts=True)
+    first, last = order[starts], order[starts + counts - 1]
+    max_depth = np.fmax.reduceat(data["POUT_DEPTH"][order], starts)
+
+    event_key = ctrl_boot[pressurize] * span + ctrl_dive[pressurize].astype(np.int64)
+    position = np.minimum(np.searchsorted(keys, event_key), len(keys) - 1)
+    matched = keys[position] == event_key
+    events = np.bincount(position[matched], minlength=len(keys))
+
+    time_ms, rtc = data["time_ms"], data["rtc"]
+    return [
+        (int(k // span), int(k % span), float(time_ms[a]), float(time_ms[b]), float(rtc[a]), float(rtc[b]),
+         int(n), float(depth) if np.isfinite(depth) else None, int(e))
+        for k, a, b, n, depth, e in zip(keys, first, last, counts, max_depth, events)
+    ]
+
+
+def _insert_columns(db, table, names, columns, key_arrays):
+    """列辞書を BATCH_ROWS 行ずつ executemany で入れる（NaN は SQLite で NULL になる）"""
+    all_names = KEY_COLUMNS + names
+    sql = f"INSERT INTO {table} ({', '.join(all_names)}) VALUES ({', '.join('?' * len(all_names))})"
+    rows = len(columns[names[0]])
+    for start in range(0, rows, BATCH_ROWS):
+        stop = min(start + BATCH_ROWS, rows)
+        arrays = [key[start:stop] for key in key_arrays]
+        arrays += [columns[name][start:stop].tolist() for name in names]
+        db.executemany(sql, zip(*arrays))
+
+
+def import_file(db, path, vehicle):
+    """1 ファイルを取り込む（同じパスの古い行は消す）．@return (DATA 行数, CTRL 行数)"""
+    stat = os.stat(path)
+    absolute = os.path.abspath(path)
+    old = db.execute("SELECT id FROM files WHERE path = ?", (absolute,)).fetchone()
+    if old:
+        for table in ("data", "ctrl", "dives"):
+            db.execute(f"DELETE FROM {table} WHERE file_id = ?", old)
+        db.execute("DELETE FROM files WHERE id = ?", old)
+
+    data, ctrl = load_log(path, row_numbers=True)
+    cursor = db.execute(
+        "INSERT INTO files (vehicle, path, size, mtime_ns, imported_at, data_rows, ctrl_rows) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (vehicle, absolute, stat.st_size, stat.st_mtime_ns, datetime.datetime.now().isoformat(timespec="seconds"),
+         len(data["time_ms"]), len(ctrl["time_ms"])),
+    )
+    file_id = cursor.lastrowid
+
+    data_boot, ctrl_boot = file_boots(data, ctrl)
+    ctrl_dive = ctrl_dives(data, data_boot, ctrl, ctrl_boot)
+    for table, names, columns, boot, dive in (
+        ("data", DATA_COLUMNS, data, data_boot, data["DIVE_COUNT"]),
+        ("ctrl", CTRL_COLUMNS, ctrl, ctrl_boot, ctrl_dive),
+    ):
+        count = len(columns["time_ms"])
+        dive = np.where(np.isfinite(dive), dive, -1).astype(np.int64)
+        keys = ([file_id] * count, [vehicle] * count, boot.tolist(), [None if d < 0 else d for d in dive.tolist()])
+        _insert_columns(db, table, names, columns, keys)
+
+    db.executemany(
+        "INSERT INTO dives VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(file_id, vehicle, *row) for row in dive_summary(data, data_boot, ctrl, ctrl_boot, ctrl_dive)],
+    )
+    return len(data["time_ms"]), len(ctrl["time_ms"])
+
+
+# ------------------------------------------------------------
+# 取り込み（増分）
+# ------------------------------------------------------------
+def pending_files(db, paths):
+    """サイズか更新時刻が変わったファイル（未登録を含む）だけを返す"""
+    known = {path: (size, mtime) for path, size, mtime in db.execute("SELECT path, size, mtime_ns FROM files")}
+    pending = []
+    for path in paths:
+        stat = os.stat(path)
+        if known.get(os.path.abspath(path)) != (stat.st_size, stat.st_mtime_ns):
+            pending.append(path)
+    return pending
+
+
+def import_logs(db_path, paths, vehicle=None):
+    """@return (取り込んだファイル数, 飛ばしたファイル数, DATA 行数, CTRL 行数)"""
+    db = connect(db_path)
+    try:
+        pending = pending_files(db, paths)
+        existing = db.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+        incoming = sum(os.path.getsize(path) for path in pending)
+        reindex = incoming >= existing * REINDEX_RATIO
+
+        db.execute("PRAGMA synchronous=OFF")
+        data_rows = ctrl_rows = 0
+        with db:
+            if reindex:
+                drop_indexes(db)
+            for path in pending:
+                rows = import_file(db, path, vehicle_of(path, vehicle))
+                data_rows += rows[0]
+                ctrl_rows += rows[1]
+        with db:
+            create_indexes(db)
+        return len(pending), len(paths) - len(pending), data_rows, ctrl_rows
+    finally:
+        db.close()
+
+
+# ------------------------------------------------------------
+# 問い合わせ
+# ------------------------------------------------------------
+def find_dives(db_path, min_depth=None, pressurized=False, vehicle=None):
+    """@return 条件に合う dives の行（辞書）のリスト"""
+    where, params = [], []
+    if min_depth is not None:
+        where.append("d.max_depth >= ?")
+        params.append(min_depth)
+    if pressurized:
+        where.append("d.pressurize_events > 0")
+    if vehicle:
+        where.append("d.vehicle = ?")
+        params.append(vehicle)
+    sql = ("SELECT d.*, f.path FROM dives d JOIN files f ON f.id = d.file_id"
+           + (" WHERE " + " AND ".join(where) if where else "")
+           + " ORDER BY d.vehicle, d.start_rtc")
+    db = connect(db_path)
+    try:
+        db.row_factory = sqlite3.Row
+        return [dict(row) for row in db.execute(sql, params)]
+    finally:
+        db.close()
+
+
+def _format_rtc(rtc):
+    if rtc is None:
+        return "-"
+    return datetime.datetime.fromtimestamp(rtc, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="archive_db", description="SQLite archive of Triton-Lite logs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importer = commands.add_parser("import", help="import new or changed logs")
+    importer.add_argument("db")
+    importer.add_argument("logs", nargs="+")
+    importer.add_argument("--vehicle", help="vehicle name for all logs (default: parent directory name)")
+
+    dives = commands.add_parser("dives", help="list dives")
+    dives.add_argument("db")
+    dives.add_argument("--min-depth", type=float, help="max depth at least this [m]")
+    dives.add_argument("--pressurized", action="store_true", help="only dives with PRESSURE events")
+    dives.add_argument("--vehicle")
+
+    sql = commands.add_parser("sql", help="run an SQL query")
+    sql.add_argument("db")
+    sql.add_argument("query")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.command == "import":
+        imported, skipped, data_rows, ctrl_rows = import_logs(args.db, args.logs, args.vehicle)
+        print(f"Imported {imported} files ({data_rows} DATA, {ctrl_rows} CTRL rows), "
+              f"skipped {skipped} unchanged, {time.perf_counter() - started:.2f} s")
+    elif args.command == "dives":
+        rows = find_dives(args.db, args.min_depth, args.pressurized, args.vehicle)
+        for row in rows:
+            depth = "-" if row["max_depth"] is None else f"{row['max_depth']:.1f} m"
+            print(f"{row['vehicle']:<8} {_format_rtc(row['start_rtc'])}  {os.path.basename(row['path'])} "
+                  f"boot {row['boot']} dive {row['dive']:<3} max {depth:>8}  pressurize {row['pressurize_events']}")
+        print(f"{len(rows)} dives ({(time.perf_counter() - started) * 1000:.1f} ms)")
+    else:
+        db = connect(args.db)
+        try:
+            cursor = db.execute(args.query)
+            if cursor.description:
+                print("\t".join(column[0] for column in cursor.description))
+                for row in cursor:
+                    print("\t".join("" if value is None else str(value) for value in row))
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+内圧センサの校正をやり直し，過去のログの内圧・prsDiff・加圧判定を計算し直す
+
+ファームウェアの換算（float で計算される）:
+  v               = PIN_RAW * 0.00488 - 0.25     (ADC → 電圧)
+  PIN_MBAR        = v * 6.667                    (電圧 → センサ値．名前に反して psi)
+  内圧 [mbar abs] = PIN_MBAR * 68.94 + 1013.25
+  prsDiff         = 内圧 - POUT,  prsDiff + inPressThresh < 0 なら加圧
+
+校正プロファイルは機体ごとに JSON で与える．書かなかった係数はファームウェアの値になる．
+  {"default": {}, "TL-01": {"adc_offset": -0.27, "sensor_gain": 6.71}}
+機体はディレクトリ名（archive/TL-01/0615_12.csv）か --vehicle で決める．
+
+ログは colstore の列キャッシュ（memmap）から読み，再計算した列は
+キャッシュの cal/ に書き出す（PIN_MBAR_CAL, PIN_ABS_CAL, PRS_DIFF_CAL, PRESSURIZE_CAL）．
+
+使い方: python calibration.py archive/*/*.csv --profiles profiles.json --frame 2419...3B
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from colstore import cache_dir_for, load_log_cached, save_columns
+from firmware_model import decode_data
+
+FIRMWARE_PROFILE = {
+    "adc_gain": 0.00488,
+    "adc_offset": -0.25,
+    "sensor_gain": 6.667,
+    "psi_to_mbar": 68.94,
+    "atm_mbar": 1013.25,
+}
+CAL_TABLE = "cal"
+
+
+# ------------------------------------------------------------
+# 換算
+# ------------------------------------------------------------
+def load_profiles(path):
+    """@return {機体名: 係数の辞書}．"default" は全機体の既定値"""
+    if path is None:
+        return {"default": dict(FIRMWARE_PROFILE)}
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    base = {**FIRMWARE_PROFILE, **raw.get("default", {})}
+    profiles = {"default": base}
+    for vehicle, values in raw.items():
+        unknown = set(values) - set(FIRMWARE_PROFILE)
+        if unknown:
+            raise ValueError(f"{vehicle}: unknown calibration keys {sorted(unknown)}")
+        profiles[vehicle] = {**base, **values}
+    return profiles
+
+
+def raw_from_mbar(pin_mbar, profile=FIRMWARE_PROFILE):
+    """
+    PIN_RAW を書かない logMode 1/3 用に，PIN_MBAR から ADC 値を逆算する
+    （PIN_MBAR は小数 1 桁なので，ADC 値で ±0.5 程度の誤差がある）
+    """
+    volts = pin_mbar / profile["sensor_gain"]
+    return np.round((volts - profile["adc_offset"]) / profile["adc_gain"])
+
+
+def internal_pressure(raw, profile):
+    """
+    ADC 値から (PIN_MBAR, 内圧 [mbar abs]) を，ファームウェアと同じく float32 で計算する
+    """
+    f = np.float32
+    raw = np.asarray(raw, dtype=np.float32)
+    pin_mbar = (raw * f(profile["adc_gain"]) + f(profile["adc_offset"])) * f(profile["sensor_gain"])
+    absolute = pin_mbar * f(profile["psi_to_mbar"]) + f(profile["atm_mbar"])
+    return pin_mbar, absolute
+
+
+def pressurize_decision(absolute, pout, threshold):
+    """prsDiff と加圧判定（prsDiff + inPressThresh < 0）．POUT が NaN の行は判定しない"""
+    prs_diff = absolute - np.asarray(pout, dtype=np.float32)
+    return prs_diff, (prs_diff + np.float32(threshold)) < 0
+
+
+# ------------------------------------------------------------
+# 1 ファイル分の再計算
+# ------------------------------------------------------------
+def recalibrate(data, profile, threshold=0):
+    """
+    DATA 列辞書の内圧を校正し直す
+    @return (派生列の辞書, 集計の辞書)
+    """
+    raw = np.asarray(data["PIN_RAW"])
+    estimated = ~np.isfinite(raw)
+    if estimated.any():
+        raw = np.where(estimated, raw_from_mbar(np.asarray(data["PIN_MBAR"])), raw)
+
+    _, old_abs = internal_pressure(raw, FIRMWARE_PROFILE)
+    pin_mbar, new_abs = internal_pressure(raw, profile)
+    _, old_decision = pressurize_decision(old_abs, data["POUT"], threshold)
+    prs_diff, new_decision = pressurize_decision(new_abs, data["POUT"], threshold)
+
+    valid = np.isfinite(raw) & np.isfinite(np.asarray(data["POUT"]))
+    changed = valid & (old_decision != new_decision)
+    derived = {
+        "PIN_MBAR_CAL": pin_mbar,
+        "PIN_ABS_CAL": new_abs,
+        "PRS_DIFF_CAL": prs_diff,
+        "PRESSURIZE_CAL": np.where(valid, new_decision, np.nan),
+    }
+    summary = {
+        "rows": int(len(raw)),
+        "raw_estimated": int(estimated.sum()),
+        "pressurize_before": int((old_decision & valid).sum()),
+        "pressurize_after": int((new_decision & valid).sum()),
+        "now_pressurize": int((changed & new_decision).sum()),
+        "no_longer_pressurize": int((changed & old_decision).sum()),
+        "mean_shift_mbar": float(np.nanmean(new_abs - old_abs)) if len(raw) else 0.0,
+    }
+    return derived, summary
+
+
+def vehicle_of(path, profiles, vehicle=None):
+    if vehicle:
+        return vehicle
+    parent = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return parent if parent in profiles else "default"
+
+
+def recalibrate_archive(paths, profiles, threshold=0, vehicle=None, write=True):
+    """
+    ログ群をまとめて再計算する
+    @return [(ログのパス, 機体名, 集計の辞書)]
+    """
+    results = []
+    for path in paths:
+        name = vehicle_of(path, profiles, vehicle)
+        if name not in profiles:
+            raise ValueError(f"No calibration profile for vehicle {name!r}")
+        data, _ = load_log_cached(path)
+        derived, summary = recalibrate(data, profiles[name], threshold)
+        if write:
+            save_columns(os.path.join(cache_dir_for(path), CAL_TABLE), derived)
+        results.append((path, name, summary))
+    return results
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="calibration", description="Recompute internal pressure and prsDiff with new calibration")
+    parser.add_argument("logs", nargs="+")
+    parser.add_argument("--profiles", help="JSON file of per-vehicle calibration profiles")
+    parser.add_argument("--vehicle", help="profile to use for all logs (default: parent directory name)")
+    parser.add_argument("--frame", help="config frame (hex) for inPressThresh")
+    parser.add_argument("--thresh", type=int, default=None, help="inPressThresh (overrides --frame)")
+    parser.add_argument("--dry-run", action="store_true", help="do not write the cal/ columns")
+    args = parser.parse_args(argv)
+
+    try:
+        profiles = load_profiles(args.profiles)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return False
+    threshold = 0
+    if args.frame:
+        threshold = decode_data(bytes.fromhex(args.frame.strip()))["inPressThresh"]
+    if args.thresh is not None:
+        threshold = args.thresh
+
+    started = time.perf_counter()
+    try:
+        results = recalibrate_archive(args.logs, profiles, threshold, args.vehicle, not args.dry_run)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return False
+
+    total_rows = total_changed = 0
+    for path, vehicle, summary in results:
+        changed = summary["now_pressurize"] + summary["no_longer_pressurize"]
+        total_rows += summary["rows"]
+        total_changed += changed
+        note = f", {summary['raw_estimated']} PIN_RAW estimated" if summary["raw_estimated"] else ""
+        print(f"{path} [{vehicle}]: shift {summary['mean_shift_mbar']:+.1f} mbar, "
+              f"pressurize {summary['pressurize_before']} -> {summary['pressurize_after']} rows "
+              f"(+{summary['now_pressurize']} / -{summary['no_longer_pressurize']}){note}")
+    print(f"{len(results)} logs, {total_rows} rows, {total_changed} changed decisions "
+          f"in {time.perf_counter() - started:.2f} s")
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() is not False else 1)
@@ -0,0 +1,364 @@
+"""
+シリアル通信の生の記録（キャプチャ）と再生
+
+有効にすると，transport.open_transport() で開いた全ての接続先について，送ったバイト（TX）と
+受け取ったバイト（RX）を単調時計の時刻と一緒に書き出す．readline() は 1 バイトずつ read() するので，
+同じ接続先・同じ向きで COALESCE_S 以内に続いた read() / write() は 1 つの記録にまとめる
+（時刻は最初のバイトのもの）．
+現場で書き込みに失敗したときの通信をそのまま持ち帰り，手元で再生して確かめるため．
+
+ファイルの形式（追記のみ．いくつもの実行・接続先を 1 ファイルに続けて書ける）
+  先頭   : MAGIC（"TRCP1\\n"）
+  記録   : 種類 u1，接続先の番号 u2，時刻 u8（BEGIN からの ns），長さ u2（リトルエンディアン）+ 中身
+  種類   : BEGIN（実行の始まり．中身は JSON．時刻の起点になる）/ OPEN（中身は JSON: port, kind, baudrate）
+           / TX / RX / ERROR（中身は例外の文字列）/ CLOSE
+書き込みはバッファ付きで，TX と ERROR はすぐに，それ以外は FLUSH_INTERVAL_S ごとに
+（次の記録が来なくてもタイマーのスレッドで）ディスクに出す．固まって強制終了されても，
+最後に送ったバイトは残る．途中で止まって最後の記録が欠けていても，そこまでは読める．
+
+有効にする方法:
+  環境変数 TRITON_CAPTURE=session.trcp（GUI や個別スクリプトでも効く）
+  または python triton.py --capture session.trcp <サブコマンド> ...
+
+再生:
+  python capture.py info session.trcp
+  python capture.py parse session.trcp [--speed 1 | max]     受信した行を表示し，ログの行は解析する
+  python capture.py emulate session.trcp [--image eeprom.bin]  送った行をエミュレータに入れ，返事を記録と比べる
+  python capture.py pty session.trcp [--link /tmp/triton0]     受信したバイトを pty から元の間隔で流す
+"""
+
+import argparse
+import atexit
+import json
+import os
+import struct
+import sys
+import threading
+import time
+
+MAGIC = b"TRCP1\n"
+RECORD = struct.Struct("<BHQH")
+MAX_CHUNK = 0xFFFF
+FLUSH_INTERVAL_S = 1.0
+COALESCE_S = 0.05  # 1 つの記録にまとめる時間の幅（9600 baud で約 48 バイト）
+BUFFER_BYTES = 64 * 1024
+
+KIND_NAMES = ("BEGIN", "OPEN", "TX", "RX", "ERROR", "CLOSE")
+BEGIN, OPEN, TX, RX, ERROR, CLOSE = range(len(KIND_NAMES))
+
+
+# ------------------------------------------------------------
+# 書き込み
+# ------------------------------------------------------------
+class CaptureWriter:
+    """キャプチャファイルへの追記（スレッドから同時に使える）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.f = open(path, "ab", buffering=BUFFER_BYTES)
+        if new:
+            self.f.write(MAGIC)
+        self.start_ns = time.monotonic_ns()
+        self.streams = 0
+        self.pending = None  # まとめている途中の TX/RX: [種類, 接続先の番号, 時刻 ns, bytearray]
+        self.stopped = threading.Event()
+        threading.Thread(target=self._flush_loop, name="capture-flush", daemon=True).start()
+        self.record(BEGIN, 0, json.dumps({"wall": time.time(), "pid": os.getpid(), "argv": sys.argv}).encode())
+
+    def _write(self, kind, stream, elapsed_ns, data):
+        for i in range(0, max(len(data), 1), MAX_CHUNK):
+            chunk = data[i:i + MAX_CHUNK]
+            self.f.write(RECORD.pack(kind, stream, elapsed_ns, len(chunk)))
+            self.f.write(chunk)
+
+    def _write_pending(self):
+        if self.pending is not None:
+            self._write(*self.pending)
+            self.pending = None
+
+    def record(self, kind, stream, data=b""):
+        elapsed_ns = time.monotonic_ns() - self.start_ns
+        with self.lock:
+            if self.f is None:
+                return
+            pending = self.pending
+            if (pending is not None and pending[:2] == [kind, stream]
+                    and elapsed_ns - pending[2] <= COALESCE_S * 1e9 and len(pending[3]) + len(data) <= MAX_CHUNK):
+                pending[3] += data
+            else:
+                self._write_pending()
+                if kind in (TX, RX):
+                    self.pending = [kind, stream, elapsed_ns, bytearray(data)]
+                else:
+                    self._write(kind, stream, elapsed_ns, data)
+            if kind in (TX, ERROR):
+                # 固まる直前に送ったものほど大事なので待たずに出す
+                self._write_pending()
+                self.f.flush()
+
+    def _flush_loop(self):
+        """次の記録が来なくても FLUSH_INTERVAL_S ごとにディスクに出す"""
+        while not self.stopped.wait(FLUSH_INTERVAL_S):
+            with self.lock:
+                if self.f is None:
+                    return
+                self._write_pending()
+                self.f.flush()
+
+    def open_stream(self, port, kind, baudrate):
+        """@return 新しい接続先の番号（1 から）"""
+        with self.lock:
+            self.streams += 1
+            stream = self.streams
+        self.record(OPEN, stream, json.dumps({"port": port, "kind": kind, "baudrate": baudrate}).encode())
+        return stream
+
+    def close(self):
+        self.stopped.set()
+        with self.lock:
+            if self.f is not None:
+                self._write_pending()
+                self.f.close()
+                self.f = None
+
+
+_writer = None
+
+
+def enable(path=None):
+    """キャプチャを始める（path が None なら何もしない）"""
+    global _writer
+    if not path:
+        return
+    disable()
+    _writer = CaptureWriter(path)
+
+
+def disable():
+    global _writer
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+
+
+def writer():
+    """有効なら CaptureWriter，無効なら None"""
+    return _writer
+
+
+enable(os.environ.get("TRITON_CAPTURE"))
+atexit.register(disable)
+
+
+# ------------------------------------------------------------
+# 読み込み
+# ------------------------------------------------------------
+def read_records(path):
+    """
+    @return (種類, 接続先の番号, 時刻 ns, 中身) のイテレータ．時刻は BEGIN ごとに 0 から
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path}: not a Triton serial capture")
+    position = len(MAGIC)
+    while position + RECORD.size <= len(data):
+        kind, stream, elapsed_ns, length = RECORD.unpack_from(data, position)
+        position += RECORD.size
+        if position + length > len(data) or kind >= len(KIND_NAMES):
+            break  # 書き込みの途中で止まった最後の記録
+        yield kind, stream, elapsed_ns, data[position:position + length]
+        position += length
+
+
+def sessions(records):
+    """
+    BEGIN ごとに分け，接続先の番号を通し番号にする
+    @return (接続先の辞書 {通し番号: OPEN の中身}, (種類, 通し番号, 通しの時刻 ns, 中身) のリスト)
+    """
+    streams = {}
+    events = []
+    base = {}  # BEGIN ごとの 番号 -> 通し番号
+    offset_ns = last_ns = 0
+    for kind, stream, elapsed_ns, payload in records:
+        if kind == BEGIN:
+            base = {}
+            offset_ns = last_ns
+            continue
+        if kind == OPEN:
+            base[stream] = len(streams) + 1
+            streams[base[stream]] = json.loads(payload)
+        last_ns = offset_ns + elapsed_ns
+        events.append((kind, base.get(stream, 0), last_ns, payload))
+    return streams, events
+
+
+def paced(events, speed):
+    """記録の間隔（speed 倍速．0 なら待たない）で events を返す"""
+    started = time.perf_counter()
+    first_ns = events[0][2] if events else 0
+    for event in events:
+        if speed:
+            remaining = started + (event[2] - first_ns) / 1e9 / speed - time.perf_counter()
+            if remaining > 0:
+                time.sleep(remaining)
+        yield event
+
+
+def split_lines(buffers, stream, data):
+    """接続先ごとに受信したバイトを行に分ける"""
+    buffer = buffers.get(stream, b"") + data
+    *lines, buffers[stream] = buffer.split(b"\n")
+    return [line.decode("ascii", errors="replace").strip() for line in lines]
+
+
+# ------------------------------------------------------------
+# 再生
+# ------------------------------------------------------------
+def info(streams, events):
+    totals = {stream: {"TX": 0, "RX": 0, "ERROR": 0} for stream in streams}
+    for kind, stream, _, payload in events:
+        if kind in (TX, RX) and stream in totals:
+            totals[stream][KIND_NAMES[kind]] += len(payload)
+        elif kind == ERROR and stream in totals:
+            totals[stream]["ERROR"] += 1
+    duration = events[-1][2] / 1e9 if events else 0.0
+    print(f"{len(streams)} connections, {len(events)} records, {duration:.3f} s")
+    for stream, opened in streams.items():
+        counts = totals[stream]
+        print(f"  #{stream} {opened['port']} ({opened['kind']}, {opened['baudrate']} baud): "
+              f"TX {counts['TX']} B, RX {counts['RX']} B, errors {counts['ERROR']}")
+    for kind, stream, elapsed_ns, payload in events:
+        if kind == ERROR:
+            print(f"  #{stream} @{elapsed_ns / 1e9:.3f} s: {payload.decode(errors='replace')}")
+
+
+def parse(events, speed):
+    """受信した行を時刻付きで表示する．ログの行は logparser で解析して数える"""
+    from logparser import parse_line
+
+    buffers = {}
+    counts = {"DATA": 0, "CTRL": 0}
+    rtc_cache = {}
+    for kind, stream, elapsed_ns, payload in paced(events, speed):
+        stamp = f"{elapsed_ns / 1e9:10.3f} #{stream}"
+        if kind == TX:
+            print(f"{stamp} > {payload.decode('ascii', errors='replace').strip()}")
+        elif kind == ERROR:
+            print(f"{stamp} ! {payload.decode(errors='replace')}")
+        elif kind == RX:
+            for line in split_lines(buffers, stream, payload):
+                parsed = parse_line(line, rtc_cache)
+                if parsed is not None:
+                    counts[parsed[0]] += 1
+                else:
+                    print(f"{stamp} < {line}")
+    if counts["DATA"] or counts["CTRL"]:
+        print(f"log lines: {counts['DATA']} DATA, {counts['CTRL']} CTRL")
+
+
+def emulate(streams, events, speed, image_path=None):
+    """
+    送った行をエミュレータ（firmware_model）に入れ，返事を記録した受信と比べる
+    EEPROM は書き込みを覚えているので，エミュレータはポートごとに 1 つにする
+    @return 全部一致したら True
+    """
+    from transport import FirmwareEmulator
+
+    emulators = {}  # ポート -> エミュレータ
+    expected = {}  # 接続先 -> エミュレータが返した行のリスト（まだ受信と比べていないもの）
+    buffers = {}
+    mismatches = 0
+    for kind, stream, elapsed_ns, payload in paced(events, speed):
+        if kind == TX:
+            port = streams.get(stream, {}).get("port")
+            if port not in emulators:
+                emulators[port] = FirmwareEmulator(image_path)
+            emulator = emulators[port]
+            reply = emulator.feed(payload).decode("ascii", errors="replace")
+            expected.setdefault(stream, []).extend(line.strip() for line in reply.splitlines())
+        elif kind == RX:
+            for line in split_lines(buffers, stream, payload):
+                pending = expected.get(stream, [])
+                want = pending.pop(0) if pending else None
+                if line != want:
+                    mismatches += 1
+                    print(f"{elapsed_ns / 1e9:10.3f} #{stream}: board {line!r}, emulator {want!r}")
+    for stream, pending in expected.items():
+        for want in pending:
+            mismatches += 1
+            print(f"#{stream}: emulator {want!r}, board sent nothing")
+    print(f"{mismatches} differences between the board and the emulator")
+    return mismatches == 0
+
+
+def to_pty(events, speed, link=None):
+    """受信したバイトを pty から流す（受信側のツールを記録した通信で動かす）"""
+    from replay import PtySink
+
+    sink = PtySink(link)
+    print(f"Replaying received bytes to {sink.name}" + (f" ({link})" if link else ""), file=sys.stderr, flush=True)
+    try:
+        for kind, _, _, payload in paced(events, speed):
+            if kind == RX:
+                sink.write(payload)
+    finally:
+        sink.close()
+
+
+def parse_speed(text):
+    if text == "max":
+        return 0.0
+    speed = float(text)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="capture", description="Inspect and replay raw serial captures")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, text in (("info", "connections, byte counts and errors"),
+                       ("parse", "print received lines, parse log lines"),
+                       ("emulate", "feed sent lines to the firmware emulator and compare its replies"),
+                       ("pty", "stream received bytes through a pseudo-terminal")):
+        command = commands.add_parser(name, help=text)
+        command.add_argument("capture")
+        command.add_argument("--stream", type=int, help="only this connection (#N in info)")
+        if name != "info":
+            command.add_argument("--speed", type=parse_speed, default=0.0, help="1 for original timing, default max")
+    commands.choices["emulate"].add_argument("--image", help="EEPROM image the emulated board starts with")
+    commands.choices["pty"].add_argument("--link", help="create a symlink to the pty with this name")
+    args = parser.parse_args(argv)
+
+    try:
+        streams, events = sessions(read_records(args.capture))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        return False
+    if args.stream is not None:
+        events = [event for event in events if event[1] == args.stream]
+
+    try:
+        if args.command == "info":
+            info(streams, events)
+        elif args.command == "parse":
+            parse(events, args.speed)
+        elif args.command == "emulate":
+            return emulate(streams, events, args.speed, args.image)
+        else:
+            to_pty(events, args.speed, args.link)
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    except OSError as e:
+        print(f"Error: {e}")
+        return False
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() is not False else 1)
@@ -0,0 +1,150 @@
+"""
+解析済みログの列ごとのキャッシュ（1 列 1 ファイルの float64 生データ）
+
+<ログ名>.cols/
+  meta.json         : 行数・元ログのサイズと更新時刻
+  data/<列名>.f8    : DATA 行の列（logparser.DATA_COLUMNS）
+  ctrl/<列名>.f8    : CTRL 行の列（logparser.CTRL_COLUMNS）
+  <その他>/         : 再計算した列など，ほかのツールが同じ形式で置く派生データ
+
+np.memmap で開くので，必要な列・範囲だけがディスクから読まれる．
+元ログが更新されていればテキストを解析し直す．
+追記（append_columns）ができるので，書き込み中のログの取り込みにも使える
+（follow.py は同じ形式で <ログ名>.follow/ に作り，解析済みのバイト位置 "offset" も meta.json に書く）．
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+from logparser import load_log
+
+CACHE_SUFFIX = ".cols"
+COLUMN_SUFFIX = ".f8"
+META_FILE = "meta.json"
+TABLES = ("data", "ctrl")
+
+
+# ------------------------------------------------------------
+# 列の読み書き
+# ------------------------------------------------------------
+def _column_path(directory, name):
+    return os.path.join(directory, name + COLUMN_SUFFIX)
+
+
+def save_columns(directory, columns):
+    """列辞書をディレクトリに書き出す（既存の列は置き換える）"""
+    os.makedirs(directory, exist_ok=True)
+    for name, values in columns.items():
+        np.ascontiguousarray(values, dtype="<f8").tofile(_column_path(directory, name))
+
+
+def append_columns(directory, columns):
+    """列辞書を既存の列の後ろに追記する．全列の行数は揃っている前提"""
+    os.makedirs(directory, exist_ok=True)
+    for name, values in columns.items():
+        with open(_column_path(directory, name), "ab") as f:
+            np.ascontiguousarray(values, dtype="<f8").tofile(f)
+
+
+def truncate_columns(directory, rows):
+    """全列を先頭 rows 行に切り詰める（追記の途中で止まった分を捨てる）"""
+    for name in column_names(directory):
+        path = _column_path(directory, name)
+        if os.path.getsize(path) > rows * 8:
+            os.truncate(path, rows * 8)
+
+
+def column_names(directory):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(entry[:-len(COLUMN_SUFFIX)] for entry in os.listdir(directory) if entry.endswith(COLUMN_SUFFIX))
+
+
+def load_columns(directory, names=None, mode="r"):
+    """
+    列を np.memmap で開く（空の列は長さ 0 の配列）
+    @param names 読む列名．None なら全列
+    """
+    columns = {}
+    for name in names or column_names(directory):
+        path = _column_path(directory, name)
+        if os.path.getsize(path) == 0:
+            columns[name] = np.empty(0)
+        else:
+            columns[name] = np.memmap(path, dtype="<f8", mode=mode)
+    return columns
+
+
+# ------------------------------------------------------------
+# ログのキャッシュ
+# ------------------------------------------------------------
+def cache_dir_for(log_path):
+    return log_path + CACHE_SUFFIX
+
+
+def read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, META_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_meta(cache_dir, meta):
+    """一時ファイルに書いてから置き換える（途中で止まっても古い meta.json が残る）"""
+    path = os.path.join(cache_dir, META_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def source_stamp(log_path):
+    stat = os.stat(log_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def build_cache(log_path, cache_dir=None):
+    """
+    ログを解析して列キャッシュを作り直す（派生列などキャッシュ内の他の内容は消える）
+    @return キャッシュのディレクトリ
+    """
+    cache_dir = cache_dir or cache_dir_for(log_path)
+    stamp = source_stamp(log_path)
+    if os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
+    data, ctrl = load_log(log_path)
+    for table, columns in zip(TABLES, (data, ctrl)):
+        save_columns(os.path.join(cache_dir, table), columns)
+    write_meta(cache_dir, {
+        "source": os.path.basename(log_path),
+        **stamp,
+        "rows": {"data": len(data["time_ms"]), "ctrl": len(ctrl["time_ms"])},
+    })
+    return cache_dir
+
+
+def is_fresh(log_path, cache_dir=None):
+    """
+    キャッシュが元ログの全部を含むか
+    （follow.py のキャッシュは書きかけの最後の行を含まないので，"offset" がログの終わりまで来ていること）
+    """
+    meta = read_meta(cache_dir or cache_dir_for(log_path))
+    if meta is None:
+        return False
+    stamp = source_stamp(log_path)
+    return (meta.get("size") == stamp["size"] and meta.get("mtime_ns") == stamp["mtime_ns"]
+            and meta.get("offset", stamp["size"]) == stamp["size"])
+
+
+def load_log_cached(log_path, cache_dir=None, mode="r"):
+    """
+    logparser.load_log() と同じ (data, ctrl) を，キャッシュの memmap で返す
+    キャッシュが無いか古ければ作り直す
+    """
+    cache_dir = cache_dir or cache_dir_for(log_path)
+    if not is_fresh(log_path, cache_dir):
+        build_cache(log_path, cache_dir)
+    return tuple(load_columns(os.path.join(cache_dir, table), mode=mode) for table in TABLES)
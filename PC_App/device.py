@@ -0,0 +1,227 @@
+"""
+本番ファームウェアとのシリアル通信
+
+待機モード（赤 LED 点灯中）の handleEEPROMSerial() が 1 行ずつ受け付ける．
+  <16進フレーム>\\n : "Recieved: ..." と decodeData() の表示を返し，EEPROM に保存
+                    （表示は EEPROM から読み直した設定なので，拒否されると前の設定が表示される）
+  R\\n             : "Stored: <16進フレーム>"（無効なら "Stored: NONE"）を返すだけ
+"""
+
+import time
+
+import serial.tools.list_ports
+
+import spans
+from frame import CLOCK_FIELDS, decode_frame
+from transport import open_transport
+
+BAUDRATE = 9600
+RESET_WAIT = 3.0  # ポートを開いた時のリセットから setup() の delay(2000) が終わるまで
+READBACK_COMMAND = "R"
+STORED_PREFIX = "Stored: "
+ECHO_PREFIX = "Recieved: "  # ファームウェアの綴りのまま
+LAST_DECODE_LINE = "Thresh"  # decodeData() が最後に表示する行
+
+
+# ------------------------------------------------------------
+# 接続
+# ------------------------------------------------------------
+def open_port(port, baudrate=BAUDRATE, reset_wait=RESET_WAIT):
+    """
+    ポートを開き，ボードが再起動して受付可能になるまで待つ
+    port には transport.py の URL（loop://, emu:// など）も使える．実機以外はリセットを待たない
+    @return transport.Metered（serial.Serial と同じように使え，metrics() で計測値を返す）
+    """
+    with spans.span("port.open", port=port) as span:
+        ser = open_transport(port, baudrate, timeout=0.1)
+        span.set(kind=ser.kind)
+    if ser.kind == "serial":
+        with spans.span("port.reset_wait", port=port):
+            time.sleep(reset_wait)
+    ser.reset_input_buffer()
+    return ser
+
+
+def read_lines(ser, timeout):
+    """timeout 秒経つまで受信した行を順に返す"""
+    deadline = time.monotonic() + timeout
+    buffer = b""
+    while time.monotonic() < deadline:
+        chunk = ser.read(ser.in_waiting or 1)
+        if not chunk:
+            continue
+        buffer += chunk
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            yield line.decode("ascii", errors="replace").strip()
+
+
+def resolve_port(device, ports=None):
+    """
+    マニフェストの device（ポート名または USB シリアル番号）から接続先のポートを探す
+    @return ポート名．見つからなければ None
+    """
+    if "://" in device:
+        return device  # transport.py の URL はそのまま使う
+    if ports is None:
+        with spans.span("ports.enumerate"):
+            ports = serial.tools.list_ports.comports()
+    for port in ports:
+        if device == port.device or (port.serial_number and device == port.serial_number):
+            return port.device
+    return None
+
+
+# ------------------------------------------------------------
+# 読み出し・書き込み
+# ------------------------------------------------------------
+def read_stored_frame(ser, timeout=3.0):
+    """
+    ボードに保存されているフレームを読み出す
+    @return フレームのバイト列．EEPROM に有効なフレームが無ければ None
+    """
+    with spans.span("readback") as span:
+        ser.write((READBACK_COMMAND + "\n").encode())
+        for line in read_lines(ser, timeout):
+            if line.startswith(STORED_PREFIX):
+                text = line[len(STORED_PREFIX):].strip()
+                span.set(stored=text != "NONE")
+                if text == "NONE":
+                    return None
+                return bytes.fromhex(text)
+    raise TimeoutError("No readback response (is the board in idle mode?)")
+
+
+def expected_reply(frame):
+    """
+    フレームを受理したボードが返すはずの行（"Recieved: ..." と decodeData() の表示 2 回．
+    writeEEPROM() と readEEPROM() がそれぞれ表示する）
+    符号拡張などの癖も含めて firmware_model で計算する
+    """
+    from firmware_model import decode_data, decode_lines
+
+    text = frame.hex().upper()
+    return [ECHO_PREFIX + text] + decode_lines(decode_data(frame)) * 2
+
+
+def send_attempt(ser, frame, timeout):
+    """
+    フレームを 1 回送り，返事を確かめる
+    @return 試行の記録 {"status", "echo_s", "rtt_s", "detail", "lines"}
+      status: "ok" | "timeout"（返事が無い）| "rejected"（エコーの後に設定の表示が無い）
+              | "mismatch"（エコーや表示された値が送った値と違う）
+    """
+    expected = expected_reply(frame)
+    started = time.monotonic()
+    with spans.span("send.write"):
+        ser.write((frame.hex().upper() + "\n").encode())
+    record = {"status": "timeout", "echo_s": None, "rtt_s": None, "detail": "", "lines": []}
+    lines = record["lines"]
+    for line in read_lines(ser, timeout):
+        if not lines and not line.startswith(ECHO_PREFIX):
+            continue  # 前の応答やセンシング中の表示の残り
+        lines.append(line)
+        if len(lines) == 1:
+            # 送信と readStringUntil('\n') の受信・エコーの表示までの時間
+            record["echo_s"] = time.monotonic() - started
+            spans.observe("send.wait_echo", record["echo_s"])
+            if line != expected[0]:
+                # 送る途中で化けた．ボードは拒否するので残りを待たない
+                record["status"] = "mismatch"
+                record["detail"] = f"echo {line!r}"
+                return record
+        if line.startswith(LAST_DECODE_LINE) and (len(lines) >= len(expected) or lines != expected[:len(lines)]):
+            # 2 回目の表示（readEEPROM() の保存済みの設定）まで待つ．拒否されたときは
+            # 保存済みの設定の表示が 1 回だけで，1 回目から値が違う
+            record["rtt_s"] = time.monotonic() - started
+            spans.observe("send.wait_decode", record["rtt_s"] - record["echo_s"])
+            break
+    if record["rtt_s"] is None:
+        if lines:
+            # エコーはあったが decodeData() の表示が無い：拒否され，EEPROM にも有効な設定が無い
+            record["status"] = "rejected"
+        record["detail"] = " | ".join(lines) or "no reply"
+        return record
+    with spans.span("send.verify"):
+        record["status"], record["detail"] = _verify_reply(lines, expected)
+    return record
+
+
+def _verify_reply(lines, expected):
+    """@return ("ok" | "mismatch", 説明)"""
+    for got, want in zip(lines, expected):
+        if got != want:
+            return "mismatch", f"expected {want!r}, got {got!r}"
+    if len(lines) != len(expected):
+        return "mismatch", f"expected {len(expected)} lines, got {len(lines)}"
+    return "ok", ""
+
+
+def send_frame_acked(ser, frame, deadline=15.0, attempt_timeout=3.0, backoff=0.5, max_backoff=4.0):
+    """
+    フレームを送り，ボードが同じ値を返すまで deadline 秒まで送り直す（待ち時間は倍々に延ばす）
+    書き込みを拒否されると readEEPROM() は前の設定を表示するので，値の比較で検出できる
+    @return (成功した試行の応答行, 全試行の記録のリスト)
+    """
+    attempts = []
+    end = time.monotonic() + deadline
+    delay = backoff
+    while True:
+        remaining = end - time.monotonic()
+        with spans.span("send.attempt", attempt=len(attempts) + 1) as span:
+            record = send_attempt(ser, frame, min(attempt_timeout, max(remaining, 0.1)))
+            span.set(status=record["status"])
+        record["attempt"] = len(attempts) + 1
+        attempts.append(record)
+        spans.event("send.attempt", status=record["status"], echo_s=record["echo_s"], rtt_s=record["rtt_s"])
+        if record["status"] == "ok":
+            return record["lines"], attempts
+        if time.monotonic() + delay >= end:
+            summary = "; ".join(f"#{a['attempt']} {a['status']} ({a['detail']})" for a in attempts)
+            raise TimeoutError(f"Frame not acknowledged after {len(attempts)} attempts: {summary}")
+        with spans.span("send.backoff", delay_s=delay):
+            time.sleep(delay)
+        ser.reset_input_buffer()
+        delay = min(delay * 2, max_backoff)
+
+
+def send_frame(ser, frame, timeout=15.0):
+    """
+    フレームを送信し，decodeData() の表示が終わるまでの応答行を返す（send_frame_acked() の簡易版）
+    """
+    return send_frame_acked(ser, frame, deadline=timeout)[0]
+
+
+def format_attempts(attempts):
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.0f} ms"
+
+    return ", ".join(f"#{a['attempt']} {a['status']} echo {ms(a['echo_s'])} rtt {ms(a['rtt_s'])}" for a in attempts)
+
+
+# ------------------------------------------------------------
+# 比較
+# ------------------------------------------------------------
+def stored_params(frame):
+    """読み出したフレームを設定値の辞書にする．解釈できなければ None"""
+    if frame is None:
+        return None
+    try:
+        return decode_frame(frame)
+    except ValueError:
+        return None
+
+
+def config_diff(stored, desired, ignore=CLOCK_FIELDS):
+    """
+    保存済みの設定と送りたい設定をフィールドごとに比べる
+    @return {フィールド名: (保存値, 希望値)}．時刻（ignore）は比較しない
+    """
+    diff = {}
+    for key, value in desired.items():
+        if key in ignore:
+            continue
+        current = None if stored is None else stored.get(key)
+        if current != value:
+            diff[key] = (current, value)
+    return diff
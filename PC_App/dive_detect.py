@@ -0,0 +1,248 @@
+"""
+POUT_DEPTH だけからダイブを見つける（CTRL 行の無い logMode 2/3 のログ用）
+
+logMode 2/3 では handleSDcard() が CTRL 行を書かないので，バルブの開閉でダイブを
+区切れない（gas_budget.py など）．ここでは DATA 行の水深の列だけを使う．
+
+  1. 平滑化   : 前後 --smooth-s 秒の移動平均（累積和と searchsorted．NaN は除く）
+  2. ヒステリシス: --enter-m より深くなったら潜航中，--exit-m より浅くなったら水面．
+                   その間の値では直前の状態を保つ（水面近くの波でダイブが割れない）
+  3. 選別     : --min-duration-s より短いもの，最大水深が --min-depth-m に届かないものは捨てる
+  4. 底       : 平滑化した水深が最大から --plateau-m 以内の区間．--plateau-s 以上続けば
+                "plateau"（底に留まった），短ければ "peak"（V 字に折り返した）
+
+timeNowMs が戻ったところ（再起動．logparser.boots()）ではダイブを切る．
+DIVE_COUNT があれば，divedCount が増えた回数を各ダイブ（開始から次のダイブの開始まで）に
+割り当てて突き合わせる．ctrlValve() は 1 サイクルの最後（給気弁の閉）で 1 増やすので，
+増えなかったダイブ・2 回以上増えたダイブ・ダイブの外で増えた分を報告する．
+起動の最初から潜っていた，または最後まで潜っていたダイブは partial とし，突き合わせの不一致に数えない．
+全部を配列の演算で行うので，何時間分のログでも数 ms で終わる．
+
+使い方:
+  python dive_detect.py 0615_12.csv [--enter-m 1.0 --exit-m 0.5] [--csv dives.csv]
+"""
+
+import argparse
+import csv
+import datetime
+import time
+
+import numpy as np
+
+from colstore import load_log_cached
+from logparser import boots
+
+SMOOTH_S = 5.0
+ENTER_M = 1.0
+EXIT_M = 0.5
+MIN_DURATION_S = 20.0
+MIN_DEPTH_M = 2.0
+PLATEAU_M = 0.5
+PLATEAU_S = 30.0
+
+SPAN = 2.0 ** 40  # (boot, timeNowMs) を 1 つの単調な値にする
+
+CSV_COLUMNS = (
+    "boot", "start_ms", "end_ms", "start_rtc", "end_rtc", "duration_s", "max_depth", "max_ms",
+    "bottom_start_ms", "bottom_end_ms", "bottom_s", "shape", "partial", "dive_count", "counted",
+)
+
+
+# ------------------------------------------------------------
+# 配列の処理
+# ------------------------------------------------------------
+def smooth(keys, values, window_s):
+    """前後 window_s / 2 秒の移動平均（keys は単調増加の ms．NaN は数えない）"""
+    finite = np.isfinite(values)
+    total = np.concatenate(([0.0], np.cumsum(np.where(finite, values, 0.0))))
+    count = np.concatenate(([0], np.cumsum(finite)))
+    half = window_s * 500
+    low = np.searchsorted(keys, keys - half, side="left")
+    high = np.searchsorted(keys, keys + half, side="right")
+    n = count[high] - count[low]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, (total[high] - total[low]) / n, np.nan)
+
+
+def hysteresis(values, enter, exit, reset=None):
+    """
+    enter 以上で True，exit 以下で False，その間（と NaN）は直前の状態を保つ
+    reset の行（起動の最初など）で決まらなければ False から始める
+    """
+    state = np.where(values >= enter, 1, np.where(values <= exit, 0, -1))
+    if reset is not None:
+        state[reset & (state < 0)] = 0
+    decided = np.where(state >= 0, np.arange(len(state)), 0)
+    np.maximum.accumulate(decided, out=decided)
+    return state[decided] == 1
+
+
+def segments(active, boot):
+    """@return 連続して active な区間の (最初の行, 最後の行)．起動をまたがない"""
+    same_boot = np.concatenate((boot[1:] == boot[:-1], [False]))
+    continues = active & np.concatenate((active[1:], [False])) & same_boot
+    started = np.concatenate(([False], continues[:-1]))
+    return np.flatnonzero(active & ~started), np.flatnonzero(active & ~continues)
+
+
+def reduce_segments(ufunc, values, starts, ends):
+    """区間 [starts, ends] ごとの ufunc.reduce（reduceat を区間の始めと終わりの次で使う）"""
+    if not len(starts):
+        return np.empty(0, dtype=values.dtype)
+    padded = np.append(values, values[:1])  # ends + 1 が配列の長さになってもよいように
+    bounds = np.column_stack((starts, ends + 1)).ravel()
+    return ufunc.reduceat(padded, bounds)[::2]
+
+
+# ------------------------------------------------------------
+# ダイブの検出
+# ------------------------------------------------------------
+def detect(data, smooth_s=SMOOTH_S, enter_m=ENTER_M, exit_m=EXIT_M, min_duration_s=MIN_DURATION_S,
+           min_depth_m=MIN_DEPTH_M, plateau_m=PLATEAU_M, plateau_s=PLATEAU_S):
+    """
+    @return ダイブごとの列の辞書（CSV_COLUMNS．shape は文字列の配列）と，
+            ダイブの外で DIVE_COUNT が増えた回数（DIVE_COUNT が無ければ None）
+    """
+    time_ms = np.asarray(data["time_ms"])
+    depth = np.asarray(data["POUT_DEPTH"])
+    boot = boots(time_ms)
+    keys = boot * SPAN + time_ms
+    smoothed = smooth(keys, depth, smooth_s)
+    first_of_boot = np.concatenate(([True], boot[1:] != boot[:-1]))
+    last_of_boot = np.concatenate((first_of_boot[1:], [True]))
+    starts, ends = segments(hysteresis(smoothed, enter_m, exit_m, first_of_boot), boot)
+
+    max_depth = reduce_segments(np.fmax, depth, starts, ends)
+    duration_s = (time_ms[ends] - time_ms[starts]) / 1000
+    keep = (duration_s >= min_duration_s) & (max_depth >= min_depth_m)
+    starts, ends, max_depth, duration_s = starts[keep], ends[keep], max_depth[keep], duration_s[keep]
+
+    # 行ごとにどのダイブに入るか（区間は重ならず並んでいる）
+    rows = np.arange(len(time_ms))
+    row_dive = np.maximum(np.searchsorted(starts, rows, side="right") - 1, 0)
+    in_dive = (rows <= ends[row_dive]) & (rows >= starts[row_dive]) if len(starts) else np.zeros(len(rows), bool)
+
+    # 最大水深の時刻と，底（平滑化した水深が最大から plateau_m 以内）の区間
+    peak = reduce_segments(np.fmax, smoothed, starts, ends)
+    at_max = in_dive & (depth == np.append(max_depth, np.nan)[row_dive])
+    bottom = in_dive & (smoothed >= np.append(peak, np.nan)[row_dive] - plateau_m)
+    max_ms = reduce_segments(np.fmin, np.where(at_max, time_ms, np.inf), starts, ends)
+    bottom_start = reduce_segments(np.fmin, np.where(bottom, time_ms, np.inf), starts, ends)
+    bottom_end = reduce_segments(np.fmax, np.where(bottom, time_ms, -np.inf), starts, ends)
+    bottom_s = (bottom_end - bottom_start) / 1000
+
+    dives = {
+        "boot": boot[starts], "start_ms": time_ms[starts], "end_ms": time_ms[ends],
+        "start_rtc": np.asarray(data["rtc"])[starts], "end_rtc": np.asarray(data["rtc"])[ends],
+        "duration_s": duration_s, "max_depth": max_depth, "max_ms": max_ms,
+        "bottom_start_ms": bottom_start, "bottom_end_ms": bottom_end, "bottom_s": bottom_s,
+        "shape": np.where(bottom_s >= plateau_s, "plateau", "peak"),
+        "partial": first_of_boot[starts] | last_of_boot[ends],
+    }
+    outside = cross_check(dives, data["DIVE_COUNT"], boot, keys, keys[starts])
+    return dives, outside
+
+
+def cross_check(dives, dive_count, boot, keys, start_keys):
+    """
+    DIVE_COUNT の増加を，開始がそれより前で最も近いダイブ（同じ起動）に割り当てる
+    dives に "dive_count"（開始時の値）と "counted"（増えた回数）を加える
+    @return どのダイブにも入らなかった増加の回数．DIVE_COUNT が無ければ None
+    """
+    dive_count = np.asarray(dive_count)
+    n = len(start_keys)
+    if not np.isfinite(dive_count).any():
+        dives["dive_count"] = np.full(n, np.nan)
+        dives["counted"] = np.full(n, np.nan)
+        return None
+    # 最初の行から前の値で埋めた DIVE_COUNT（NaN の行を挟んでも増加を数えられるように）
+    finite = np.isfinite(dive_count)
+    filled = dive_count[np.maximum.accumulate(np.where(finite, np.arange(len(dive_count)), 0))]
+    steps = np.diff(filled)
+    rows = np.flatnonzero((steps > 0) & (boot[1:] == boot[:-1])) + 1
+    index = np.searchsorted(start_keys, keys[rows], side="right") - 1
+    matched = index >= 0
+    matched[matched] &= dives["boot"][index[matched]] == boot[rows[matched]]
+    weights = steps[rows - 1]
+    dives["dive_count"] = filled[np.searchsorted(keys, start_keys)] if n else np.empty(0)
+    dives["counted"] = np.bincount(index[matched], weights=weights[matched], minlength=n)[:n]
+    return int(weights[~matched].sum())
+
+
+# ------------------------------------------------------------
+# 表示
+# ------------------------------------------------------------
+def format_rtc(value):
+    if not np.isfinite(value):
+        return "-"
+    return datetime.datetime.fromtimestamp(value, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def print_dives(path, dives, outside):
+    for i in range(len(dives["start_ms"])):
+        counted = dives["counted"][i]
+        check = ""
+        if np.isfinite(counted) and counted != 1 and not dives["partial"][i]:
+            check = "  no DIVE_COUNT increment" if counted == 0 else f"  DIVE_COUNT +{counted:.0f}"
+        count = dives["dive_count"][i]
+        print(f"{path}: boot {dives['boot'][i]} {format_rtc(dives['start_rtc'][i])} "
+              f"@{dives['start_ms'][i]:.0f}-{dives['end_ms'][i]:.0f} ms  {dives['duration_s'][i]:7.1f} s  "
+              f"max {dives['max_depth'][i]:5.1f} m  {dives['shape'][i]:7s} bottom {dives['bottom_s'][i]:6.1f} s"
+              + (f"  count {count:.0f}" if np.isfinite(count) else "")
+              + ("  partial" if dives["partial"][i] else "") + check)
+    if outside:
+        print(f"{path}: DIVE_COUNT increased {outside} times outside detected dives")
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("log",) + CSV_COLUMNS)
+        writer.writerows(rows)
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="dive_detect", description="Find dives from POUT_DEPTH alone (no CTRL rows needed)")
+    parser.add_argument("logs", nargs="+", help="log files written by handleSDcard() (any logMode)")
+    parser.add_argument("--smooth-s", type=float, default=SMOOTH_S, help="moving average window [s]")
+    parser.add_argument("--enter-m", type=float, default=ENTER_M, help="a dive starts deeper than this [m]")
+    parser.add_argument("--exit-m", type=float, default=EXIT_M, help="a dive ends shallower than this [m]")
+    parser.add_argument("--min-duration-s", type=float, default=MIN_DURATION_S, help="drop shorter dives [s]")
+    parser.add_argument("--min-depth-m", type=float, default=MIN_DEPTH_M, help="drop dives shallower than this [m]")
+    parser.add_argument("--plateau-m", type=float, default=PLATEAU_M, help="bottom is within this of the max [m]")
+    parser.add_argument("--plateau-s", type=float, default=PLATEAU_S, help="bottom this long is a plateau [s]")
+    parser.add_argument("--csv", help="write one row per dive to this file")
+    args = parser.parse_args(argv)
+    if args.exit_m > args.enter_m:
+        parser.error("--exit-m must not be deeper than --enter-m")
+
+    rows = []
+    mismatched = 0
+    for path in args.logs:
+        try:
+            data, _ = load_log_cached(path)
+        except (OSError, ValueError) as e:
+            print(f"Error: {path}: {e}")
+            return False
+        started = time.perf_counter()
+        dives, outside = detect(data, args.smooth_s, args.enter_m, args.exit_m, args.min_duration_s,
+                                args.min_depth_m, args.plateau_m, args.plateau_s)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print_dives(path, dives, outside)
+        print(f"{path}: {len(dives['start_ms'])} dives in {len(data['time_ms'])} rows ({elapsed_ms:.1f} ms)")
+        counted = dives["counted"]
+        mismatched += int(np.count_nonzero(np.isfinite(counted) & (counted != 1) & ~dives["partial"]))
+        mismatched += 1 if outside else 0
+        rows.extend([path] + [value.item() for value in values]
+                    for values in zip(*(dives[name] for name in CSV_COLUMNS)))
+    if args.csv:
+        write_csv(args.csv, rows)
+        print(f"{len(rows)} dives written to {args.csv}")
+    return mismatched == 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() is not False else 1)
@@ -0,0 +1,261 @@
+"""
+フリートマニフェストから EEPROM イメージをまとめて作り，吸い出したイメージを検証する
+
+イメージの中身は writeEEPROM() と同じく
+  アドレス 0 : 0xAA
+  アドレス 1 : フレーム長
+  アドレス 2〜 : フレーム（HEADER〜FOOTER）
+  残り      : 0xFF（消去状態）
+出力は avrdude でそのまま書き込める Intel HEX（.eep）または生バイナリ（.bin）．
+  avrdude -p m328p -c arduino -P COM3 -U eeprom:w:TL-01.eep:i
+
+readEEPROM() は起動のたびに保存された時刻で RTC を設定するため，
+イメージの時刻はマニフェストの year〜second 列，無ければ生成時刻になる．
+
+使い方:
+  python eeprom_image.py build fleet.csv -o images/
+  python eeprom_image.py verify fleet.csv dumps/
+"""
+
+import argparse
+import datetime
+import os
+
+import numpy as np
+
+from firmware_model import EEPROM_ERASED, EEPROM_MARKER, EEPROM_SIZE
+from frame import CLOCK_FIELDS, FOOTER, FRAME_LENGTH, HEADER
+from manifest import load_manifest
+
+IMAGE_SUFFIXES = (".eep", ".hex", ".bin")
+
+
+# ------------------------------------------------------------
+# イメージ生成（全機体を 1 回の NumPy 演算で作る）
+# ------------------------------------------------------------
+def encode_frames(params_list):
+    """設定値の辞書のリストから (N, 20) の uint8 配列を作る"""
+    def column(key):
+        return np.array([p[key] for p in params_list], dtype=np.int64)
+
+    frames = np.empty((len(params_list), FRAME_LENGTH), dtype=np.uint8)
+    frames[:, 0] = HEADER
+    frames[:, 1] = column("year") - 2000
+    for i, key in enumerate(CLOCK_FIELDS[1:], start=2):
+        frames[:, i] = column(key)
+    for i, key in zip((7, 9, 11, 13), ("sup_start", "sup_stop", "exh_start", "exh_stop")):
+        value = column(key)
+        frames[:, i] = value >> 8
+        frames[:, i + 1] = value & 0xFF
+    frames[:, 15] = ((column("lcd_mode") & 0x0F) << 4) | (column("log_mode") & 0x0F)
+    frames[:, 16] = column("dive_count")
+    frames[:, 17] = column("press_threshold")
+    frames[:, 18] = frames[:, :18].sum(axis=1, dtype=np.uint64) & 0xFF
+    frames[:, 19] = FOOTER
+    return frames
+
+
+def build_images(frames, size=EEPROM_SIZE):
+    """(N, L) のフレーム配列から (N, size) の EEPROM イメージ配列を作る"""
+    n, length = frames.shape
+    images = np.full((n, size), EEPROM_ERASED, dtype=np.uint8)
+    images[:, 0] = EEPROM_MARKER
+    images[:, 1] = length
+    images[:, 2:2 + length] = frames
+    return images
+
+
+def fill_clock(params_list, now=None):
+    """時刻の列が無い行に now（省略時は現在時刻）を入れる"""
+    if now is None:
+        now = datetime.datetime.now()
+    for params in params_list:
+        for key in CLOCK_FIELDS:
+            params.setdefault(key, getattr(now, key))
+    return params_list
+
+
+# ------------------------------------------------------------
+# イメージ検証
+# ------------------------------------------------------------
+def check_structure(images):
+    """
+    readEEPROM() が受理するかを全イメージまとめて検査する
+    @return 受理できるイメージのマスク
+    """
+    length = images[:, 1].astype(np.int64)
+    rows = np.arange(len(images))
+    footer_at = np.clip(length + 1, 0, images.shape[1] - 1)
+    checksum_at = np.clip(length, 0, images.shape[1] - 1)
+
+    # HEADER〜チェックサム直前までの和（長さが機体ごとに違っても良いようにマスクする）
+    address = np.arange(images.shape[1])
+    in_data = (address >= 2) & (address[None, :] < length[:, None])
+    total = np.where(in_data, images, 0).sum(axis=1, dtype=np.uint64) & 0xFF
+
+    return (
+        (length >= 3)
+        & (length + 2 <= images.shape[1])
+        & (images[:, 2] == HEADER)
+        & (images[rows, footer_at] == FOOTER)
+        & (images[rows, checksum_at] == total)
+    )
+
+
+def verify_images(expected, dumps):
+    """
+    期待イメージと吸い出したイメージを 1 Byte ずつ比較する
+    @return (一致マスク, 構造が正しいマスク, 最初に食い違うアドレス（一致なら -1）)
+    """
+    diff = expected != dumps
+    matched = ~diff.any(axis=1)
+    first = np.where(matched, -1, diff.argmax(axis=1))
+    return matched, check_structure(dumps), first
+
+
+# ------------------------------------------------------------
+# ファイル入出力
+# ------------------------------------------------------------
+def write_intel_hex(image, path, record_size=16):
+    """Intel HEX 形式で書き出す"""
+    lines = []
+    for address in range(0, len(image), record_size):
+        chunk = bytes(image[address:address + record_size])
+        record = bytes([len(chunk), address >> 8, address & 0xFF, 0x00]) + chunk
+        checksum = (-sum(record)) & 0xFF
+        lines.append(":" + (record + bytes([checksum])).hex().upper())
+    lines.append(":00000001FF")
+    with open(path, "w", encoding="ascii") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def read_intel_hex(path, size=EEPROM_SIZE):
+    """Intel HEX を読んで size Byte のイメージにする（記載の無い番地は 0xFF）"""
+    image = bytearray([EEPROM_ERASED]) * size
+    with open(path, "r", encoding="ascii") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith(":"):
+                raise ValueError(f"{path}:{line_no}: not an Intel HEX record")
+            record = bytes.fromhex(line[1:])
+            if sum(record) & 0xFF:
+                raise ValueError(f"{path}:{line_no}: record checksum mismatch")
+            count, address, kind = record[0], record[1] << 8 | record[2], record[3]
+            if kind == 0x01:
+                break
+            if kind == 0x00:
+                image[address:address + count] = record[4:4 + count]
+    return bytes(image[:size])
+
+
+def read_image(path, size=EEPROM_SIZE):
+    """拡張子で Intel HEX と生バイナリを判別して読み込む"""
+    if path.lower().endswith(".bin"):
+        with open(path, "rb") as f:
+            image = f.read()
+        return image[:size].ljust(size, bytes([EEPROM_ERASED]))
+    return read_intel_hex(path, size)
+
+
+def find_image(directory, device):
+    for suffix in IMAGE_SUFFIXES:
+        path = os.path.join(directory, device + suffix)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+# ------------------------------------------------------------
+# コマンド
+# ------------------------------------------------------------
+def build_command(args):
+    entries = load_manifest(args.manifest)
+    devices = [device for device, _ in entries]
+    params_list = fill_clock([params for _, params in entries])
+    images = build_images(encode_frames(params_list))
+
+    os.makedirs(args.output, exist_ok=True)
+    for device, image in zip(devices, images):
+        path = os.path.join(args.output, device + (".bin" if args.format == "bin" else ".eep"))
+        if args.format == "bin":
+            with open(path, "wb") as f:
+                f.write(image.tobytes())
+        else:
+            write_intel_hex(image, path)
+    print(f"{len(devices)} images written to {args.output}")
+
+
+def verify_command(args):
+    entries = load_manifest(args.manifest)
+    devices = [device for device, _ in entries]
+
+    dumps = np.full((len(devices), EEPROM_SIZE), EEPROM_ERASED, dtype=np.uint8)
+    missing = np.zeros(len(devices), dtype=bool)
+    for i, device in enumerate(devices):
+        path = find_image(args.dumps, device)
+        if path is None:
+            missing[i] = True
+        else:
+            dumps[i] = np.frombuffer(read_image(path), dtype=np.uint8)
+
+    # 時刻は書き込んだ時点のものが残っているはずなので，マニフェストに無ければダンプから取る
+    params_list = []
+    for (device, params), dump in zip(entries, dumps):
+        params = dict(params)
+        if dump[2] == HEADER:
+            params.setdefault("year", 2000 + int(dump[3]))
+            for key, value in zip(CLOCK_FIELDS[1:], dump[4:9]):
+                params.setdefault(key, int(value))
+        params_list.append(params)
+    expected = build_images(encode_frames(fill_clock(params_list)))
+
+    if args.config_only:
+        expected = expected[:, :2 + FRAME_LENGTH]
+        dumps = dumps[:, :2 + FRAME_LENGTH]
+    matched, structured, first = verify_images(expected, dumps)
+
+    failures = 0
+    for i, device in enumerate(devices):
+        if missing[i]:
+            status = "MISSING"
+        elif matched[i]:
+            status = "OK"
+        else:
+            status = f"MISMATCH at 0x{first[i]:03X}"
+            if not structured[i]:
+                status += " (frame rejected by readEEPROM)"
+        failures += status != "OK"
+        print(f"{device}: {status}")
+    print(f"{len(devices) - failures}/{len(devices)} images verified")
+    return failures == 0
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and verify Triton-Lite EEPROM images")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="build images from a fleet manifest")
+    build_parser.add_argument("manifest")
+    build_parser.add_argument("-o", "--output", default="images")
+    build_parser.add_argument("--format", choices=("hex", "bin"), default="hex")
+    build_parser.set_defaults(func=build_command)
+
+    verify_parser = commands.add_parser("verify", help="compare dumped images with a fleet manifest")
+    verify_parser.add_argument("manifest")
+    verify_parser.add_argument("dumps", help="directory holding <device>.eep / .hex / .bin dumps")
+    verify_parser.add_argument("--config-only", action="store_true", help="compare only the marker, length and frame")
+    verify_parser.set_defaults(func=verify_command)
+
+    args = parser.parse_args()
+    try:
+        ok = args.func(args)
+    except ValueError as e:
+        print(f"Error: {e}")
+        ok = False
+    if ok is False:
+        raise SystemExit(1)
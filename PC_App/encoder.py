@@ -3,8 +3,8 @@ import datetime
 """
 year, month, day, hour, minute, second : 1 Byte (0‑255)
 sup_start, sup_stop, exh_start, exh_stop : 2 Bytes (0‑65535)
-dive_count, press_threshold            : 1 Byte (0‑255)   ←★追加
 lcd_mode, log_mode                     : 4 bit ずつ (0‑15)
+dive_count, press_threshold            : 1 Byte (0‑255)   ←★追加
 checksum                               : 1 Byte
 HEADER(0x24) … DATA … CHECKSUM … FOOTER(0x3B)
 詳細情報 : https://1drv.ms/x/s!Ap1QA7D_yZ9yjLwx6heJXK6cVo8n1A?e=T9Ugq5
@@ -77,9 +77,9 @@ def encode_data(
         *sup_stop_bytes,
         *exh_start_bytes,
         *exh_stop_bytes,
+        mode_byte,  # decodeData() は d[15] をモードとして読む
         dive_count_byte,
         press_threshold_byte,
-        mode_byte,
     ]
 
     # CHECKSUM
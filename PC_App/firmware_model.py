@@ -0,0 +1,249 @@
+"""
+本番ファームウェア（Arduino/設計/main.ino）の EEPROM 周りを Python で再現したモデル
+
+writeEEPROM() / readEEPROM() / decodeData() と同じ手順・同じ型の振る舞いで
+フレームを検査し，設定値（cfg）を計算する．実機を使わずに EEPROM イメージの
+生成・検証やコーデックの比較をするためのもの．
+"""
+
+# ------------------------------------------------------------
+# ファームウェア側の定数
+# ------------------------------------------------------------
+EEPROM_SIZE = 1024      # ATmega328P
+EEPROM_ERASED = 0xFF
+EEPROM_MARKER = 0xAA    # EEPROM.write(0, 0xAA)
+MAX_DATA_LENGTH = 32
+DECODED_LENGTH = 18     # decodeData() が読む d[0]〜d[17]
+HEADER = 0x24
+FOOTER = 0x3B
+LOG_MODE_BINARY = 4     # 固定長バイナリのログ（ファイル名の拡張子が .bin になる）
+
+
+# ------------------------------------------------------------
+# EEPROM
+# ------------------------------------------------------------
+class EEPROM:
+    """バイト列で表した EEPROM．書き込み回数を数える"""
+
+    def __init__(self, image=None, size=EEPROM_SIZE):
+        if image is None:
+            self.data = bytearray([EEPROM_ERASED]) * size
+        else:
+            self.data = bytearray(image)
+        self.write_count = 0
+
+    def read(self, address):
+        return self.data[address]
+
+    def write(self, address, value):
+        self.data[address] = value & 0xFF
+        self.write_count += 1
+
+    def update(self, address, value):
+        """EEPROM.update() と同じく，値が変わるときだけ書き込む"""
+        if self.data[address] != value & 0xFF:
+            self.write(address, value)
+
+
+# ------------------------------------------------------------
+# AVR の整数演算
+# ------------------------------------------------------------
+def _int16(value):
+    """AVR の int（16 bit）への変換"""
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def _uint32(value):
+    return value & 0xFFFFFFFF
+
+
+# ------------------------------------------------------------
+# 16 進文字列の解釈（String::trim() と sscanf("%2hhx")）
+# ------------------------------------------------------------
+_WHITESPACE = " \t\n\v\f\r"
+_HEX_DIGITS = "0123456789abcdefABCDEF"
+
+
+def scan_hex_byte(text, position):
+    """
+    sscanf(text + position, "%2hhx") の再現
+    空白を読み飛ばし，符号を含めて最大 2 文字を読む（"0x" 接頭辞は扱わない）
+    @return 値．変換に失敗した場合（buf[i] は未初期化のまま）は None
+    """
+    n = len(text)
+    i = position
+    while i < n and text[i] in _WHITESPACE:
+        i += 1
+    width = 2
+    negative = False
+    if i < n and text[i] in "+-":
+        negative = text[i] == "-"
+        i += 1
+        width -= 1
+    digits = ""
+    while width > 0 and i < n and text[i] in _HEX_DIGITS:
+        digits += text[i]
+        i += 1
+        width -= 1
+    if not digits:
+        return None
+    value = int(digits, 16)
+    return (-value if negative else value) & 0xFF
+
+
+def parse_hex_string(text):
+    """
+    handleEEPROMSerial() が受け取った 1 行を writeEEPROM() と同じ手順でバイト列にする
+    len は uint8_t なので str.length() / 2 が 256 以上だと桁あふれする
+    @return バイト値のリスト（変換に失敗したバイトは None）．長さで拒否される場合は None
+    """
+    text = text.strip(_WHITESPACE)
+    length = (len(text) // 2) & 0xFF
+    if length > MAX_DATA_LENGTH or length < 3:
+        return None
+    return [scan_hex_byte(text, 2 * i) for i in range(length)]
+
+
+# ------------------------------------------------------------
+# ファームウェア関数の再現
+# ------------------------------------------------------------
+def check_frame(buf):
+    """
+    writeEEPROM() / readEEPROM() と同じ HEADER・FOOTER・チェックサムの検査
+    @return 受理するなら True
+    """
+    length = len(buf)
+    if length < 3 or buf[0] != HEADER or buf[length - 1] != FOOTER:
+        return False
+    total = 0
+    for i in range(length - 2):
+        total = (total + buf[i]) & 0xFF
+    return total == buf[length - 2]
+
+
+def decode_data(d):
+    """
+    decodeData() の再現．d[7] << 8 は int（16 bit）で計算されるため，
+    0x8000 以上の値は uint32_t への変換で符号拡張される点まで再現する
+    """
+    supply_start = _int16(d[7] << 8 | d[8])
+    exhaust_start = _int16(d[11] << 8 | d[12])
+    log_mode = d[15] & 0x0F
+    extension = "bin" if log_mode == LOG_MODE_BINARY else "csv"
+    return {
+        "rtc": (2000 + d[1], d[2], d[3], d[4], d[5], d[6]),
+        "supplyStartDelayMs": _uint32(_uint32(supply_start) * 1000),
+        "supplyStopDelayMs": _uint32(_int16(d[9] << 8 | d[10])),
+        "exhaustStartDelayMs": _uint32(_uint32(exhaust_start) * 1000),
+        "exhaustStopDelayMs": _uint32(_int16(d[13] << 8 | d[14])),
+        "lcdMode": (d[15] >> 4) & 0x0F,
+        "logMode": log_mode,
+        "diveCount": d[16],
+        "inPressThresh": d[17],
+        "dataFileName": f"{d[2]:02d}{d[3]:02d}_{d[4]:02d}.{extension}",
+    }
+
+
+def write_eeprom(eeprom, buf):
+    """
+    writeEEPROM() の 16 進文字列をバイト列に直した後の処理
+    @return 受理した場合は decode_data() の結果，拒否した場合は None
+    """
+    buf = bytes(buf)
+    if len(buf) > MAX_DATA_LENGTH or not check_frame(buf):
+        return None
+    cfg = decode_data(buf)
+
+    eeprom.update(0, EEPROM_MARKER)
+    eeprom.update(1, len(buf))
+    for i, value in enumerate(buf):
+        eeprom.update(i + 2, value)
+    return cfg
+
+
+def read_frame(eeprom):
+    """
+    loadEEPROMFrame() の再現．readEEPROM() / dumpEEPROM() が使うフレームを取り出す
+    @return フレームのバイト列．検査に通らなければ None
+    """
+    length = eeprom.read(1)
+    if length > MAX_DATA_LENGTH or length < 3 or eeprom.read(2) != HEADER:
+        return None
+    buf = bytes(eeprom.data[2:2 + length])
+    if len(buf) != length or not check_frame(buf):
+        return None
+    return buf
+
+
+def read_eeprom(eeprom):
+    """readEEPROM() の再現．起動時に復元される設定値，または None を返す"""
+    buf = read_frame(eeprom)
+    if buf is None:
+        return None
+    return decode_data(buf)
+
+
+def dump_eeprom(eeprom):
+    """dumpEEPROM() がシリアルに返す行"""
+    buf = read_frame(eeprom)
+    if buf is None:
+        return "Stored: NONE"
+    return "Stored: " + buf.hex().upper()
+
+
+def receive_line(eeprom, text):
+    """
+    待機モードで 1 行受信したときの writeEEPROM() の結果
+    @return ("accept" | "reject" | "undefined", 設定値または None)
+      undefined : 未初期化のバイトや 18 Byte 未満のフレームで decodeData() が
+                  バッファ外を読むなど，結果が実機のメモリ内容に依存する場合
+    """
+    buf = parse_hex_string(text)
+    if buf is None:
+        return "reject", None
+    if buf[0] not in (None, HEADER) or buf[-1] not in (None, FOOTER):
+        return "reject", None
+    if None in buf:
+        return "undefined", None
+    if not check_frame(buf):
+        return "reject", None
+    if len(buf) < DECODED_LENGTH:
+        return "undefined", None
+    return "accept", write_eeprom(eeprom, buf)
+
+
+def decode_lines(cfg):
+    """decodeData() がシリアルに表示する行"""
+    yr, mo, dy, hr, mn, sc = cfg["rtc"]
+    return [
+        f"{yr}/{mo}/{dy} {hr}:{mn}:{sc}",
+        f"Sup Start: {cfg['supplyStartDelayMs']}",
+        f"Sup Stop : {cfg['supplyStopDelayMs']}",
+        f"Exh Start: {cfg['exhaustStartDelayMs']}",
+        f"Exh Stop : {cfg['exhaustStopDelayMs']}",
+        f"LCD Mode : {cfg['lcdMode']}",
+        f"Log Mode : {cfg['logMode']}",
+        f"Dive Cnt : {cfg['diveCount']}",
+        f"Thresh   : {cfg['inPressThresh']}",
+    ]
+
+
+def handle_serial_line(eeprom, text):
+    """
+    handleEEPROMSerial() が 1 行受信したときにシリアルに返す行
+    受理したときは writeEEPROM() と readEEPROM() がそれぞれ decodeData() を呼ぶので，
+    設定の表示が 2 回続く．拒否したときは readEEPROM() の保存済みの設定だけ
+    （"undefined" のフレームは書き込まれなかったものとして扱う）
+    """
+    text = text.strip(_WHITESPACE)
+    if text == "R":
+        return [dump_eeprom(eeprom)]
+    lines = ["Recieved: " + text]
+    status, written = receive_line(eeprom, text)
+    if status == "accept" and written is not None:
+        lines += decode_lines(written)
+    cfg = read_eeprom(eeprom)
+    if cfg is not None:
+        lines += decode_lines(cfg)
+    return lines
@@ -0,0 +1,228 @@
+"""
+書き込み中のログを追いかけて，追記された分だけ colstore と同じ形式の列キャッシュに足す
+
+ベンチ試験中に SD カードのログを何度もコピーし直すと，そのたびに先頭から
+解析し直すことになる．ここではファイルごとに
+  - 解析済みのバイト位置（行の区切りまで）
+  - 書きかけの最後の行（メモリ上の partial）
+を持ち，増えたバイトだけを読んで解析し，append_columns() で列の後ろに足す．
+
+キャッシュは colstore.load_log_cached() の <ログ名>.cols/ とは別の <ログ名>.follow/ に置く
+（load_log_cached() はログが増えていると .cols/ を消して作り直すので，同じ場所だと
+追いかけている途中のキャッシュが消される）．列は colstore.load_columns() で開ける．
+
+解析済みの位置はキャッシュの meta.json（"offset"）に書くので，止めて起動し直しても
+続きから読む．列を足した後に meta.json を書くので，その間で止まった場合は
+meta.json の行数まで列を切り詰めてからやり直す．書きかけの行は起動し直すと
+ファイルから読み直す（1 行分だけ）．
+
+ファイルが短くなった・先頭が変わった（別のログで上書きされた）ときは作り直す．
+先頭は最初の行とその後の HEAD_BYTES バイトで比べる（バイナリログの最初の行は
+どれも同じ "TRLB,..." なので，最初の記録の時刻まで見ないと見分けられない）．
+変化の無いファイルは os.stat() 1 回だけで済ませる．
+
+テキストとバイナリ（logMode 4）のどちらのログも扱う．
+
+使い方:
+  python follow.py "bench/*.csv" "bench/*.bin" [--interval 1.0] [--once]
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import time
+
+import numpy as np
+
+from colstore import TABLES, append_columns, read_meta, save_columns, truncate_columns, write_meta
+from logparser import BINARY_MAGIC, CTRL_COLUMNS, DATA_COLUMNS, binary_columns, parse_binary_header, parse_lines
+
+FOLLOW_SUFFIX = ".follow"
+HEAD_BYTES = 64  # 上書きを見分けるために覚えておく，最初の行より後のバイト数
+MAX_PARTIAL = 64 * 1024  # 改行が来ないまま溜まったらごみとして捨てる
+
+
+def follow_dir_for(log_path):
+    return log_path + FOLLOW_SUFFIX
+
+
+class Follower:
+    """1 ファイル分の追跡状態"""
+
+    def __init__(self, path):
+        self.path = path
+        self.cache_dir = follow_dir_for(path)
+        self.partial = b""
+        self.dtype = None  # バイナリログの記録の型
+        self.seen = None  # 最後に見た (サイズ, 更新時刻)
+        self.meta = read_meta(self.cache_dir)
+        if self.meta is None or "offset" not in self.meta:
+            # follow で作ったキャッシュでなければ作り直す
+            self.reset()
+        else:
+            for table in TABLES:
+                truncate_columns(os.path.join(self.cache_dir, table), self.meta["rows"][table])
+
+    @property
+    def read_offset(self):
+        return self.meta["offset"] + len(self.partial)
+
+    def reset(self):
+        if os.path.isdir(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
+        for table, names in zip(TABLES, (DATA_COLUMNS, CTRL_COLUMNS)):
+            save_columns(os.path.join(self.cache_dir, table), {name: np.empty(0) for name in names})
+        self.partial = b""
+        self.dtype = None
+        self.meta = {
+            "source": os.path.basename(self.path),
+            "size": 0,
+            "mtime_ns": 0,
+            "rows": {table: 0 for table in TABLES},
+            "offset": 0,
+            "head": "",
+        }
+        write_meta(self.cache_dir, self.meta)
+
+    def _replaced(self, f, size):
+        """ファイルが短くなったか，先頭が覚えている内容と違う"""
+        if size < self.read_offset:
+            return True
+        head = bytes.fromhex(self.meta["head"])
+        f.seek(0)
+        return f.read(len(head)) != head
+
+    @staticmethod
+    def _head_complete(head):
+        """最初の行とその後の HEAD_BYTES バイトまで覚えたか"""
+        end = head.find(b"\n")
+        return end >= 0 and len(head) - end - 1 >= HEAD_BYTES
+
+    def _read_head(self, f):
+        f.seek(0)
+        first = f.readline(MAX_PARTIAL)
+        return first + f.read(HEAD_BYTES)
+
+    def _split(self, buffer):
+        """
+        読んだバイト列を解析できる部分と残り（partial）に分ける
+        @return (解析する部分, 解析結果 (data, ctrl) または None)
+        """
+        if self.dtype is not None or (self.meta["offset"] == 0 and buffer.startswith(BINARY_MAGIC)):
+            if self.dtype is None:
+                if b"\n" not in buffer:
+                    self.partial = buffer
+                    return b"", None
+                header, _, buffer = buffer.partition(b"\n")
+                self.dtype = parse_binary_header(header)
+                consumed = header + b"\n"
+            else:
+                consumed = b""
+            whole = len(buffer) // self.dtype.itemsize * self.dtype.itemsize
+            records = np.frombuffer(buffer[:whole], dtype=self.dtype)
+            self.partial = buffer[whole:]
+            return consumed + buffer[:whole], binary_columns(records)
+
+        cut = buffer.rfind(b"\n") + 1
+        complete, self.partial = buffer[:cut], buffer[cut:]
+        if len(self.partial) > MAX_PARTIAL:
+            complete, self.partial = buffer, b""
+        if not complete:
+            return b"", None
+        lines = complete.decode("ascii", errors="replace").splitlines()
+        return complete, parse_lines(lines)
+
+    def _load_header(self, f):
+        """起動し直したときにバイナリログの記録の型を読み直す"""
+        f.seek(0)
+        if f.read(len(BINARY_MAGIC)) == BINARY_MAGIC:
+            f.seek(0)
+            self.dtype = parse_binary_header(f.readline())
+
+    def poll(self):
+        """
+        追記された分を取り込む
+        @return (足した DATA 行数, 足した CTRL 行数)
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0, 0
+        key = (stat.st_size, stat.st_mtime_ns)
+        if key == self.seen:
+            return 0, 0
+        self.seen = key
+
+        with open(self.path, "rb") as f:
+            if self._replaced(f, stat.st_size):
+                self.reset()
+            if self.dtype is None and self.meta["offset"] > 0:
+                self._load_header(f)
+            if not self._head_complete(bytes.fromhex(self.meta["head"])):
+                self.meta["head"] = self._read_head(f).hex()
+            f.seek(self.read_offset)
+            buffer = self.partial + f.read(stat.st_size - self.read_offset)
+
+        consumed, parsed = self._split(buffer)
+        added = (0, 0)
+        if parsed is not None:
+            for table, columns in zip(TABLES, parsed):
+                append_columns(os.path.join(self.cache_dir, table), columns)
+            added = tuple(len(columns["time_ms"]) for columns in parsed)
+            for table, count in zip(TABLES, added):
+                self.meta["rows"][table] += count
+        self.meta["offset"] += len(consumed)
+        self.meta["size"], self.meta["mtime_ns"] = key
+        write_meta(self.cache_dir, self.meta)
+        return added
+
+
+# ------------------------------------------------------------
+# 複数ファイルの監視
+# ------------------------------------------------------------
+def expand(patterns):
+    paths = set()
+    for pattern in patterns:
+        paths.update(path for path in glob.glob(pattern) if os.path.isfile(path))
+    return sorted(paths)
+
+
+def follow(patterns, interval=1.0, once=False, report=print):
+    """
+    パターンに合うファイルを interval 秒ごとに調べて取り込む（新しく現れたファイルも追う）
+    """
+    followers = {}
+    while True:
+        for path in expand(patterns):
+            if path not in followers:
+                followers[path] = Follower(path)
+            follower = followers[path]
+            data_rows, ctrl_rows = follower.poll()
+            if data_rows or ctrl_rows:
+                rows = follower.meta["rows"]
+                report(f"{path}: +{data_rows} DATA, +{ctrl_rows} CTRL rows "
+                       f"({rows['data']} / {rows['ctrl']} total, offset {follower.meta['offset']})")
+        if once:
+            return followers
+        time.sleep(interval)
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="follow", description="Append new lines of growing logs to their column caches")
+    parser.add_argument("patterns", nargs="+", help="log files or glob patterns (quote them to re-expand every poll)")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between polls")
+    parser.add_argument("--once", action="store_true", help="poll once and exit")
+    args = parser.parse_args(argv)
+
+    try:
+        follow(args.patterns, args.interval, args.once, report=lambda text: print(text, flush=True))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Triton-LiteRev2 本番ファームウェア（Arduino/設計/main.ino）の設定フレーム
+
+HEADER(0x24) year month day hour minute second
+sup_start(2) sup_stop(2) exh_start(2) exh_stop(2)
+mode(lcd_mode<<4 | log_mode) dive_count press_threshold
+CHECKSUM FOOTER(0x3B)
+
+並びは decodeData() に合わせている（mode が dive_count より前）．
+チェックサムは HEADER〜press_threshold の合計の下位 1 Byte．
+
+古いファームウェアの載った機体は dive_count / press_threshold の無い 18 Byte の
+フレーム（Control_App/dev/GenerateData/decoder.py の並び）を使う．
+どちらの版かは LAYOUTS で長さから引き，decode_frame_any() が版と設定値を返す．
+"""
+
+# ------------------------------------------------------------
+# フレーム定義
+# ------------------------------------------------------------
+HEADER = 0x24  # '$'
+FOOTER = 0x3B  # ';'
+FRAME_LENGTH = 20
+LEGACY_FRAME_LENGTH = 18
+
+CLOCK_FIELDS = ("year", "month", "day", "hour", "minute", "second")
+CONFIG_FIELDS = (
+    "sup_start", "sup_stop", "exh_start", "exh_stop",
+    "lcd_mode", "log_mode", "dive_count", "press_threshold",
+)
+FIELDS = CLOCK_FIELDS + CONFIG_FIELDS
+
+# (最小値, 最大値)
+FIELD_LIMITS = {
+    "year": (2000, 2255),
+    "month": (1, 12),
+    "day": (1, 31),
+    "hour": (0, 23),
+    "minute": (0, 59),
+    "second": (0, 59),
+    "sup_start": (0, 65535),
+    "sup_stop": (0, 65535),
+    "exh_start": (0, 65535),
+    "exh_stop": (0, 65535),
+    "lcd_mode": (0, 15),
+    "log_mode": (0, 15),
+    "dive_count": (0, 255),
+    "press_threshold": (0, 255),
+}
+
+# 版ごとのフレームの並び {版: {"length": 長さ, "fields": ((フィールド, 位置, 種類), ...), "version_byte": None}}
+#   種類: "year"（+2000）/ "u8" / "u16"（ビッグエンディアン）/ "hi4" / "lo4"（上位・下位 4 ビット）
+#   version_byte: 同じ長さの版が複数あるときに見分ける (位置, 値)．今の 2 つの版は長さだけで決まる
+_COMMON_FIELDS = (
+    ("year", 1, "year"), ("month", 2, "u8"), ("day", 3, "u8"),
+    ("hour", 4, "u8"), ("minute", 5, "u8"), ("second", 6, "u8"),
+    ("sup_start", 7, "u16"), ("sup_stop", 9, "u16"), ("exh_start", 11, "u16"), ("exh_stop", 13, "u16"),
+    ("lcd_mode", 15, "hi4"), ("log_mode", 15, "lo4"),
+)
+LAYOUTS = {
+    1: {"length": LEGACY_FRAME_LENGTH, "fields": _COMMON_FIELDS, "version_byte": None},
+    2: {"length": FRAME_LENGTH, "fields": _COMMON_FIELDS + (("dive_count", 16, "u8"), ("press_threshold", 17, "u8")),
+        "version_byte": None},
+}
+CURRENT_VERSION = 2
+
+# 長さ -> その長さの版のリスト
+LAYOUTS_BY_LENGTH = {}
+for _version, _layout in LAYOUTS.items():
+    LAYOUTS_BY_LENGTH.setdefault(_layout["length"], []).append(_version)
+
+
+# ------------------------------------------------------------
+# 共通関数
+# ------------------------------------------------------------
+def calculate_checksum(data_bytes):
+    """HEADER〜press_threshold までの合計下位 1 Byte をチェックサムとする"""
+    return sum(data_bytes) & 0xFF
+
+
+def validate_params(params):
+    """範囲外・欠落しているフィールドのエラーメッセージのリストを返す"""
+    errors = []
+    for key in FIELDS:
+        if key not in params:
+            errors.append(f"{key}: missing")
+            continue
+        low, high = FIELD_LIMITS[key]
+        value = params[key]
+        if not isinstance(value, int) or not low <= value <= high:
+            errors.append(f"{key}: {value!r} is not an integer in {low}-{high}")
+    return errors
+
+
+# ------------------------------------------------------------
+# エンコード / デコード
+# ------------------------------------------------------------
+def encode_frame(
+    *, year, month, day, hour, minute, second,
+    sup_start, sup_stop, exh_start, exh_stop,
+    lcd_mode, log_mode, dive_count, press_threshold
+):
+    """設定値から 20 Byte のフレームを作る"""
+    data_bytes = bytes([
+        HEADER,
+        year - 2000, month, day, hour, minute, second,
+        *sup_start.to_bytes(2, "big"),
+        *sup_stop.to_bytes(2, "big"),
+        *exh_start.to_bytes(2, "big"),
+        *exh_stop.to_bytes(2, "big"),
+        ((lcd_mode & 0x0F) << 4) | (log_mode & 0x0F),
+        dive_count & 0xFF,
+        press_threshold & 0xFF,
+    ])
+    return data_bytes + bytes([calculate_checksum(data_bytes), FOOTER])
+
+
+def frame_version(frame):
+    """フレームの版（LAYOUTS のキー）．どの版の長さでもなければ None"""
+    for version in LAYOUTS_BY_LENGTH.get(len(frame), ()):
+        version_byte = LAYOUTS[version]["version_byte"]
+        if version_byte is None or frame[version_byte[0]] == version_byte[1]:
+            return version
+    return None
+
+
+def _field_value(frame, offset, kind):
+    if kind == "year":
+        return 2000 + frame[offset]
+    if kind == "u16":
+        return int.from_bytes(frame[offset:offset + 2], "big")
+    if kind == "hi4":
+        return (frame[offset] >> 4) & 0x0F
+    if kind == "lo4":
+        return frame[offset] & 0x0F
+    return frame[offset]
+
+
+def _decode_layout(frame, version):
+    if frame[0] != HEADER:
+        raise ValueError("Invalid header")
+    if frame[-1] != FOOTER:
+        raise ValueError("Invalid footer")
+    if calculate_checksum(frame[:-2]) != frame[-2]:
+        raise ValueError("Checksum does not match")
+    return {name: _field_value(frame, offset, kind) for name, offset, kind in LAYOUTS[version]["fields"]}
+
+
+def decode_frame(frame):
+    """20 Byte のフレームを設定値の辞書に戻す．不正なフレームは ValueError"""
+    frame = bytes(frame)
+    if len(frame) != FRAME_LENGTH:
+        raise ValueError(f"Invalid length: {len(frame)}")
+    return _decode_layout(frame, CURRENT_VERSION)
+
+
+def decode_frame_any(frame):
+    """
+    どの版のフレームでも設定値に戻す（古い版には dive_count / press_threshold が無い）
+    @return (版, 設定値の辞書)．不正なフレームは ValueError
+    """
+    frame = bytes(frame)
+    version = frame_version(frame)
+    if version is None:
+        raise ValueError(f"Invalid length: {len(frame)}")
+    return version, _decode_layout(frame, version)
+
+
+def encode_hex(**params):
+    """encode_frame() の結果をシリアル送信用の 16 進文字列にする"""
+    return encode_frame(**params).hex().upper()
+
+
+def decode_hex(encoded_string):
+    return decode_frame(bytes.fromhex(encoded_string))
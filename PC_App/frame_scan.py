@@ -0,0 +1,211 @@
+"""
+通信ログ・EEPROM の吸い出しに含まれる設定フレームを，版（frame.LAYOUTS）を見分けて
+まとめてデコードする
+
+  - テキスト（シリアルモニタの記録，"Stored: ..." の読み出し結果，16 進の行など）からは
+    24 で始まり 3B で終わる 16 進の並びを拾う
+  - EEPROM イメージ（.eep / .hex / .bin）からは writeEEPROM() の並び
+    （0xAA，長さ，フレーム）でフレームを取り出す．長さのバイトがそのまま版を決める
+
+全フレームを 1 つの配列に詰め，長さ -> 版の表を引いて版を決める．
+各版のフィールドは種類ごとの位置の配列に前もってまとめておき，版ごとに 1 回の
+添字アクセスで全フレームの値を取り出す．
+
+使い方:
+  python frame_scan.py capture.txt dumps/*.eep [--json] [--summary]
+"""
+
+import argparse
+import json
+import os
+import re
+
+import numpy as np
+
+from eeprom_image import IMAGE_SUFFIXES, read_image
+from firmware_model import EEPROM_MARKER
+from frame import FIELDS, FOOTER, HEADER, LAYOUTS
+
+FRAME_PATTERN = re.compile(rb"(?<![0-9A-Fa-f])24(?:[0-9A-Fa-f]{2})+?3[Bb](?![0-9A-Fa-f])")
+MAX_LENGTH = max(layout["length"] for layout in LAYOUTS.values())
+
+# 結果の status
+STATUS_NAMES = ("ok", "unknown length", "invalid header", "invalid footer", "checksum mismatch", "not written")
+OK, UNKNOWN_LENGTH, BAD_HEADER, BAD_FOOTER, BAD_CHECKSUM, NOT_WRITTEN = range(len(STATUS_NAMES))
+
+
+# ------------------------------------------------------------
+# 版ごとの並びを配列の添字にしておく
+# ------------------------------------------------------------
+def compile_layout(layout):
+    """{種類: (フィールド名のタプル, 位置の配列)}"""
+    compiled = {}
+    for name, offset, kind in layout["fields"]:
+        names, offsets = compiled.get(kind, ((), ()))
+        compiled[kind] = (names + (name,), offsets + (offset,))
+    return {kind: (names, np.array(offsets)) for kind, (names, offsets) in compiled.items()}
+
+
+COMPILED = {version: compile_layout(layout) for version, layout in LAYOUTS.items()}
+
+# 長さ -> 版（0 はどの版でもない）．version_byte で見分ける版は別に扱う
+VERSION_BY_LENGTH = np.zeros(256, dtype=np.int16)
+TAGGED = {}  # 長さ -> [(版, 位置, 値), ...]
+for _version, _layout in LAYOUTS.items():
+    if _layout["version_byte"] is None:
+        VERSION_BY_LENGTH[_layout["length"]] = _version
+    else:
+        TAGGED.setdefault(_layout["length"], []).append((_version, *_layout["version_byte"]))
+
+
+# ------------------------------------------------------------
+# デコード
+# ------------------------------------------------------------
+def pack(frames):
+    """
+    長さの違うフレームを (N, MAX_LENGTH) の配列に詰める（長すぎるものは切る）
+    @return (配列, 本当の長さの配列)
+    """
+    lengths = np.array([len(f) for f in frames], dtype=np.int64)
+    packed = np.frombuffer(b"".join(bytes(f[:MAX_LENGTH]).ljust(MAX_LENGTH, b"\0") for f in frames), dtype=np.uint8)
+    return packed.reshape(len(frames), MAX_LENGTH), lengths
+
+
+def frame_versions(packed, lengths):
+    """各フレームの版（どれでもなければ 0）"""
+    versions = VERSION_BY_LENGTH[np.clip(lengths, 0, 255)].astype(np.int16)
+    for length, tagged in TAGGED.items():
+        rows = lengths == length
+        for version, offset, value in tagged:
+            versions[rows & (packed[:, offset] == value)] = version
+    return versions
+
+
+def decode_packed(packed, lengths):
+    """
+    詰めたフレームをまとめてデコードする
+    @return 列の辞書 {"version", "status", フィールド名...}（その版に無いフィールド・不正なフレームは -1）
+    """
+    n = len(lengths)
+    versions = frame_versions(packed, lengths)
+    status = np.full(n, UNKNOWN_LENGTH, dtype=np.int8)
+    columns = {name: np.full(n, -1, dtype=np.int64) for name in FIELDS}
+
+    for version, compiled in COMPILED.items():
+        rows = np.flatnonzero(versions == version)
+        if not len(rows):
+            continue
+        length = LAYOUTS[version]["length"]
+        frames = packed[rows, :length].astype(np.int64)
+        checksum = frames[:, :length - 2].sum(axis=1) & 0xFF
+        code = np.full(len(rows), OK, dtype=np.int8)
+        code[checksum != frames[:, length - 2]] = BAD_CHECKSUM
+        code[frames[:, length - 1] != FOOTER] = BAD_FOOTER
+        code[frames[:, 0] != HEADER] = BAD_HEADER
+        status[rows] = code
+
+        good = rows[code == OK]
+        frames = frames[code == OK]
+        for kind, (names, offsets) in compiled.items():
+            values = frames[:, offsets]
+            if kind == "year":
+                values = values + 2000
+            elif kind == "u16":
+                values = values << 8 | frames[:, offsets + 1]
+            elif kind == "hi4":
+                values = values >> 4 & 0x0F
+            elif kind == "lo4":
+                values = values & 0x0F
+            for name, column in zip(names, values.T):
+                columns[name][good] = column
+    return {"version": versions, "status": status, **columns}
+
+
+# ------------------------------------------------------------
+# 入力からフレームを拾う
+# ------------------------------------------------------------
+def text_frames(data):
+    """テキストの中の 16 進のフレームのリスト"""
+    return [bytes.fromhex(match.decode("ascii")) for match in FRAME_PATTERN.findall(data)]
+
+
+def image_frame(image):
+    """EEPROM イメージに保存されたフレーム．書かれていなければ None"""
+    if image[0] != EEPROM_MARKER:
+        return None
+    return bytes(image[2:2 + image[1]])
+
+
+def collect(paths):
+    """
+    ファイルからフレームを集める
+    @return (フレームのリスト（書かれていないイメージは None）, 出どころの説明のリスト)
+    """
+    frames, sources = [], []
+    for path in paths:
+        if path.lower().endswith(IMAGE_SUFFIXES):
+            frames.append(image_frame(read_image(path)))
+            sources.append(path)
+            continue
+        with open(path, "rb") as f:
+            data = f.read()
+        for i, found in enumerate(text_frames(data), start=1):
+            frames.append(found)
+            sources.append(f"{path}#{i}")
+    return frames, sources
+
+
+def decode_files(paths):
+    """@return 1 フレーム 1 つの結果の辞書のリスト（ファイル順）"""
+    frames, sources = collect(paths)
+    written = [i for i, found in enumerate(frames) if found is not None]
+    columns = decode_packed(*pack([frames[i] for i in written])) if written else None
+    results = [{"source": source, "version": None, "status": STATUS_NAMES[NOT_WRITTEN]} for source in sources]
+    for i, j in enumerate(written):
+        result = {"source": sources[j], "length": len(frames[j]),
+                  "version": int(columns["version"][i]) or None, "status": STATUS_NAMES[columns["status"][i]]}
+        if columns["status"][i] == OK:
+            version = result["version"]
+            result.update((name, int(columns[name][i])) for name, _, _ in LAYOUTS[version]["fields"])
+        results[j] = result
+    return results
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="frame_scan", description="Decode 18/20-byte config frames in captures and EEPROM dumps")
+    parser.add_argument("paths", nargs="+", help="serial captures / hex text files and EEPROM images (.eep, .hex, .bin)")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per frame")
+    parser.add_argument("--summary", action="store_true", help="print only counts per version and status")
+    args = parser.parse_args(argv)
+
+    missing = [path for path in args.paths if not os.path.exists(path)]
+    if missing:
+        print(f"Error: not found: {', '.join(missing)}")
+        return False
+    try:
+        results = decode_files(args.paths)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return False
+
+    counts = {}
+    for result in results:
+        key = (f"v{result['version']}" if result["version"] else "-", result["status"])
+        counts[key] = counts.get(key, 0) + 1
+        if args.summary:
+            continue
+        if args.json:
+            print(json.dumps(result))
+            continue
+        fields = ", ".join(f"{name}={result[name]}" for name in FIELDS if name in result)
+        print(f"{result['source']}: {key[0]} {result['status']}" + (f" ({fields})" if fields else ""))
+    print(", ".join(f"{version} {status}: {count}" for (version, status), count in sorted(counts.items()))
+          or "no frames found")
+    return all(result["status"] in ("ok", STATUS_NAMES[NOT_WRITTEN]) for result in results)
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() is not False else 1)
@@ -0,0 +1,382 @@
+"""
+Python 側のコーデックとファームウェアモデルの差分ファジング
+
+ランダムなフレーム・壊れたフレームを NumPy でまとめて生成し，
+  デコーダ : 同じ 16 進文字列を Python のデコーダとファームウェアモデルに渡し，
+             受理/拒否と解釈した設定値（ms 換算後）を比べる
+  エンコーダ : ランダムな設定値をエンコードしてファームウェアモデルに渡し，
+             意図した設定値として読まれるかを比べる
+ファームウェア側は firmware_model と同じ振る舞いを配列演算で計算する（16 進数字
+だけの文字列の場合）．空白・符号・奇数長などを含む文字列は firmware_model.receive_line()
+で 1 行ずつ確かめる．
+
+値を返さない mac_debug/virtual_serial.py のデコーダは対象外．
+依存ライブラリが無いモジュール（winapp.py の customtkinter など）は読み飛ばす．
+
+使い方: python fuzz_codec.py --frames 1000000 --seed 1 [--strict]
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import inspect
+import io
+import os
+import time
+
+import numpy as np
+
+import frame
+from firmware_model import DECODED_LENGTH, EEPROM, FOOTER, HEADER, MAX_DATA_LENGTH, receive_line
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (表示名, リポジトリからのパス, 関数名)
+DECODERS = (
+    ("PC_App/frame.py:decode_hex", "PC_App/frame.py", "decode_hex"),
+    ("GenerateData/decoder.py:decode_data", "Control_App/dev/GenerateData/decoder.py", "decode_data"),
+)
+ENCODERS = (
+    ("PC_App/frame.py:encode_hex", "PC_App/frame.py", "encode_hex"),
+    ("PC_App/encoder.py:encode_data", "PC_App/encoder.py", "encode_data"),
+    ("PC_App/winapp.py:encode_data", "PC_App/winapp.py", "encode_data"),
+    ("mainApp/utils.py:encode_data", "Control_App/dev/CLIApp/mainApp/utils.py", "encode_data"),
+    ("Encoder/main.py:encode_data", "Control_App/dev/CLIApp/Encoder/main.py", "encode_data"),
+    ("GenerateData/encoder.py:encode_data", "Control_App/dev/GenerateData/encoder.py", "encode_data"),
+    ("Send2Arduino/utils.py:encode_data", "Control_App/dev/CLIApp/Send2Arduino/Python/utils.py", "encode_data"),
+)
+
+CFG_KEYS = (
+    "supplyStartDelayMs", "supplyStopDelayMs", "exhaustStartDelayMs", "exhaustStopDelayMs",
+    "lcdMode", "logMode", "diveCount", "inPressThresh",
+)
+# Python 側のフィールド → (ファームウェアの cfg, 倍率)
+FIELD_TO_CFG = {
+    "sup_start": ("supplyStartDelayMs", 1000),
+    "sup_stop": ("supplyStopDelayMs", 1),
+    "exh_start": ("exhaustStartDelayMs", 1000),
+    "exh_stop": ("exhaustStopDelayMs", 1),
+    "lcd_mode": ("lcdMode", 1),
+    "log_mode": ("logMode", 1),
+    "dive_count": ("diveCount", 1),
+    "press_threshold": ("inPressThresh", 1),
+}
+
+REJECT, ACCEPT, UNDEFINED = 0, 1, 2
+STATUS_NAMES = {"reject": REJECT, "accept": ACCEPT, "undefined": UNDEFINED}
+
+
+# ------------------------------------------------------------
+# コーデックの読み込み
+# ------------------------------------------------------------
+def load_function(relative_path, name):
+    """スクリプトを別名のモジュールとして読み込む．import 時の print は捨てる"""
+    path = os.path.join(REPO_ROOT, relative_path)
+    module_name = "fuzz_" + relative_path.replace("/", "_").replace(".", "_")
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            spec.loader.exec_module(module)
+    except ImportError as e:
+        return None, str(e)
+    return getattr(module, name), None
+
+
+def expected_cfg(params):
+    """Python 側の設定値から，ファームウェアがそう読むべき cfg を作る"""
+    return {
+        FIELD_TO_CFG[key][0]: value * FIELD_TO_CFG[key][1]
+        for key, value in params.items() if key in FIELD_TO_CFG
+    }
+
+
+# ------------------------------------------------------------
+# ファームウェアモデル（配列版）
+# ------------------------------------------------------------
+def _int16_to_uint32(value):
+    value = np.where(value >= 0x8000, value - 0x10000, value)
+    return value & 0xFFFFFFFF
+
+
+def firmware_batch(frames):
+    """
+    (N, L) のフレームを 16 進文字列で送った場合の writeEEPROM() / decodeData() の結果
+    @return (状態の配列, cfg の列辞書または None)
+    """
+    n, width = frames.shape
+    length = width & 0xFF  # uint8_t len = str.length() / 2
+    status = np.full(n, REJECT, dtype=np.int8)
+    if length > MAX_DATA_LENGTH or length < 3:
+        return status, None
+
+    d = frames[:, :length].astype(np.int64)
+    total = d[:, :length - 2].sum(axis=1) & 0xFF
+    accepted = (d[:, 0] == HEADER) & (d[:, length - 1] == FOOTER) & (d[:, length - 2] == total)
+    if length < DECODED_LENGTH:
+        status[accepted] = UNDEFINED
+        return status, None
+    status[accepted] = ACCEPT
+
+    cfg = {
+        "supplyStartDelayMs": (_int16_to_uint32(d[:, 7] << 8 | d[:, 8]) * 1000) & 0xFFFFFFFF,
+        "supplyStopDelayMs": _int16_to_uint32(d[:, 9] << 8 | d[:, 10]),
+        "exhaustStartDelayMs": (_int16_to_uint32(d[:, 11] << 8 | d[:, 12]) * 1000) & 0xFFFFFFFF,
+        "exhaustStopDelayMs": _int16_to_uint32(d[:, 13] << 8 | d[:, 14]),
+        "lcdMode": (d[:, 15] >> 4) & 0x0F,
+        "logMode": d[:, 15] & 0x0F,
+        "diveCount": d[:, 16],
+        "inPressThresh": d[:, 17],
+    }
+    return status, cfg
+
+
+# ------------------------------------------------------------
+# フレーム生成
+# ------------------------------------------------------------
+def seal(frames, length=None):
+    """HEADER・チェックサム・FOOTER を正しい値にする"""
+    if length is None:
+        length = frames.shape[1]
+    frames[:, 0] = HEADER
+    frames[:, length - 2] = frames[:, :length - 2].sum(axis=1, dtype=np.uint64) & 0xFF
+    frames[:, length - 1] = FOOTER
+    return frames
+
+
+def generate_groups(rng, count):
+    """
+    (グループ名, (N, L) の uint8 配列) を順に返す
+    1 グループの中は同じ長さなので配列演算でまとめて扱える
+    """
+    share = max(1, count // 8)
+
+    def random_bytes(n, width):
+        return rng.integers(0, 256, size=(n, width), dtype=np.uint8)
+
+    valid = seal(random_bytes(share, frame.FRAME_LENGTH))
+    yield "valid", valid
+
+    corrupted = valid.copy()
+    rows = np.arange(share)
+    corrupted[rows, rng.integers(0, frame.FRAME_LENGTH, share)] = rng.integers(0, 256, share, dtype=np.uint8)
+    yield "byte error", corrupted
+
+    flipped = valid.copy()
+    positions = rng.integers(0, frame.FRAME_LENGTH, share)
+    flipped[rows, positions] ^= (1 << rng.integers(0, 8, share)).astype(np.uint8)
+    yield "bit flip", flipped
+
+    garbage = random_bytes(share, frame.FRAME_LENGTH)
+    garbage[:, 0] = HEADER
+    garbage[:, -1] = FOOTER
+    yield "random body", garbage
+
+    yield "legacy 18 byte", seal(random_bytes(share, 18))
+
+    # 短い・長いフレーム（チェックサムは正しい）
+    per_length = max(1, share // 30)
+    for width in list(range(1, frame.FRAME_LENGTH)) + list(range(frame.FRAME_LENGTH + 1, 2 * MAX_DATA_LENGTH)):
+        frames = random_bytes(per_length, width)
+        group = "short frame" if width < frame.FRAME_LENGTH else "long frame"
+        yield group, seal(frames) if width >= 3 else frames
+
+    # str.length() / 2 が uint8_t であふれ，先頭 20 Byte だけが解釈される長さ
+    wrapped = random_bytes(share, 256 + frame.FRAME_LENGTH)
+    seal(wrapped, frame.FRAME_LENGTH)
+    yield "length 276 (uint8_t wrap)", wrapped
+
+
+def mutate_text(rng, text):
+    """16 進文字列に文字単位の変異を 1 つ加える"""
+    kind = int(rng.integers(0, 7))
+    position = int(rng.integers(0, len(text) + 1))
+    if kind == 0:
+        return "odd length (drop)", text[:position] + text[position + 1:]
+    if kind == 1:
+        return "odd length (append)", text + "0123456789ABCDEF"[int(rng.integers(0, 16))]
+    if kind == 2:
+        return "inner space", text[:position] + " " + text[position:]
+    if kind == 3:
+        return "outer whitespace", " " + text + "\r"
+    if kind == 4:
+        return "non-hex char", text[:position] + "G" + text[position + 1:]
+    if kind == 5:
+        return "sign char", text[:position] + "-+"[int(rng.integers(0, 2))] + text[position + 1:]
+    return "lowercase", text.lower()
+
+
+# ------------------------------------------------------------
+# 比較結果の集計
+# ------------------------------------------------------------
+class Stats:
+    def __init__(self, name):
+        self.name = name
+        self.cases = 0
+        self.undefined = 0
+        self.mismatches = {}
+        self.examples = {}
+        self.note = None
+
+    def mismatch(self, kind, example, max_examples=3):
+        self.mismatches[kind] = self.mismatches.get(kind, 0) + 1
+        examples = self.examples.setdefault(kind, [])
+        if len(examples) < max_examples:
+            examples.append(example)
+
+    def report(self):
+        lines = [f"{self.name}: {self.cases} cases, {self.undefined} undefined on firmware, "
+                 f"{sum(self.mismatches.values())} disagreements"]
+        if self.note:
+            lines.append(f"  note: {self.note}")
+        for kind, count in sorted(self.mismatches.items(), key=lambda item: -item[1]):
+            lines.append(f"  {kind}: {count}")
+            for example in self.examples[kind]:
+                lines.append(f"    {example}")
+        return "\n".join(lines)
+
+
+def compare(stats, group, text, python_params, fw_status, fw_cfg):
+    """1 ケース分を比べて stats に記録する．python_params は拒否なら None"""
+    stats.cases += 1
+    if fw_status == UNDEFINED:
+        stats.undefined += 1
+        return
+    python_accepts = python_params is not None
+    if python_accepts != (fw_status == ACCEPT):
+        verdict = "python accepts, firmware rejects" if python_accepts else "python rejects, firmware accepts"
+        stats.mismatch(f"{verdict} [{group}]", text[:80])
+        return
+    if not python_accepts:
+        return
+    for key, value in expected_cfg(python_params).items():
+        if fw_cfg[key] != value:
+            stats.mismatch(f"{key} differs [{group}]", f"{text[:80]} python={value} firmware={fw_cfg[key]}")
+
+
+def decode_or_none(decoder, text):
+    try:
+        return decoder(text)
+    except (ValueError, IndexError):
+        return None
+
+
+# ------------------------------------------------------------
+# ファジング本体
+# ------------------------------------------------------------
+def fuzz_decoders(decoders, rng, count, text_count):
+    stats = {name: Stats(name) for name, _ in decoders}
+
+    # フレーム単位（ファームウェア側は配列演算）
+    for group, frames in generate_groups(rng, count):
+        fw_status, fw_cfg = firmware_batch(frames)
+        statuses = fw_status.tolist()
+        cfg_rows = [{}] * len(frames) if fw_cfg is None else [
+            dict(zip(CFG_KEYS, row)) for row in zip(*(fw_cfg[key].tolist() for key in CFG_KEYS))
+        ]
+        width = 2 * frames.shape[1]
+        hex_all = frames.tobytes().hex().upper()
+        for i in range(len(frames)):
+            text = hex_all[width * i:width * (i + 1)]
+            for name, decoder in decoders:
+                compare(stats[name], group, text, decode_or_none(decoder, text), statuses[i], cfg_rows[i])
+
+    # 文字単位の変異（ファームウェア側は 1 行ずつ）
+    eeprom = EEPROM()
+    valid = seal(rng.integers(0, 256, size=(text_count, frame.FRAME_LENGTH), dtype=np.uint8))
+    for row in valid:
+        group, text = mutate_text(rng, row.tobytes().hex().upper())
+        status, cfg = receive_line(eeprom, text)
+        for name, decoder in decoders:
+            compare(stats[name], group, text, decode_or_none(decoder, text), STATUS_NAMES[status], cfg or {})
+    return list(stats.values())
+
+
+def random_params(rng, count):
+    """FIELD_LIMITS の範囲で設定値の辞書を count 個作る"""
+    columns = {
+        key: rng.integers(low, high + 1, size=count).tolist()
+        for key, (low, high) in frame.FIELD_LIMITS.items()
+    }
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
+def fuzz_encoders(encoders, rng, count):
+    results = []
+    params_list = random_params(rng, count)
+    for name, encoder in encoders:
+        stats = Stats(name)
+        parameters = inspect.signature(encoder).parameters.values()
+        if any(p.kind is inspect.Parameter.VAR_KEYWORD for p in parameters):
+            accepted = set(frame.FIELDS)
+        else:
+            accepted = {p.name for p in parameters}
+        unsent = [key for key in frame.CONFIG_FIELDS if key not in accepted]
+        if unsent:
+            stats.note = "does not send " + ", ".join(unsent)
+
+        texts = []
+        for params in params_list:
+            texts.append(encoder(**{key: value for key, value in params.items() if key in accepted}))
+
+        # 長さごとにまとめてファームウェアモデルに通す
+        by_length = {}
+        for i, text in enumerate(texts):
+            by_length.setdefault(len(text), []).append(i)
+        for indices in by_length.values():
+            frames = np.frombuffer(bytes.fromhex("".join(texts[i] for i in indices)), dtype=np.uint8)
+            frames = frames.reshape(len(indices), -1)
+            fw_status, fw_cfg = firmware_batch(frames)
+            for row, i in enumerate(indices):
+                cfg = {} if fw_cfg is None else {key: int(fw_cfg[key][row]) for key in CFG_KEYS}
+                sent = {key: value for key, value in params_list[i].items() if key in accepted}
+                compare(stats, "encoded", texts[i], sent, fw_status[row], cfg)
+        results.append(stats)
+    return results
+
+
+def load_variants(table, only):
+    variants = []
+    skipped = []
+    for name, path, function_name in table:
+        if only and not any(word in name for word in only):
+            continue
+        function, error = load_function(path, function_name)
+        if function is None:
+            skipped.append(f"{name} (skipped: {error})")
+        else:
+            variants.append((name, function))
+    return variants, skipped
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Differential fuzzing of Python frame codecs against the firmware model")
+    parser.add_argument("--frames", type=int, default=200000, help="generated frames for the decoders")
+    parser.add_argument("--texts", type=int, default=20000, help="character-level mutations for the decoders")
+    parser.add_argument("--configs", type=int, default=20000, help="random configs for the encoders")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--only", nargs="*", help="run only variants whose name contains one of these words")
+    parser.add_argument("--strict", action="store_true", help="exit with status 1 on any disagreement")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    started = time.perf_counter()
+
+    decoders, skipped_decoders = load_variants(DECODERS, args.only)
+    encoders, skipped_encoders = load_variants(ENCODERS, args.only)
+    results = fuzz_decoders(decoders, rng, args.frames, args.texts) if decoders else []
+    results += fuzz_encoders(encoders, rng, args.configs)
+
+    for stats in results:
+        print(stats.report())
+    for name in skipped_decoders + skipped_encoders:
+        print(name)
+
+    elapsed = time.perf_counter() - started
+    total = sum(stats.cases for stats in results)
+    print(f"{total} comparisons in {elapsed:.1f} s ({total / max(elapsed, 1e-9):.0f}/s)")
+    if args.strict and any(stats.mismatches for stats in results):
+        raise SystemExit(1)
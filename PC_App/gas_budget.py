@@ -0,0 +1,234 @@
+"""
+バルブの開時間からガス消費を見積もり，設定の diveCount までボンベが持つかを調べる
+
+V1SUP・V2EXH は CTRL 行に開閉がそのまま記録される．V3PRS は開いた読み取りごとに
+PRESSURE の CTRL 行が出て，閉じたときは記録されない．readDepthAndPressurize() は
+次の読み取り（DEPTH_INTERVAL_MS 後）まで開いたままにするので，その行から
+PRESSURIZE_HOLD_MS（次の DATA 行が先ならそこ）までを開いていた時間とみなす．
+ダイブの区切りは divedCount が増える V1SUP の閉（ctrlValve() の状態 3 → 0）．
+timeNowMs は再起動で 0 に戻るので，ファイルを起動ごと（logparser.file_boots()）に分けて数える．
+
+流量係数 [NL/s]（ノルマルリットル毎秒）はバルブごとに --flow で与える．
+V2EXH は浮力体からの排気でボンベを使わないので，既定では数えない．
+
+使い方:
+  python gas_budget.py 0615_*.csv --flow V1SUP=0.8 --flow V3PRS=0.3 \\
+      --cylinder-nl 300 --frame 2419...3B
+"""
+
+import argparse
+
+import numpy as np
+
+from firmware_model import decode_data
+from logparser import file_boots, load_log
+
+VALVES = ("V1SUP", "V2EXH", "V3PRS")
+PRESSURIZE_HOLD_MS = 100  # 1 回の読み取りで V3PRS を開いておく時間（ファームウェアの DEPTH_INTERVAL_MS）
+
+
+# ------------------------------------------------------------
+# 起動ごとの分割
+# ------------------------------------------------------------
+def split_boots(data, ctrl):
+    """
+    load_log(row_numbers=True) の列辞書を起動ごとに分ける
+    @return 起動ごとの (data, ctrl) のリスト
+    """
+    data_boot, ctrl_boot = file_boots(data, ctrl)
+    count = int(max(data_boot.max(initial=-1), ctrl_boot.max(initial=-1))) + 1
+    # どちらの起動番号も書かれた順なので単調に増える
+    data_cuts = np.searchsorted(data_boot, np.arange(1, count))
+    ctrl_cuts = np.searchsorted(ctrl_boot, np.arange(1, count))
+    data_parts = {name: np.split(values, data_cuts) for name, values in data.items()}
+    ctrl_parts = {name: np.split(values, ctrl_cuts) for name, values in ctrl.items()}
+    return [
+        ({name: parts[boot] for name, parts in data_parts.items()},
+         {name: parts[boot] for name, parts in ctrl_parts.items()})
+        for boot in range(count)
+    ]
+
+
+# ------------------------------------------------------------
+# 開区間の抽出
+# ------------------------------------------------------------
+def edges(time_ms, state):
+    """@return (開いた時刻, 閉じた時刻) の配列（個数は揃わないことがある）"""
+    state = np.nan_to_num(state) > 0
+    previous = np.concatenate(([False], state[:-1]))
+    return time_ms[state & ~previous], time_ms[~state & previous]
+
+
+def edge_intervals(time_ms, state, end_ms):
+    """
+    開閉が記録される列（V1SUP, V2EXH）から開区間を求める
+    @return (開いた時刻, 閉じた時刻) の配列．起動の終わりで開いたままなら end_ms で閉じる
+    """
+    opened, closed = edges(time_ms, state)
+    index = np.searchsorted(closed, opened, side="left")
+    ends = np.append(closed, end_ms)[index]
+    return opened, ends
+
+
+def pressurize_intervals(ctrl, data_time_ms):
+    """
+    V3PRS が開いていた CTRL 行から PRESSURIZE_HOLD_MS を開区間とする
+    （次の DATA 行の方が先なら，そこで閉じたとみなす）
+    """
+    starts = ctrl["time_ms"][np.nan_to_num(ctrl["V3PRS"]) > 0]
+    index = np.searchsorted(data_time_ms, starts, side="right")
+    following = np.append(data_time_ms, np.inf)[index]
+    return starts, np.minimum(following, starts + PRESSURIZE_HOLD_MS)
+
+
+def valve_intervals(data, ctrl):
+    """@return {バルブ名: (開いた時刻, 閉じた時刻)}"""
+    end_ms = max(np.max(data["time_ms"], initial=0.0), np.max(ctrl["time_ms"], initial=0.0))
+    intervals = {
+        name: edge_intervals(ctrl["time_ms"], ctrl[name], end_ms)
+        for name in ("V1SUP", "V2EXH")
+    }
+    intervals["V3PRS"] = pressurize_intervals(ctrl, data["time_ms"])
+    return intervals
+
+
+# ------------------------------------------------------------
+# ダイブごとの集計
+# ------------------------------------------------------------
+def open_time_per_dive(data, ctrl):
+    """
+    1 ファイル（1 回の起動）分のバルブ開時間をダイブごとに積算する
+    @return ({バルブ名: ダイブごとの開時間 [s] の配列}, 完了したダイブの数)
+            配列の最後の要素は，最後の V1SUP の閉より後（未完了のダイブ）
+    """
+    intervals = valve_intervals(data, ctrl)
+    dive_ends = edges(ctrl["time_ms"], ctrl["V1SUP"])[1]
+    dives = len(dive_ends)
+
+    per_dive = {}
+    for name, (starts, ends) in intervals.items():
+        # 開いた時刻がどのダイブに入るか（V1SUP の閉と同時刻の操作は次のダイブ）
+        dive = np.searchsorted(dive_ends, starts, side="right")
+        per_dive[name] = np.bincount(dive, weights=(ends - starts) / 1000, minlength=dives + 1)
+    return per_dive, dives
+
+
+def mission_open_times(paths):
+    """
+    ログ群（1 ミッション）のダイブごとの開時間を連結する
+    @return ({バルブ名: 完了したダイブごとの開時間 [s]}, {バルブ名: 合計 [s]})
+    """
+    complete = {name: [] for name in VALVES}
+    totals = dict.fromkeys(VALVES, 0.0)
+    for path in paths:
+        for data, ctrl in split_boots(*load_log(path, row_numbers=True)):
+            per_dive, dives = open_time_per_dive(data, ctrl)
+            for name in VALVES:
+                complete[name].append(per_dive[name][:dives])
+                totals[name] += float(per_dive[name].sum())
+    return {name: np.concatenate(values) for name, values in complete.items()}, totals
+
+
+# ------------------------------------------------------------
+# ガス量と持続性
+# ------------------------------------------------------------
+def gas_usage(open_times, flows):
+    """開時間 [s]（スカラーまたは配列）に流量係数 [NL/s] を掛けて合計する"""
+    return sum(np.asarray(open_times[name]) * flows.get(name, 0.0) for name in VALVES)
+
+
+def planned_open_times(per_dive, config):
+    """
+    設定フレームの待ち時間で 1 ダイブ分の V1SUP・V2EXH の開時間を置き換える
+    （V3PRS は水深と内圧で決まるので実績のまま）
+    """
+    planned = dict(per_dive)
+    planned["V1SUP"] = np.full_like(per_dive["V1SUP"], config["supplyStopDelayMs"] / 1000)
+    planned["V2EXH"] = np.full_like(per_dive["V2EXH"], config["exhaustStopDelayMs"] / 1000)
+    return planned
+
+
+def endurance(per_dive_gas, cylinder_nl, used_nl=0.0, dive_count=None, reserve=0.0):
+    """
+    @return 見積もりの辞書．dive_count を与えると，その回数を潜れるかも判定する
+    """
+    available = cylinder_nl * (1 - reserve) - used_nl
+    result = {"available_nl": available}
+    if len(per_dive_gas) == 0:
+        return result
+    for label, value in (("mean", per_dive_gas.mean()), ("p90", np.percentile(per_dive_gas, 90)),
+                         ("max", per_dive_gas.max())):
+        result[f"per_dive_{label}_nl"] = float(value)
+        result[f"dives_{label}"] = float(available / value) if value > 0 else float("inf")
+    if dive_count:
+        result["required_p90_nl"] = result["per_dive_p90_nl"] * dive_count
+        result["enough"] = result["required_p90_nl"] <= available
+    return result
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+def parse_flows(items):
+    flows = {}
+    for item in items or []:
+        name, _, value = item.partition("=")
+        if name not in VALVES:
+            raise ValueError(f"Unknown valve {name!r} (expected one of {', '.join(VALVES)})")
+        flows[name] = float(value)
+    return flows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="gas_budget", description="Valve duty cycle and gas consumption estimate")
+    parser.add_argument("logs", nargs="+", help="log files of one mission")
+    parser.add_argument("--flow", action="append", metavar="VALVE=NL_PER_S", help="flow coefficient, repeatable")
+    parser.add_argument("--cylinder-nl", type=float, help="gas in the cylinder at the start of the mission [NL]")
+    parser.add_argument("--reserve", type=float, default=0.2, help="fraction of the cylinder kept in reserve")
+    parser.add_argument("--frame", help="config frame (hex) of the next deployment; uses its delays and diveCount")
+    parser.add_argument("--dive-count", type=int, help="dives planned for the next deployment")
+    args = parser.parse_args(argv)
+
+    try:
+        flows = parse_flows(args.flow)
+    except ValueError as e:
+        parser.error(str(e))
+
+    per_dive, totals = mission_open_times(args.logs)
+    dives = len(per_dive["V1SUP"])
+    print(f"Completed dives: {dives}")
+    print("Valve open time [s]: " + ", ".join(
+        f"{name} total {totals[name]:.1f} / per dive {per_dive[name].mean() if dives else 0:.2f}"
+        for name in VALVES))
+    if not flows:
+        return
+
+    used = float(gas_usage(totals, flows))
+    print(f"Gas used in these logs: {used:.1f} NL")
+
+    dive_count = args.dive_count
+    if args.frame:
+        config = decode_data(bytes.fromhex(args.frame.strip()))
+        per_dive = planned_open_times(per_dive, config)
+        dive_count = dive_count or config["diveCount"]
+    per_dive_gas = gas_usage(per_dive, flows)
+    if args.cylinder_nl is None:
+        if dives:
+            print(f"Gas per dive: mean {per_dive_gas.mean():.2f} NL, max {per_dive_gas.max():.2f} NL")
+        return
+
+    # 次の展開はボンベを詰め直す前提（--frame / --dive-count）か，この続き
+    planning = bool(args.frame or args.dive_count)
+    result = endurance(per_dive_gas, args.cylinder_nl, 0.0 if planning else used, dive_count, args.reserve)
+    print(f"Available (after {args.reserve:.0%} reserve): {result['available_nl']:.1f} NL")
+    if "per_dive_mean_nl" in result:
+        print(f"Gas per dive: mean {result['per_dive_mean_nl']:.2f}, p90 {result['per_dive_p90_nl']:.2f}, "
+              f"max {result['per_dive_max_nl']:.2f} NL -> {result['dives_p90']:.1f} dives at p90")
+    if "enough" in result:
+        print(f"diveCount {dive_count}: needs {result['required_p90_nl']:.1f} NL at p90 -> "
+              + ("OK" if result["enough"] else "NOT ENOUGH GAS"))
+        return result["enough"]
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() is not False else 1)
@@ -0,0 +1,231 @@
+"""
+ログ（logMode 0/2）の LAT/LNG/SATNUM/ALT から航跡を作り，GeoJSON で書き出す
+
+getGPSData() は gps.location.isUpdated() が立ったときだけ gpsLat などを更新するため，
+更新されなかったループでは前回値がそのまま DATA 行に残る．
+直前行と全く同じ値の行を「古い fix」として捨ててから，衛星数で絞り込み，
+Douglas-Peucker または Visvalingam-Whyatt で間引く（どちらも NumPy でまとめて計算する）．
+
+使い方: python gps_track.py 0615_12.csv -o track.geojson --min-sats 4 --tolerance 5
+"""
+
+import argparse
+import datetime
+import json
+
+import numpy as np
+
+from logparser import load_log
+
+EARTH_RADIUS_M = 6371008.8
+
+
+# ------------------------------------------------------------
+# fix の抽出
+# ------------------------------------------------------------
+def extract_fixes(data, min_satellites=4):
+    """
+    DATA 列辞書から新しい fix だけを取り出す
+    @return time_ms, rtc, lat, lng, alt, satellites の配列を持つ辞書
+    """
+    lat = data["LAT"]
+    lng = data["LNG"]
+    alt = data["ALT"]
+    sat = data["SATNUM"]
+
+    # 一度も fix していない間は 0,0 のまま記録される
+    valid = np.isfinite(lat) & np.isfinite(lng) & ~((lat == 0) & (lng == 0))
+
+    # isUpdated() が立たなかった行は直前行と同じ値になる
+    updated = np.ones(len(lat), dtype=bool)
+    updated[1:] = (
+        (lat[1:] != lat[:-1]) | (lng[1:] != lng[:-1])
+        | (alt[1:] != alt[:-1]) | (sat[1:] != sat[:-1])
+    )
+
+    keep = valid & updated & (sat >= min_satellites)
+    return {
+        "time_ms": data["time_ms"][keep],
+        "rtc": data["rtc"][keep],
+        "lat": lat[keep],
+        "lng": lng[keep],
+        "alt": alt[keep],
+        "satellites": sat[keep],
+    }
+
+
+def project_local(lat, lng):
+    """最初の点を原点とする正距円筒図法の平面座標 [m] に変換"""
+    if len(lat) == 0:
+        return np.empty((0, 2))
+    lat0 = np.radians(lat[0])
+    x = EARTH_RADIUS_M * np.radians(lng - lng[0]) * np.cos(lat0)
+    y = EARTH_RADIUS_M * np.radians(lat - lat[0])
+    return np.column_stack((x, y))
+
+
+# ------------------------------------------------------------
+# 間引き
+# ------------------------------------------------------------
+def douglas_peucker(xy, tolerance):
+    """Douglas-Peucker で残す点のマスクを返す（区間ごとの距離計算は NumPy で一括）"""
+    n = len(xy)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a = xy[start]
+        ab = xy[end] - a
+        ap = xy[start + 1:end] - a
+        length = np.hypot(ab[0], ab[1])
+        if length == 0:
+            dist = np.hypot(ap[:, 0], ap[:, 1])
+        else:
+            dist = np.abs(ab[0] * ap[:, 1] - ab[1] * ap[:, 0]) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def _triangle_areas(xy):
+    a, b, c = xy[:-2], xy[1:-1], xy[2:]
+    return 0.5 * np.abs(
+        (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1])
+        - (c[:, 0] - a[:, 0]) * (b[:, 1] - a[:, 1])
+    )
+
+
+def _alternate(mask):
+    """連続して True の並びの中で 1 つおきの位置だけ True にする（隣り合う点を同時に削らない）"""
+    index = np.arange(len(mask))
+    run_start = np.maximum.accumulate(np.where(mask & ~np.concatenate(([False], mask[:-1])), index, 0))
+    return mask & ((index - run_start) % 2 == 0)
+
+
+def visvalingam(xy, min_area=0.0, max_points=None):
+    """
+    Visvalingam-Whyatt で残す点のマスクを返す
+    有効面積が min_area [m^2] 未満の点を削り，max_points を超える間は面積の小さい順に削り続ける
+    1 点ずつヒープで削る代わりに，各回で残っている点の面積を NumPy でまとめて求め，
+    削る対象のうち両隣より面積が大きくない点を（同じ面積が続くところは 1 つおきに）一度に削る．
+    削った点の面積は両隣の有効面積の下限になる（元の手順と同じ）．
+    """
+    n = len(xy)
+    keep = np.ones(n, dtype=bool)
+    if n < 3:
+        return keep
+    if max_points is None:
+        max_points = n
+    max_points = max(max_points, 2)
+
+    index = np.arange(n)  # 残っている点
+    floor = np.zeros(n)  # 削られた隣の点の面積（有効面積の下限）
+    while len(index) > 2:
+        area = np.maximum(_triangle_areas(xy[index]), floor[index[1:-1]])
+        candidate = area < min_area
+        excess = len(index) - max_points
+        if excess > 0:
+            candidate |= area <= np.partition(area, excess - 1)[excess - 1]
+        # 両隣より面積が大きくない点だけを削る（小さい順に削る元の手順に近づける）
+        bounded = np.concatenate(([np.inf], area, [np.inf]))
+        local_min = (area <= bounded[:-2]) & (area <= bounded[2:])
+        chosen = np.flatnonzero(_alternate(candidate & local_min))
+        if excess > 0:
+            # min_area 未満の点は全部，それ以外は点数が max_points になる分だけ面積の小さい順に
+            small = area[chosen] < min_area
+            extra = chosen[~small]
+            extra = extra[np.argsort(area[extra], kind="stable")[:max(excess - np.count_nonzero(small), 0)]]
+            chosen = np.sort(np.concatenate((chosen[small], extra)))
+        if not len(chosen):
+            break
+        position = chosen + 1  # index の中の位置
+        np.maximum.at(floor, index[position - 1], area[chosen])
+        np.maximum.at(floor, index[position + 1], area[chosen])
+        keep[index[position]] = False
+        index = np.delete(index, position)
+    return keep
+
+
+def build_track(data, min_satellites=4, method="dp", tolerance=5.0, max_points=None):
+    """DATA 列辞書から間引き済みの航跡を作る"""
+    fixes = extract_fixes(data, min_satellites)
+    xy = project_local(fixes["lat"], fixes["lng"])
+    if method == "dp":
+        keep = douglas_peucker(xy, tolerance)
+    elif method == "vw":
+        keep = visvalingam(xy, min_area=tolerance ** 2, max_points=max_points)
+    else:
+        raise ValueError(f"Unknown simplification method: {method}")
+
+    track = {key: values[keep] for key, values in fixes.items()}
+    track["source_points"] = len(fixes["lat"])
+    return track
+
+
+# ------------------------------------------------------------
+# GeoJSON 出力
+# ------------------------------------------------------------
+def _iso(rtc):
+    if not np.isfinite(rtc):
+        return None
+    return datetime.datetime.fromtimestamp(rtc, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def to_geojson(track, precision=6):
+    """航跡を GeoJSON の FeatureCollection（dict）に変換"""
+    coords = np.column_stack((
+        np.round(track["lng"], precision),
+        np.round(track["lat"], precision),
+        np.round(track["alt"], 1),
+    )).tolist()
+    properties = {
+        "points": len(coords),
+        "source_points": track["source_points"],
+    }
+    if len(coords):
+        properties["start"] = _iso(track["rtc"][0])
+        properties["end"] = _iso(track["rtc"][-1])
+    return {
+        "type": "FeatureCollection",
+        "features": [{
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": coords},
+            "properties": properties,
+        }],
+    }
+
+
+def write_geojson(track, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(to_geojson(track), f, separators=(",", ":"))
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a simplified GPS track from Triton-Lite logs")
+    parser.add_argument("logs", nargs="+", help="log files written by handleSDcard()")
+    parser.add_argument("-o", "--output", default="track.geojson")
+    parser.add_argument("--min-sats", type=int, default=4)
+    parser.add_argument("--method", choices=("dp", "vw"), default="dp")
+    parser.add_argument("--tolerance", type=float, default=5.0, help="distance tolerance [m]")
+    parser.add_argument("--max-points", type=int, default=None, help="upper bound on points (vw only)")
+    args = parser.parse_args()
+
+    parts = [load_log(path)[0] for path in args.logs]
+    data = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+    track = build_track(data, args.min_sats, args.method, args.tolerance, args.max_points)
+    write_geojson(track, args.output)
+    print(f"{track['source_points']} fixes -> {len(track['lat'])} points: {args.output}")
@@ -0,0 +1,247 @@
+"""
+handleSDcard() が SD カードに書き出すログの読み込み
+
+DATA行 : <timeNowMs>,<YYYY/MM/DD-hh:mm:ss>,DATA,KEY,VALUE,KEY,VALUE,...,
+CTRL行 : <timeNowMs>,<YYYY/MM/DD-hh:mm:ss>,CTRL,MSG,<UP|DOWN|PRESSURE|UNDEF>,V1SUP,0,V2EXH,0,V3PRS,0
+
+列はすべて float64 の NumPy 配列で返す．
+logMode 1/3 で出力されない列（LAT など）や，AVR の sprintf が %f を展開できずに
+出力する "?" は NaN になる．
+
+logMode 4 のバイナリログ（"TRLB,..." の 1 行のあとに固定長の記録が並ぶ）も
+load_log() で同じ形の列辞書として読める．記録の並びは先頭行に書かれている．
+
+row_numbers=True にすると，両方の列辞書に "row"（ファイルの中の順番）を加える．
+DATA 行と CTRL 行を書かれた順に並べ直すのに使う（timeNowMs は再起動で戻るので時刻では並べられない）．
+"""
+
+import calendar
+import os
+
+import numpy as np
+
+# ------------------------------------------------------------
+# 列定義
+# ------------------------------------------------------------
+DATA_FIELDS = (
+    "LAT", "LNG", "SATNUM", "ALT",
+    "PIN_RAW", "PIN_MBAR", "POUT", "POUT_DEPTH", "POUT_TMP", "TMP",
+    "VCTRL_STATE", "MOV_STATE", "DIVE_COUNT",
+)
+CTRL_FIELDS = ("MOV_STATE", "V1SUP", "V2EXH", "V3PRS")
+DATA_COLUMNS = ("time_ms", "rtc") + DATA_FIELDS
+CTRL_COLUMNS = ("time_ms", "rtc") + CTRL_FIELDS
+
+# movementState の値（ファームウェアと同じ）
+MOVEMENT_CODES = {"UNDEF": 0, "UP": 1, "DOWN": 2, "PRESSURE": 3}
+
+# バイナリログ
+BINARY_MAGIC = b"TRLB"
+BINARY_TYPES = {"u1": "<u1", "u2": "<u2", "u4": "<u4", "i1": "<i1", "i2": "<i2", "i4": "<i4", "f4": "<f4"}
+FLAG_BITS = {"V1SUP": 0, "V2EXH": 1, "V3PRS": 2}
+FLAG_CTRL = 3  # バルブ操作があった記録（テキストの CTRL 行に相当）
+
+_DATA_INDEX = {name: i for i, name in enumerate(DATA_FIELDS)}
+_NAN = float("nan")
+
+
+# ------------------------------------------------------------
+# 1 行単位の解析
+# ------------------------------------------------------------
+def _to_float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return _NAN
+
+
+def parse_rtc(text):
+    """"YYYY/MM/DD-hh:mm:ss" を UNIX 秒に変換（タイムゾーンは考慮しない）．不正値は NaN"""
+    try:
+        return float(calendar.timegm((
+            int(text[0:4]), int(text[5:7]), int(text[8:10]),
+            int(text[11:13]), int(text[14:16]), int(text[17:19]),
+        )))
+    except (ValueError, IndexError):
+        return _NAN
+
+
+def parse_line(line, rtc_cache=None):
+    """
+    1 行を解析して ("DATA" | "CTRL", 値のタプル) を返す．ログ行でなければ None
+    値の並びは DATA_COLUMNS / CTRL_COLUMNS に対応する．
+    """
+    parts = line.rstrip("\r\n").rstrip(",").split(",")
+    if len(parts) < 3:
+        return None
+    kind = parts[2]
+    if kind != "DATA" and kind != "CTRL":
+        return None
+
+    time_ms = _to_float(parts[0])
+    stamp = parts[1]
+    if rtc_cache is None:
+        rtc = parse_rtc(stamp)
+    else:
+        rtc = rtc_cache.get(stamp)
+        if rtc is None:
+            rtc = rtc_cache[stamp] = parse_rtc(stamp)
+
+    if kind == "CTRL":
+        # CTRL,MSG,<状態>,V1SUP,x,V2EXH,x,V3PRS,x
+        if len(parts) < 11:
+            return None
+        return "CTRL", (
+            time_ms, rtc,
+            float(MOVEMENT_CODES.get(parts[4], 0)),
+            _to_float(parts[6]), _to_float(parts[8]), _to_float(parts[10]),
+        )
+
+    values = [_NAN] * len(DATA_FIELDS)
+    for i in range(3, len(parts) - 1, 2):
+        index = _DATA_INDEX.get(parts[i])
+        if index is not None:
+            values[index] = _to_float(parts[i + 1])
+    return "DATA", (time_ms, rtc, *values)
+
+
+# ------------------------------------------------------------
+# 複数行の解析
+# ------------------------------------------------------------
+def _columns(rows, names):
+    if not rows:
+        return {name: np.empty(0) for name in names}
+    table = np.array(rows, dtype=np.float64)
+    return {name: table[:, i] for i, name in enumerate(names)}
+
+
+def parse_lines(lines, row_numbers=False):
+    """行のイテラブルを解析して (data, ctrl) の列辞書を返す．解析できない行は読み飛ばす"""
+    data_rows = []
+    ctrl_rows = []
+    data_numbers = []
+    ctrl_numbers = []
+    rtc_cache = {}
+    for number, line in enumerate(lines):
+        parsed = parse_line(line, rtc_cache)
+        if parsed is None:
+            continue
+        kind, values = parsed
+        if kind == "DATA":
+            data_rows.append(values)
+            data_numbers.append(number)
+        else:
+            ctrl_rows.append(values)
+            ctrl_numbers.append(number)
+    data, ctrl = _columns(data_rows, DATA_COLUMNS), _columns(ctrl_rows, CTRL_COLUMNS)
+    if row_numbers:
+        data["row"] = np.array(data_numbers, dtype=np.float64)
+        ctrl["row"] = np.array(ctrl_numbers, dtype=np.float64)
+    return data, ctrl
+
+
+# ------------------------------------------------------------
+# バイナリログ（logMode 4）
+# ------------------------------------------------------------
+def parse_binary_header(line):
+    """
+    先頭行 "TRLB,<版>,<記録長>,<名前>:<型>,..." から記録の dtype を作る
+    """
+    parts = line.decode("ascii").strip().split(",")
+    if len(parts) < 4 or parts[0] != BINARY_MAGIC.decode():
+        raise ValueError("Not a binary Triton-Lite log")
+    fields = []
+    for item in parts[3:]:
+        name, _, code = item.partition(":")
+        if code not in BINARY_TYPES:
+            raise ValueError(f"Unknown field type in binary log header: {item!r}")
+        fields.append((name, BINARY_TYPES[code]))
+    dtype = np.dtype(fields)
+    if dtype.itemsize != int(parts[2]):
+        raise ValueError(f"Binary log header says {parts[2]} bytes per record but fields add up to {dtype.itemsize}")
+    return dtype
+
+
+def rtc_to_unix(year, month, day, hour, minute, second):
+    """RTC の各列から UNIX 秒を計算する（ベクトル化版の parse_rtc）．不正値は NaN"""
+    year = year.astype(np.int64)
+    month = month.astype(np.int64)
+    day = day.astype(np.int64)
+    valid = (year >= 1970) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+    months = np.where(valid, (year - 1970) * 12 + month - 1, 0).astype("datetime64[M]")
+    days = months.astype("datetime64[D]").astype(np.int64) + np.where(valid, day - 1, 0)
+    seconds = days * 86400 + hour.astype(np.int64) * 3600 + minute.astype(np.int64) * 60 + second
+    return np.where(valid, seconds.astype(np.float64), np.nan)
+
+
+def read_binary_records(path):
+    """バイナリログを構造化配列で返す．書きかけの末尾の記録は捨てる"""
+    with open(path, "rb") as f:
+        dtype = parse_binary_header(f.readline())
+        offset = f.tell()
+    count = (os.path.getsize(path) - offset) // dtype.itemsize
+    return np.fromfile(path, dtype=dtype, count=count, offset=offset)
+
+
+def load_binary_log(path, row_numbers=False):
+    """バイナリログを読み込んで，テキストと同じ形の (data, ctrl) の列辞書を返す"""
+    return binary_columns(read_binary_records(path), row_numbers)
+
+
+def binary_columns(records, row_numbers=False):
+    """
+    バイナリログの構造化配列を (data, ctrl) の列辞書にする
+    row は記録 i の CTRL を 2i，DATA を 2i + 1 とする（テキストでは CTRL 行が先に書かれる）
+    """
+    names = records.dtype.names
+
+    rtc = rtc_to_unix(*(records[f"rtc_{key}"] for key in ("year", "month", "day", "hour", "minute", "second")))
+    data = {"time_ms": records["time_ms"].astype(np.float64), "rtc": rtc}
+    for name in DATA_FIELDS:
+        if name in names:
+            data[name] = records[name].astype(np.float64)
+        else:
+            data[name] = np.full(len(records), np.nan)
+
+    flags = records["FLAGS"]
+    is_ctrl = (flags >> FLAG_CTRL) & 1 == 1
+    ctrl = {"time_ms": data["time_ms"][is_ctrl], "rtc": rtc[is_ctrl], "MOV_STATE": data["MOV_STATE"][is_ctrl]}
+    for name, bit in FLAG_BITS.items():
+        ctrl[name] = ((flags[is_ctrl] >> bit) & 1).astype(np.float64)
+    if row_numbers:
+        data["row"] = np.arange(len(records), dtype=np.float64) * 2 + 1
+        ctrl["row"] = np.flatnonzero(is_ctrl).astype(np.float64) * 2
+    return data, ctrl
+
+
+def load_log(path, row_numbers=False):
+    """ログファイル（テキストまたはバイナリ）を読み込んで (data, ctrl) の列辞書を返す"""
+    with open(path, "rb") as f:
+        is_binary = f.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    if is_binary:
+        return load_binary_log(path, row_numbers)
+    with open(path, "r", encoding="ascii", errors="replace") as f:
+        return parse_lines(f, row_numbers)
+
+
+# ------------------------------------------------------------
+# 起動の番号
+# ------------------------------------------------------------
+def boots(time_ms):
+    """timeNowMs が戻るたびに増える起動番号"""
+    restarted = np.concatenate(([False], np.diff(time_ms) < 0))
+    return np.cumsum(restarted)
+
+
+def file_boots(data, ctrl):
+    """
+    DATA 行・CTRL 行を書かれた順（load_log(row_numbers=True) の "row"）に並べて数えた起動番号
+    （CTRL 行だけ・DATA 行だけで数えると，片方の無い起動を挟んだときに番号がずれる）
+    @return (DATA 行の boot, CTRL 行の boot)
+    """
+    rows = np.concatenate((data["row"], ctrl["row"]))
+    order = np.argsort(rows, kind="stable")
+    merged = np.empty(len(rows), dtype=np.int64)
+    merged[order] = boots(np.concatenate((data["time_ms"], ctrl["time_ms"]))[order])
+    count = len(data["row"])
+    return merged[:count], merged[count:]
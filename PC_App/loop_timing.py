@@ -0,0 +1,222 @@
+"""
+ログの timeNowMs からループ周期と停滞（stall）を調べる
+
+DATA 行は毎回のログ書き込みで timeNowMs を記録するので，隣り合う行の差が
+ログ周期（= ループ周期の上限）になる．周期のヒストグラムとパーセンタイルを出し，
+しきい値を超える停滞を logMode・GPS fix の有無・CTRL（バルブ操作）と突き合わせる．
+設定フレームを与えると，各バルブ操作が設定の待ち時間から何 ms 遅れたかも求める．
+
+使い方:
+  python loop_timing.py 0615_12.csv 0615_13.csv --stall-ms 2000 --frame 2419...3B
+  python loop_timing.py *.csv --json timing.json   # ファームウェア変更前後の比較用
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from firmware_model import decode_data
+from logparser import BINARY_MAGIC, file_boots, load_log
+
+PERCENTILES = (50, 90, 99, 99.9)
+HISTOGRAM_EDGES_MS = (0, 50, 100, 200, 500, 1000, 1500, 2000, 3000, 5000, 10000)
+
+# ctrlValve() の状態遷移と，その遷移を待つ設定値
+TRANSITIONS = (
+    ("exhaust_open", "V2EXH", 1, "exhaustStartDelayMs"),
+    ("exhaust_close", "V2EXH", 0, "exhaustStopDelayMs"),
+    ("supply_open", "V1SUP", 1, "supplyStartDelayMs"),
+    ("supply_close", "V1SUP", 0, "supplyStopDelayMs"),
+)
+
+
+# ------------------------------------------------------------
+# 1 ファイル分の解析
+# ------------------------------------------------------------
+def guess_log_mode(path, data, ctrl):
+    """書かれている列から logMode を推定する（CTRL が無いのは 2/3 か，単に操作が無かったか）"""
+    with open(path, "rb") as f:
+        if f.read(len(BINARY_MAGIC)) == BINARY_MAGIC:
+            return "4"
+    has_gps = bool(np.isfinite(data["LAT"]).any())
+    if len(ctrl["time_ms"]):
+        return "0" if has_gps else "1"
+    return "0/2" if has_gps else "1/3"
+
+
+def loop_periods(data):
+    """
+    隣り合う DATA 行の timeNowMs の差
+    @return (周期, 各周期の終わりの行番号)．millis() が戻った所（再起動）は除く
+    """
+    periods = np.diff(data["time_ms"])
+    rows = np.arange(1, len(data["time_ms"]))
+    keep = np.isfinite(periods) & (periods >= 0)
+    return periods[keep], rows[keep]
+
+
+def transition_lateness(ctrl, config, boot):
+    """
+    CTRL 行からバルブ操作を取り出し，直前の操作から設定の待ち時間を引いた遅れ [ms] を返す
+    ctrlValve() は dt > delay で動くので，遅れの下限は 1 ループ分になる
+    @param boot CTRL 行の起動番号（logparser.file_boots()）．起動をまたぐ 2 つの操作は比べない
+    """
+    time_ms = ctrl["time_ms"]
+    events = []  # (起動, 時刻, 遷移名)
+    for name, column, opened, _ in TRANSITIONS:
+        state = ctrl[column]
+        changed = np.flatnonzero((state[1:] != state[:-1]) & (state[1:] == opened)) + 1
+        if len(state) and state[0] == opened:
+            changed = np.concatenate(([0], changed))
+        events.extend((int(boot[i]), time_ms[i], name) for i in changed)
+    events.sort()
+
+    delays = {name: config[key] for name, _, _, key in TRANSITIONS}
+    lateness = {name: [] for name, _, _, _ in TRANSITIONS}
+    for (previous_boot, previous, _), (current_boot, current, name) in zip(events, events[1:]):
+        if current_boot == previous_boot:
+            lateness[name].append(current - previous - delays[name])
+    return {name: np.array(values) for name, values in lateness.items()}
+
+
+# ------------------------------------------------------------
+# 集計
+# ------------------------------------------------------------
+def summarize(values):
+    if len(values) == 0:
+        return {"count": 0}
+    summary = {"count": int(len(values)), "mean": float(values.mean()), "max": float(values.max())}
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{p:g}"] = float(value)
+    return summary
+
+
+def histogram(periods):
+    edges = np.array(HISTOGRAM_EDGES_MS + (np.inf,))
+    counts, _ = np.histogram(periods, bins=edges)
+    return {f"{int(low)}-{'' if high == np.inf else int(high)}": int(count)
+            for low, high, count in zip(edges[:-1], edges[1:], counts)}
+
+
+def analyze(paths, stall_ms=2000.0, config=None):
+    """
+    ログファイル群を解析して結果の辞書（JSON にできる形）を返す
+    @param config firmware_model.decode_data() の結果．None ならバルブの遅れは求めない
+    """
+    all_periods = []
+    groups = {}  # (logMode, GPS fix, CTRL) -> 周期のリスト
+    stalls = []
+    lateness = {name: [] for name, _, _, _ in TRANSITIONS}
+
+    for path in paths:
+        data, ctrl = load_log(path, row_numbers=True)
+        mode = guess_log_mode(path, data, ctrl)
+        periods, rows = loop_periods(data)
+        all_periods.append(periods)
+
+        has_fix = (np.nan_to_num(data["SATNUM"]) > 0)[rows]
+        # その周期の間（前の行の後〜この行まで）に CTRL 行があったか．timeNowMs は再起動で
+        # 戻るので，時刻ではなくファイルの中の順番（"row"）で探す
+        ctrl_index = np.searchsorted(ctrl["row"], data["row"], side="right")
+        has_ctrl = (ctrl_index[rows] - ctrl_index[rows - 1]) > 0
+
+        for fix in (False, True):
+            for event in (False, True):
+                selected = periods[(has_fix == fix) & (has_ctrl == event)]
+                if len(selected):
+                    key = (mode, fix, event)
+                    groups.setdefault(key, []).append(selected)
+
+        for i in np.flatnonzero(periods > stall_ms):
+            stalls.append({
+                "file": os.path.basename(path),
+                "time_ms": float(data["time_ms"][rows[i]]),
+                "period_ms": float(periods[i]),
+                "log_mode": mode,
+                "gps_fix": bool(has_fix[i]),
+                "ctrl": bool(has_ctrl[i]),
+            })
+
+        if config is not None:
+            for name, values in transition_lateness(ctrl, config, file_boots(data, ctrl)[1]).items():
+                lateness[name].append(values)
+
+    periods = np.concatenate(all_periods) if all_periods else np.empty(0)
+    result = {
+        "files": len(paths),
+        "period_ms": summarize(periods),
+        "histogram_ms": histogram(periods),
+        "stall_ms": stall_ms,
+        "stalls": stalls,
+        "groups": [
+            {"log_mode": mode, "gps_fix": fix, "ctrl": event, **summarize(np.concatenate(values))}
+            for (mode, fix, event), values in sorted(groups.items())
+        ],
+    }
+    if config is not None:
+        result["valve_lateness_ms"] = {
+            name: summarize(np.concatenate(values) if values else np.empty(0))
+            for name, values in lateness.items()
+        }
+    return result
+
+
+# ------------------------------------------------------------
+# 表示
+# ------------------------------------------------------------
+def _format_summary(summary):
+    if not summary["count"]:
+        return "n=0"
+    return (f"n={summary['count']} mean={summary['mean']:.0f} "
+            + " ".join(f"p{p:g}={summary[f'p{p:g}']:.0f}" for p in PERCENTILES)
+            + f" max={summary['max']:.0f}")
+
+
+def print_report(result):
+    print(f"Loop period [ms]: {_format_summary(result['period_ms'])}")
+    for label, count in result["histogram_ms"].items():
+        print(f"  {label:>10}: {count}")
+
+    print("By logMode / GPS fix / CTRL:")
+    for group in result["groups"]:
+        print(f"  logMode {group['log_mode']:<4} fix={'yes' if group['gps_fix'] else 'no ':<3} "
+              f"ctrl={'yes' if group['ctrl'] else 'no ':<3} {_format_summary(group)}")
+
+    print(f"Stalls over {result['stall_ms']:g} ms: {len(result['stalls'])}")
+    for stall in result["stalls"][:20]:
+        print(f"  {stall['file']} @{stall['time_ms']:.0f}: {stall['period_ms']:.0f} ms "
+              f"(logMode {stall['log_mode']}, fix={stall['gps_fix']}, ctrl={stall['ctrl']})")
+    if len(result["stalls"]) > 20:
+        print(f"  ... {len(result['stalls']) - 20} more")
+
+    if "valve_lateness_ms" in result:
+        print("Valve transition lateness vs configured delay [ms]:")
+        for name, summary in result["valve_lateness_ms"].items():
+            print(f"  {name:<14} {_format_summary(summary)}")
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="loop_timing", description="Loop period and stall analysis of Triton-Lite logs")
+    parser.add_argument("logs", nargs="+", help="log files written by handleSDcard()")
+    parser.add_argument("--stall-ms", type=float, default=2000.0, help="report periods longer than this")
+    parser.add_argument("--frame", help="config frame (hex) the logs were recorded with, for valve lateness")
+    parser.add_argument("--json", help="also write the result as JSON (for comparing firmware versions)")
+    args = parser.parse_args(argv)
+
+    config = None
+    if args.frame:
+        config = decode_data(bytes.fromhex(args.frame.strip()))
+    result = analyze(args.logs, args.stall_ms, config)
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+機体ごとの設定を並べたフリートマニフェスト（CSV / YAML）の読み込み
+
+1 行 1 機体．device 列に機体名（USB シリアル番号やポート名）を書き，
+残りの列に frame.CONFIG_FIELDS の設定値を書く．
+year〜second の列は省略でき，省略した場合は読み込み側で時刻を補う．
+
+device,sup_start,sup_stop,exh_start,exh_stop,lcd_mode,log_mode,dive_count,press_threshold
+TL-01,30,6000,30,3000,0,0,10,0
+
+YAML（PyYAML が必要）は device をキーにした辞書，または device を含む辞書のリスト．
+
+TL-01: {sup_start: 30, sup_stop: 6000, exh_start: 30, exh_stop: 3000,
+        lcd_mode: 0, log_mode: 0, dive_count: 10, press_threshold: 0}
+"""
+
+import csv
+import hashlib
+
+from frame import CLOCK_FIELDS, CONFIG_FIELDS, FIELD_LIMITS
+
+
+def validate_row(row):
+    """1 行分の値を検査して (設定値の辞書, エラーメッセージのリスト) を返す"""
+    params = {}
+    errors = []
+    for key in CONFIG_FIELDS + CLOCK_FIELDS:
+        raw = row.get(key)
+        text = "" if raw is None else str(raw).strip()
+        if not text:
+            if key in CONFIG_FIELDS:
+                errors.append(f"{key}: missing")
+            continue
+        try:
+            value = int(text)
+        except ValueError:
+            errors.append(f"{key}: {text!r} is not an integer")
+            continue
+        low, high = FIELD_LIMITS[key]
+        if not low <= value <= high:
+            errors.append(f"{key}: {value} is out of range {low}-{high}")
+            continue
+        params[key] = value
+    return params, errors
+
+
+def _read_yaml(path):
+    try:
+        import yaml
+    except ImportError:
+        raise ValueError("PyYAML is required to read YAML manifests (pip install pyyaml)")
+    with open(path, encoding="utf-8") as f:
+        document = yaml.safe_load(f) or []
+    if isinstance(document, dict):
+        return [dict(fields or {}, device=device) for device, fields in document.items()]
+    if not isinstance(document, list) or not all(isinstance(row, dict) for row in document):
+        raise ValueError("YAML manifest must be a mapping or a list of mappings")
+    return document
+
+
+def read_rows(path):
+    """拡張子で CSV と YAML を判別して行の辞書のリストを返す"""
+    if path.lower().endswith((".yaml", ".yml")):
+        return _read_yaml(path), "entry", 1
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f)), "line", 2
+
+
+def load_manifest(path):
+    """
+    マニフェストを読み込み，全行を検査してから [(device, 設定値の辞書), ...] を返す
+    1 行でも不正があれば，全行分のエラーをまとめて ValueError にする
+    """
+    rows, unit, first = read_rows(path)
+
+    entries = []
+    errors = []
+    seen = set()
+    for line_no, row in enumerate(rows, start=first):
+        device = "" if row.get("device") is None else str(row["device"]).strip()
+        if not device:
+            errors.append(f"{unit} {line_no}: device: missing")
+        elif device in seen:
+            errors.append(f"{unit} {line_no}: device: duplicate {device!r}")
+        seen.add(device)
+
+        params, row_errors = validate_row(row)
+        errors.extend(f"{unit} {line_no}: {message}" for message in row_errors)
+        entries.append((device, params))
+
+    if errors:
+        raise ValueError("Invalid manifest:\n" + "\n".join(errors))
+    return entries
+
+
+def config_hash(params):
+    """時刻を除いた設定値のハッシュ．同じ設定なら機体やフレームの時刻に関係なく一致する"""
+    text = ";".join(f"{key}={params.get(key)}" for key in CONFIG_FIELDS)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
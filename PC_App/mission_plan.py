@@ -0,0 +1,279 @@
+"""
+設定フレームから ctrlValve() が動かすバルブの予定（タイムライン）と任務時間を求める
+
+ctrlValve() は起動時（setup() の最後）からの経過で次の 4 つを繰り返し，
+1 巡ごとに divedCount を増やして diveCount に達したら止まる（0 なら止まらない）．
+  排気弁を開く（exhaustStartDelayMs = exh_start s）→ 閉じる（exhaustStopDelayMs = exh_stop ms）
+  → 給気弁を開く（supplyStartDelayMs = sup_start s）→ 閉じる（supplyStopDelayMs = sup_stop ms）
+各操作は前の操作（最初は起動）からの経過が待ち時間を「超えた」最初のループで起きるので，
+1 操作ごとに loop_ms（既定は 1 ms．実際のループ周期を与えると現実に近い）を足す．
+センシングモード（IR リモコン）に入るのが遅れた場合，そこまでに過ぎた待ち時間は
+待たずに最初の操作が起きる（--start-after）．
+
+待ち時間は decodeData() と同じ型で計算する．32768 以上の値は符号拡張されて
+約 49.7 日の待ちになる点も含めて再現し，長すぎる待ち・止まらない設定などは警告にする．
+候補の設定を列の配列で与えると，まとめて（1 回の配列演算で）評価する．
+
+使い方:
+  python mission_plan.py --frame 2419...3B [--loop-ms 100] [--start-after 60] [--all]
+  python mission_plan.py --manifest fleet.csv
+  python mission_plan.py --frame 2419...3B --sweep exh_start=10:600:10 --sweep dive_count=1:50 --csv plans.csv
+"""
+
+import argparse
+import csv
+
+import numpy as np
+
+from frame import CONFIG_FIELDS, FIELD_LIMITS, decode_hex
+
+# ctrlValve() の状態 0〜3 の順の操作 (名前, バルブ, 開閉, 待ち時間の設定, 秒単位か)
+STEPS = (
+    ("exhaust open", "V2EXH", 1, "exh_start", True),
+    ("exhaust close", "V2EXH", 0, "exh_stop", False),
+    ("supply open", "V1SUP", 1, "sup_start", True),
+    ("supply close", "V1SUP", 0, "sup_stop", False),
+)
+LONG_START_S = 3600
+MAX_MISSION_H = 12.0
+
+# 警告（ビットの並び）
+FLAG_NAMES = ("unlimited dives", "sign-extended delay", "long start delay", "zero open time", "long mission")
+UNLIMITED, SIGN_EXTENDED, LONG_START, ZERO_OPEN, LONG_MISSION = (1 << i for i in range(len(FLAG_NAMES)))
+
+
+# ------------------------------------------------------------
+# 待ち時間と予定（設定の列をまとめて計算する）
+# ------------------------------------------------------------
+def config_columns(params_list):
+    """設定値の辞書のリストを列の配列の辞書にする"""
+    return {key: np.array([params[key] for params in params_list], dtype=np.int64) for key in CONFIG_FIELDS}
+
+
+def firmware_delays(columns):
+    """
+    decodeData() が計算する待ち時間 [ms]．d[n] << 8 は 16 bit の int なので，
+    0x8000 以上は uint32_t にするときに符号拡張される
+    @return 状態 0〜3 の順の配列のリスト
+    """
+    delays = []
+    for _, _, _, key, seconds in STEPS:
+        value = columns[key]
+        value = np.where(value >= 0x8000, value - 0x10000, value) & 0xFFFFFFFF
+        delays.append((value * 1000) & 0xFFFFFFFF if seconds else value)
+    return delays
+
+
+def plan(columns, loop_ms=1.0, start_after_s=0.0, long_start_s=LONG_START_S, max_mission_h=MAX_MISSION_H):
+    """
+    @return 列の辞書
+      first_ms   : 最初の操作（排気弁を開く）の時刻（起動から）
+      cycle_ms   : 1 ダイブ（4 操作）の長さ
+      mission_ms : 最後のダイブの給気弁を閉じる時刻（diveCount 0 は inf）
+      flags      : 警告のビット（FLAG_NAMES）
+    """
+    steps = [delay + loop_ms for delay in firmware_delays(columns)]
+    dives = columns["dive_count"]
+    first = np.maximum(steps[0], start_after_s * 1000)
+    cycle = sum(steps)
+    mission = first + steps[1] + steps[2] + steps[3] + (dives - 1) * cycle
+    mission = np.where(dives == 0, np.inf, mission)
+
+    flags = np.zeros(len(dives), dtype=np.int64)
+    flags |= np.where(dives == 0, UNLIMITED, 0)
+    wrapped = np.zeros(len(dives), dtype=bool)
+    for _, _, _, key, _ in STEPS:
+        wrapped |= columns[key] >= 0x8000
+    flags |= np.where(wrapped, SIGN_EXTENDED, 0)
+    flags |= np.where((columns["exh_start"] > long_start_s) | (columns["sup_start"] > long_start_s), LONG_START, 0)
+    flags |= np.where((columns["exh_stop"] == 0) | (columns["sup_stop"] == 0), ZERO_OPEN, 0)
+    flags |= np.where(np.isfinite(mission) & (mission > max_mission_h * 3600 * 1000), LONG_MISSION, 0)
+    return {"first_ms": first, "cycle_ms": cycle, "mission_ms": mission, "flags": flags}
+
+
+def timeline(params, loop_ms=1.0, start_after_s=0.0, max_dives=None):
+    """
+    1 つの設定の全操作
+    @param max_dives 並べるダイブ数の上限（diveCount 0 のときは必ず与える）
+    @return [(起動からの時刻 ms, ダイブ番号, 操作名, バルブ, 開閉), ...]
+    """
+    dives = params["dive_count"] or max_dives
+    if max_dives is not None:
+        dives = min(dives, max_dives)
+    steps = np.array([delay[0] for delay in firmware_delays(config_columns([params]))], dtype=np.float64) + loop_ms
+    times = np.cumsum(np.tile(steps, dives))
+    times += max(0.0, start_after_s * 1000 - steps[0])
+    return [(float(t), i // len(STEPS) + 1, *STEPS[i % len(STEPS)][:3]) for i, t in enumerate(times)]
+
+
+# ------------------------------------------------------------
+# 表示
+# ------------------------------------------------------------
+def format_duration(ms):
+    if not np.isfinite(ms):
+        return "unlimited"
+    seconds = ms / 1000
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    text = f"{int(hours)}:{int(minutes):02d}:{seconds:06.3f}"
+    return f"{int(days)}d {text}" if days else text
+
+
+def warnings(params, flags, long_start_s=LONG_START_S, max_mission_h=MAX_MISSION_H):
+    """1 つの設定の警告の文のリスト"""
+    messages = []
+    if flags & UNLIMITED:
+        messages.append("dive_count is 0: the valves keep cycling until the battery or gas runs out")
+    if flags & SIGN_EXTENDED:
+        keys = [key for _, _, _, key, _ in STEPS if params[key] >= 0x8000]
+        messages.append(f"{', '.join(keys)} >= 32768 is sign-extended by decodeData(): "
+                        "the board waits about 49.7 days")
+    if flags & LONG_START:
+        keys = [key for key in ("exh_start", "sup_start") if params[key] > long_start_s]
+        messages.append(", ".join(f"{key} = {params[key]} s ({format_duration(params[key] * 1000)})" for key in keys)
+                        + f" is longer than {long_start_s} s")
+    if flags & ZERO_OPEN:
+        keys = [key for key in ("exh_stop", "sup_stop") if params[key] == 0]
+        messages.append(f"{', '.join(keys)} is 0 ms: the valve is open for a single loop only")
+    if flags & LONG_MISSION:
+        messages.append(f"mission is longer than {max_mission_h:g} h")
+    return messages
+
+
+def describe(params, loop_ms=1.0, start_after_s=0.0, long_start_s=LONG_START_S, max_mission_h=MAX_MISSION_H):
+    """1 つの設定の概要と警告（winapp.py の送信前の表示にも使う）"""
+    result = plan(config_columns([params]), loop_ms, start_after_s, long_start_s, max_mission_h)
+    dives = params["dive_count"]
+    lines = [
+        f"First exhaust at {format_duration(result['first_ms'][0])}, "
+        f"{dives or 'unlimited'} dives x {format_duration(result['cycle_ms'][0])}, "
+        f"mission ends at {format_duration(result['mission_ms'][0])}"
+    ]
+    return lines, warnings(params, int(result["flags"][0]), long_start_s, max_mission_h)
+
+
+def print_timeline(params, args):
+    shown = params["dive_count"] or 3
+    events = timeline(params, args.loop_ms, args.start_after, shown)
+    head = events if args.all or shown <= 3 else events[:2 * len(STEPS)]
+    for t, dive, name, valve, opened in head:
+        print(f"  {format_duration(t):>16}  dive {dive:3d}  {name:13s} {valve} {'open' if opened else 'close'}")
+    if len(head) < len(events):
+        print(f"  ... ({len(events) - len(head) - len(STEPS)} more events)")
+        for t, dive, name, valve, opened in events[-len(STEPS):]:
+            print(f"  {format_duration(t):>16}  dive {dive:3d}  {name:13s} {valve} {'open' if opened else 'close'}")
+
+
+# ------------------------------------------------------------
+# 候補の設定
+# ------------------------------------------------------------
+def parse_sweep(text):
+    """ "key=start:stop[:step]"（stop を含む）-> (key, 値の配列) """
+    key, _, spec = text.partition("=")
+    if key not in CONFIG_FIELDS:
+        raise ValueError(f"unknown field in --sweep: {key!r}")
+    parts = [int(part) for part in spec.split(":")]
+    if len(parts) not in (2, 3):
+        raise ValueError(f"--sweep {text!r}: expected key=start:stop[:step]")
+    start, stop, step = parts[0], parts[1], parts[2] if len(parts) == 3 else 1
+    low, high = FIELD_LIMITS[key]
+    if step <= 0 or not low <= start <= stop <= high:
+        raise ValueError(f"--sweep {text!r}: values must be increasing within {low}-{high}")
+    return key, np.arange(start, stop + 1, step)
+
+
+def sweep_columns(base, sweeps):
+    """base の設定から sweeps の全組み合わせの列を作る"""
+    grids = np.meshgrid(*[values for _, values in sweeps], indexing="ij")
+    count = grids[0].size
+    columns = {key: np.full(count, base[key], dtype=np.int64) for key in CONFIG_FIELDS}
+    for (key, _), grid in zip(sweeps, grids):
+        columns[key] = grid.ravel().astype(np.int64)
+    return columns
+
+
+def write_csv(path, columns, result, labels=None):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow((["device"] if labels else []) + list(CONFIG_FIELDS)
+                        + ["first_s", "cycle_s", "mission_s", "warnings"])
+        for i in range(len(result["flags"])):
+            flags = int(result["flags"][i])
+            writer.writerow(([labels[i]] if labels else []) + [int(columns[key][i]) for key in CONFIG_FIELDS] + [
+                f"{result['first_ms'][i] / 1000:.3f}", f"{result['cycle_ms'][i] / 1000:.3f}",
+                "" if not np.isfinite(result["mission_ms"][i]) else f"{result['mission_ms'][i] / 1000:.3f}",
+                ";".join(name for bit, name in enumerate(FLAG_NAMES) if flags >> bit & 1),
+            ])
+
+
+def print_batch(columns, result, labels=None):
+    flags = result["flags"]
+    finite = np.isfinite(result["mission_ms"])
+    print(f"{len(flags)} configs, {int((flags == 0).sum())} without warnings")
+    if finite.any():
+        print(f"Mission: {format_duration(result['mission_ms'][finite].min())} - "
+              f"{format_duration(result['mission_ms'][finite].max())}")
+    for bit, name in enumerate(FLAG_NAMES):
+        flagged = np.flatnonzero(flags >> bit & 1)
+        if len(flagged):
+            examples = ", ".join(labels[i] for i in flagged[:5]) if labels else ""
+            print(f"  {name}: {len(flagged)}" + (f" ({examples}{', ...' if len(flagged) > 5 else ''})" if examples else ""))
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="mission_plan", description="Valve timeline and mission duration of a config")
+    parser.add_argument("--frame", help="config frame (hex)")
+    parser.add_argument("--manifest", help="CSV/YAML fleet manifest; evaluates every device")
+    parser.add_argument("--sweep", action="append", metavar="FIELD=START:STOP[:STEP]",
+                        help="evaluate all combinations around --frame, repeatable")
+    parser.add_argument("--loop-ms", type=float, default=1.0, help="loop period added to every valve step")
+    parser.add_argument("--start-after", type=float, default=0.0, help="seconds from boot until sensing mode starts")
+    parser.add_argument("--long-start-s", type=int, default=LONG_START_S, help="warn above this start delay")
+    parser.add_argument("--max-mission-h", type=float, default=MAX_MISSION_H, help="warn above this mission length")
+    parser.add_argument("--all", action="store_true", help="list every event of the timeline")
+    parser.add_argument("--csv", help="write one row per config to this file (manifest / sweep)")
+    args = parser.parse_args(argv)
+
+    options = (args.loop_ms, args.start_after, args.long_start_s, args.max_mission_h)
+    try:
+        base = decode_hex(args.frame.strip()) if args.frame else None
+        if args.manifest:
+            from manifest import load_manifest
+
+            entries = load_manifest(args.manifest)
+            labels = [device for device, _ in entries]
+            columns = config_columns([params for _, params in entries])
+        elif args.sweep:
+            if base is None:
+                parser.error("--sweep needs --frame as the base config")
+            labels = None
+            columns = sweep_columns(base, [parse_sweep(text) for text in args.sweep])
+        elif base is None:
+            parser.error("either --frame or --manifest is required")
+    except ValueError as e:
+        print(f"Error: {e}")
+        return False
+
+    if args.manifest or args.sweep:
+        result = plan(columns, *options)
+        print_batch(columns, result, labels)
+        if args.csv:
+            write_csv(args.csv, columns, result, labels)
+            print(f"Written: {args.csv}")
+        return not result["flags"].any()
+
+    print_timeline(base, args)
+    lines, messages = describe(base, *options)
+    for line in lines:
+        print(line)
+    for message in messages:
+        print(f"Warning: {message}")
+    return not messages
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() is not False else 1)
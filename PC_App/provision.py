@@ -0,0 +1,196 @@
+"""
+保存済みの設定を読み出して比較し，時刻以外に違いがあるときだけ書き込む
+
+使い方:
+  python provision.py COM3 --sup_start 30 --sup_stop 6000 --exh_start 30 --exh_stop 3000 \\
+      --lcd_mode 0 --log_mode 0 --dive_count 10 --press_threshold 0
+  python provision.py --manifest fleet.csv --jobs 8 --log results.jsonl
+  --check-only で比較だけ，--force で違いが無くても書き込む
+  --trace trace.jsonl / --prom provision.prom で機体ごと・段階ごとの所要時間を記録する（spans.py）
+  --capture session.trcp で全機体の送受信のバイトを記録する（capture.py）
+
+マニフェストは全行を先に検査し，1 行でも不正があれば何も書き込まない．
+機体ごとに設定のハッシュ（manifest.config_hash）を保存済みの設定と比べ，
+違う機体だけに書き込む．結果は 1 機体 1 行の JSON で --log に追記する．
+"""
+
+import argparse
+import datetime
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import capture
+import spans
+from device import config_diff, open_port, read_stored_frame, resolve_port, send_frame_acked, stored_params
+from frame import CLOCK_FIELDS, CONFIG_FIELDS, FIELD_LIMITS, encode_frame
+from manifest import config_hash, load_manifest
+
+
+# ------------------------------------------------------------
+# 1 台分の処理
+# ------------------------------------------------------------
+def write_config(ser, desired):
+    """
+    現在時刻を付けて書き込み，読み出して時刻以外が一致することを確かめる
+    @return 送信の試行の記録のリスト（device.send_frame_acked()）
+    """
+    dt_now = datetime.datetime.now()
+    params = dict(desired)
+    for key in CLOCK_FIELDS:
+        params[key] = getattr(dt_now, key)
+    _, attempts = send_frame_acked(ser, encode_frame(**params))
+
+    remaining = config_diff(stored_params(read_stored_frame(ser)), desired)
+    if remaining:
+        raise RuntimeError(f"Readback after write still differs: {remaining}")
+    return attempts
+
+
+def provision_device(ser, desired, force=False, check_only=False):
+    """
+    @return ("unchanged" | "differs" | "written", 差分の辞書)
+    """
+    stored = stored_params(read_stored_frame(ser))
+    diff = config_diff(stored, desired)
+    if not diff and not force:
+        return "unchanged", diff
+    if check_only:
+        return "differs", diff
+    write_config(ser, desired)
+    return "written", diff
+
+
+def format_diff(diff):
+    return ", ".join(f"{key}: {old} -> {new}" for key, (old, new) in diff.items())
+
+
+# ------------------------------------------------------------
+# マニフェストによる一括処理
+# ------------------------------------------------------------
+def provision_entry(device, desired, force=False, check_only=False, ports=None):
+    """1 機体分を処理して結果ログの 1 行（辞書）を返す．例外は結果に記録する"""
+    result = {"device": device, "port": None, "hash": config_hash(desired)}
+    started = time.monotonic()
+    with spans.span("provision.device", device=device) as span:
+        _provision_entry(result, device, desired, force, check_only, ports)
+        span.set(status=result["status"])
+    result["elapsed_s"] = round(time.monotonic() - started, 3)
+    result["time"] = datetime.datetime.now().isoformat(timespec="seconds")
+    return result
+
+
+def _provision_entry(result, device, desired, force, check_only, ports):
+    try:
+        port = resolve_port(device, ports)
+        if port is None:
+            raise RuntimeError("device not connected")
+        result["port"] = port
+
+        ser = open_port(port)
+        try:
+            stored = stored_params(read_stored_frame(ser))
+            result["stored_hash"] = None if stored is None else config_hash(stored)
+            if result["stored_hash"] == result["hash"] and not force:
+                result["status"] = "unchanged"
+            else:
+                diff = config_diff(stored, desired)
+                result["diff"] = {key: list(values) for key, values in diff.items()}
+                if check_only:
+                    result["status"] = "differs"
+                else:
+                    attempts = write_config(ser, desired)
+                    result["attempts"] = [{key: a[key] for key in ("attempt", "status", "echo_s", "rtt_s")}
+                                          for a in attempts]
+                    result["status"] = "written"
+        finally:
+            ser.close()
+            result["link"] = ser.metrics()
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+
+
+def provision_manifest(path, jobs=4, force=False, check_only=False, log_path=None):
+    """
+    マニフェストの全機体を並列に処理する（ボードごとのリセット待ちが重ならないようにする）
+    @return 結果の辞書のリスト
+    """
+    entries = load_manifest(path)  # 全行を検査してから接続を始める
+
+    import serial.tools.list_ports
+    with spans.span("ports.enumerate"):
+        ports = serial.tools.list_ports.comports()
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = [
+            pool.submit(provision_entry, device, params, force, check_only, ports)
+            for device, params in entries
+        ]
+        results = []
+        for future in futures:
+            result = future.result()
+            results.append(result)
+            line = f"{result['device']}: {result['status']}"
+            if result.get("diff"):
+                line += f" ({format_diff(result['diff'])})"
+            if result.get("error"):
+                line += f" ({result['error']})"
+            print(line)
+
+    if log_path:
+        with open(log_path, "a", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+    return results
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a Triton-Lite config only when it differs from the stored one")
+    parser.add_argument("port", nargs="?", help="serial port (single device mode)")
+    for key in CONFIG_FIELDS:
+        low, high = FIELD_LIMITS[key]
+        parser.add_argument(f"--{key}", type=int, help=f"{low}-{high}")
+    parser.add_argument("--manifest", help="CSV/YAML fleet manifest (batch mode)")
+    parser.add_argument("--jobs", type=int, default=4, help="devices provisioned in parallel (batch mode)")
+    parser.add_argument("--log", help="append per-device JSON lines results to this file (batch mode)")
+    parser.add_argument("--force", action="store_true", help="write even if nothing differs")
+    parser.add_argument("--check-only", action="store_true", help="compare without writing")
+    parser.add_argument("--trace", help="append span/event timings to this JSON lines file")
+    parser.add_argument("--prom", help="write span histograms in Prometheus text format to this file on exit")
+    parser.add_argument("--capture", help="append raw TX/RX bytes of every device to this file")
+    args = parser.parse_args()
+    spans.enable(args.trace, args.prom)
+    capture.enable(args.capture)
+
+    if args.manifest:
+        try:
+            results = provision_manifest(args.manifest, args.jobs, args.force, args.check_only, args.log)
+        except ValueError as e:
+            print(f"Error: {e}")
+            raise SystemExit(1)
+        counts = {}
+        for result in results:
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+        print(", ".join(f"{status}: {count}" for status, count in sorted(counts.items())))
+        raise SystemExit(1 if counts.get("error") else 0)
+
+    if args.port is None:
+        parser.error("either a port or --manifest is required")
+    desired = {key: getattr(args, key) for key in CONFIG_FIELDS}
+    for key, value in desired.items():
+        low, high = FIELD_LIMITS[key]
+        if value is None:
+            parser.error(f"--{key} is required in single device mode")
+        if not low <= value <= high:
+            parser.error(f"--{key} must be between {low} and {high}")
+
+    ser = open_port(args.port)
+    try:
+        status, diff = provision_device(ser, desired, args.force, args.check_only)
+    finally:
+        ser.close()
+    print(f"{args.port}: {status}" + (f" ({format_diff(diff)})" if diff else ""))
@@ -0,0 +1,209 @@
+"""
+長いログを素早く表示するための，列ごとの min/max/mean ピラミッド
+
+colstore の列キャッシュの中に，2^k 行ずつまとめた値を段ごとに置く．
+  <ログ名>.cols/pyramid/meta.json       : 元の行数と段数
+  <ログ名>.cols/pyramid/<k>/<列名>.min.f8  (.max / .mean も同様)
+
+表示範囲と画素数を与えると，バケット数が画素数の 1〜2 倍になる段から
+その範囲のバケットだけを memmap で読むので，読む量は画素数に比例する．
+NaN（logMode で出力されない列など）は集計から除き，全部 NaN のバケットは NaN になる．
+
+使い方:
+  python pyramid.py archive/TL-01/*.csv --column POUT_DEPTH --pixels 1200 [--plot depth.png]
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from colstore import cache_dir_for, load_columns, load_log_cached, save_columns
+
+PYRAMID_DIR = "pyramid"
+STATS = ("min", "max", "mean")
+SKIP_COLUMNS = ("time_ms", "rtc")
+
+
+# ------------------------------------------------------------
+# 作成
+# ------------------------------------------------------------
+def _halve(low, high, total, count):
+    """隣り合う 2 バケットをまとめる（奇数個なら最後は 1 つだけのバケット）"""
+    if len(low) % 2:
+        low, high = np.append(low, np.nan), np.append(high, np.nan)
+        total, count = np.append(total, 0.0), np.append(count, 0)
+    return (
+        np.fmin(low[0::2], low[1::2]),
+        np.fmax(high[0::2], high[1::2]),
+        total[0::2] + total[1::2],
+        count[0::2] + count[1::2],
+    )
+
+
+def build_levels(values):
+    """
+    1 列分のピラミッドを作る
+    @return [(min, max, mean), ...]．i 番目が 2^(i+1) 行ずつの段
+    """
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values)
+    low = high = values
+    total = np.where(finite, values, 0.0)
+    count = finite.astype(np.int64)
+
+    levels = []
+    while len(low) > 1:
+        low, high, total, count = _halve(low, high, total, count)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / count, np.nan)
+        levels.append((low, high, mean))
+    return levels
+
+
+def pyramid_dir(cache_dir):
+    return os.path.join(cache_dir, PYRAMID_DIR)
+
+
+def build_pyramid(cache_dir, table="data"):
+    """キャッシュの全列についてピラミッドを作り直す"""
+    columns = load_columns(os.path.join(cache_dir, table))
+    rows = len(columns["time_ms"])
+    depth = 0
+    for name, values in columns.items():
+        if name in SKIP_COLUMNS:
+            continue
+        levels = build_levels(values)
+        depth = len(levels)
+        for k, stats in enumerate(levels, start=1):
+            save_columns(os.path.join(pyramid_dir(cache_dir), str(k)),
+                         {f"{name}.{stat}": array for stat, array in zip(STATS, stats)})
+    with open(os.path.join(pyramid_dir(cache_dir), "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"rows": rows, "levels": depth}, f)
+
+
+def read_pyramid_meta(cache_dir):
+    try:
+        with open(os.path.join(pyramid_dir(cache_dir), "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def open_log(log_path):
+    """
+    列キャッシュとピラミッドを（無いか古ければ作って）開く
+    @return (キャッシュのディレクトリ, DATA の列辞書（memmap）, ピラミッドの段数)
+    """
+    data, _ = load_log_cached(log_path)
+    cache_dir = cache_dir_for(log_path)
+    meta = read_pyramid_meta(cache_dir)
+    if meta is None or meta["rows"] != len(data["time_ms"]):
+        build_pyramid(cache_dir)
+        meta = read_pyramid_meta(cache_dir)
+    return cache_dir, data, meta["levels"]
+
+
+# ------------------------------------------------------------
+# 範囲の問い合わせ
+# ------------------------------------------------------------
+def choose_level(span, pixels, levels):
+    """バケット数が画素数の 1〜2 倍に収まる一番粗い段（0 は元の行）"""
+    level = 0
+    while level < levels and span / (1 << (level + 1)) >= pixels:
+        level += 1
+    return level
+
+
+def query_rows(cache_dir, data, levels, column, start, stop, pixels):
+    """
+    行 [start, stop) を画素数 pixels 程度に縮めた値
+    @return {"row": バケット先頭の行, "min", "max", "mean"}．段 0 なら 3 つとも元の値
+    """
+    start, stop = max(0, start), min(len(data[column]), stop)
+    if stop <= start:
+        return {"row": np.empty(0, dtype=np.int64), **{stat: np.empty(0) for stat in STATS}}
+    level = choose_level(stop - start, pixels, levels)
+    if level == 0:
+        values = np.asarray(data[column][start:stop])
+        return {"row": np.arange(start, stop), **{stat: values for stat in STATS}}
+
+    first, last = start >> level, -(-stop >> level)
+    arrays = load_columns(os.path.join(pyramid_dir(cache_dir), str(level)),
+                          [f"{column}.{stat}" for stat in STATS])
+    result = {"row": np.arange(first, last) << level}
+    for stat in STATS:
+        result[stat] = np.asarray(arrays[f"{column}.{stat}"][first:last])
+    return result
+
+
+def query_time(log_path, column, start_ms=None, stop_ms=None, pixels=1000):
+    """
+    timeNowMs の範囲 [start_ms, stop_ms) で問い合わせ，各バケットの先頭時刻を time_ms に付けて返す
+    （millis() が戻ったログは時刻が単調でないので，行で問い合わせる query_rows() を使う）
+    """
+    cache_dir, data, levels = open_log(log_path)
+    time_ms = data["time_ms"]
+    start = 0 if start_ms is None else int(np.searchsorted(time_ms, start_ms, side="left"))
+    stop = len(time_ms) if stop_ms is None else int(np.searchsorted(time_ms, stop_ms, side="left"))
+    result = query_rows(cache_dir, data, levels, column, start, stop, pixels)
+    result["time_ms"] = np.asarray(time_ms[result["row"]]) if len(result["row"]) else np.empty(0)
+    return result
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="pyramid", description="Min/max/mean overview of long Triton-Lite logs")
+    parser.add_argument("logs", nargs="+")
+    parser.add_argument("--column", default="POUT_DEPTH")
+    parser.add_argument("--pixels", type=int, default=1000, help="width of the view (shared by all logs)")
+    parser.add_argument("--start-ms", type=float, help="timeNowMs range (single log)")
+    parser.add_argument("--stop-ms", type=float)
+    parser.add_argument("--plot", help="save a min/max band plot (needs matplotlib)")
+    args = parser.parse_args(argv)
+
+    opened = [(path, *open_log(path)) for path in args.logs]
+    total_rows = sum(len(data["time_ms"]) for _, _, data, _ in opened) or 1
+
+    results = []
+    for path, cache_dir, data, levels in opened:
+        if args.column not in data:
+            parser.error(f"unknown column {args.column!r}")
+        pixels = max(1, args.pixels * len(data["time_ms"]) // total_rows)
+        result = query_time(path, args.column, args.start_ms, args.stop_ms, pixels)
+        results.append((path, result))
+        finite = np.isfinite(result["mean"])
+        summary = (f"min {np.nanmin(result['min']):.2f} max {np.nanmax(result['max']):.2f}"
+                   if finite.any() else "no values")
+        print(f"{path}: {len(data['time_ms'])} rows -> {len(result['row'])} buckets, {summary}")
+
+    if args.plot:
+        try:
+            import matplotlib
+        except ImportError:
+            print("Error: matplotlib is required for --plot (pip install matplotlib)")
+            return False
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+
+        fig, ax = plt.subplots(figsize=(12, 4))
+        offset = 0
+        for path, result in results:
+            x = offset + np.arange(len(result["row"]))
+            ax.fill_between(x, result["min"], result["max"], alpha=0.3, step="post")
+            ax.plot(x, result["mean"], linewidth=0.8, label=os.path.basename(path))
+            offset += len(result["row"])
+        ax.set_xlabel("bucket")
+        ax.set_ylabel(args.column)
+        if args.column == "POUT_DEPTH":
+            ax.invert_yaxis()
+        ax.legend(fontsize="small")
+        fig.savefig(args.plot, dpi=100, bbox_inches="tight")
+        print(f"Saved {args.plot}")
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() is not False else 1)
@@ -0,0 +1,273 @@
+"""
+記録したログ（handleSDcard() が書いたテキスト）を仮想シリアルポート（Linux の pty）から
+速さを変えて送り直す．ダッシュボードや anomaly.py などの受信側を海に出ずに試すため
+
+  - 行の間隔は timeNowMs の差に従う（--speed 1 / 10 / 100 / max）．
+    timeNowMs が戻った所（再起動）は間隔 0 で続ける
+  - --jitter-ms で行ごとの揺らぎ（正規分布），--stall-prob / --stall-ms で
+    ときどき起きる長い遅れ（SD カードの書き込みなど）を timeNowMs の時間で足す
+  - 送る時刻になった行はまとめて 1 回の write() で送る（max では BATCH_BYTES ごと）
+  - 受信側が読まずに pty の中が詰まった時間も数え，終わりに実際の行数・バイト数/秒と
+    予定からの遅れを表示する
+
+受信側は表示された /dev/pts/N（--link で決まった名前のリンクも作れる）を開く．
+  python anomaly.py --port /dev/pts/5
+
+使い方:
+  python replay.py 0615_12.csv 0615_13.csv --speed 100 [--jitter-ms 20] [--link /tmp/triton0]
+  python replay.py 0615_12.csv --speed max --stdout | python anomaly.py
+"""
+
+import argparse
+import os
+import random
+import select
+import sys
+import time
+
+from logparser import BINARY_MAGIC
+
+BATCH_BYTES = 64 * 1024
+
+
+# ------------------------------------------------------------
+# 入力と送る時刻
+# ------------------------------------------------------------
+def log_lines(paths):
+    """ログの行をバイト列のまま順に返す（改行で終わるようにそろえる）"""
+    for path in paths:
+        with open(path, "rb") as f:
+            if f.read(len(BINARY_MAGIC)) == BINARY_MAGIC:
+                raise ValueError(f"{path}: binary logs (logMode 4) cannot be replayed as text lines")
+            f.seek(0)
+            for raw in f:
+                yield raw if raw.endswith(b"\n") else raw + b"\n"
+
+
+def line_time_ms(raw):
+    """行の先頭の timeNowMs．数値でなければ None"""
+    try:
+        return int(raw.split(b",", 1)[0])
+    except ValueError:
+        return None
+
+
+class Jitter:
+    """行ごとの遅れ [ms]（timeNowMs の時間）．seed を決めれば毎回同じになる"""
+
+    def __init__(self, sigma_ms=0.0, stall_prob=0.0, stall_ms=0.0, seed=None):
+        self.sigma_ms = sigma_ms
+        self.stall_prob = stall_prob
+        self.stall_ms = stall_ms
+        self.random = random.Random(seed)
+
+    def sample(self):
+        delay = abs(self.random.gauss(0.0, self.sigma_ms)) if self.sigma_ms else 0.0
+        if self.stall_prob and self.random.random() < self.stall_prob:
+            delay += self.stall_ms
+        return delay
+
+
+def schedule(lines, jitter=None):
+    """
+    各行を送る時刻を，最初の行からの timeNowMs の経過 [ms] で返す（揺らぎを足しても単調増加）
+    @return (経過 ms, 行) のイテレータ
+    """
+    elapsed = 0.0
+    due = 0.0
+    previous = None
+    for raw in lines:
+        time_ms = line_time_ms(raw)
+        if time_ms is not None:
+            if previous is not None and time_ms >= previous:
+                elapsed += time_ms - previous
+            previous = time_ms
+        # 遅れた行より前には送らない（後の行は遅れを取り戻すようにまとめて出る）
+        due = max(due, elapsed + jitter.sample() if jitter else elapsed)
+        yield due, raw
+
+
+# ------------------------------------------------------------
+# 出力先
+# ------------------------------------------------------------
+class PtySink:
+    """
+    pty を作り，相手側（/dev/pts/N）を受信側が開けるようにする
+    相手側は自分でも開いたままにするので，受信側が開き直しても切れない
+    link に置き換えてよいのは既存のリンクだけ（普通のファイルやディレクトリなら FileExistsError）
+    """
+
+    def __init__(self, link=None):
+        import tty
+
+        if link and os.path.lexists(link) and not os.path.islink(link):
+            raise FileExistsError(f"{link} exists and is not a symlink")
+        self.master, self.slave = os.openpty()
+        try:
+            tty.setraw(self.slave)  # 改行の変換やエコーをしない
+            os.set_blocking(self.master, False)
+            self.name = os.ttyname(self.slave)
+            self.link = link
+            if link:
+                if os.path.islink(link):
+                    os.remove(link)
+                os.symlink(self.name, link)
+        except OSError:
+            os.close(self.master)
+            os.close(self.slave)
+            raise
+        self.blocked_s = 0.0  # 受信側が読まずに書けなかった時間
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            try:
+                written = os.write(self.master, view)
+            except BlockingIOError:
+                written = 0
+            view = view[written:]
+            if view:
+                started = time.perf_counter()
+                select.select([], [self.master], [], 1.0)
+                self.blocked_s += time.perf_counter() - started
+
+    def unread(self):
+        """受信側がまだ読んでいないバイト数"""
+        import fcntl
+        import struct
+        import termios
+
+        return struct.unpack("i", fcntl.ioctl(self.slave, termios.FIONREAD, b"\0\0\0\0"))[0]
+
+    def close(self, drain_s=2.0):
+        # 閉じると pty に残った分は捨てられるので，受信側が読み終えるまで少し待つ
+        deadline = time.monotonic() + drain_s
+        while self.unread() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        if self.link and os.path.islink(self.link):
+            os.remove(self.link)
+        os.close(self.master)
+        os.close(self.slave)
+
+
+class StdoutSink:
+    name = "stdout"
+    blocked_s = 0.0
+
+    def write(self, data):
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+
+    def close(self):
+        pass
+
+
+# ------------------------------------------------------------
+# 再生
+# ------------------------------------------------------------
+def replay(timed_lines, sink, speed=1.0, batch_bytes=BATCH_BYTES):
+    """
+    @param speed 何倍速か．0 なら待たずに送れるだけ送る
+    @return 集計の辞書
+    """
+    lines = sent = 0
+    max_lag = 0.0
+    log_span_ms = 0.0
+    pending = bytearray()
+    first_due = None
+    blocked_before = sink.blocked_s
+    started = time.perf_counter()
+
+    def flush():
+        nonlocal sent, max_lag, first_due
+        if not pending:
+            return
+        sink.write(pending)
+        if first_due is not None:
+            max_lag = max(max_lag, time.perf_counter() - first_due)
+        sent += len(pending)
+        pending.clear()
+        first_due = None
+
+    for offset_ms, raw in timed_lines:
+        log_span_ms = offset_ms
+        if speed:
+            due = started + offset_ms / 1000 / speed
+            if due > time.perf_counter():
+                flush()
+                remaining = due - time.perf_counter()
+                if remaining > 0:
+                    time.sleep(remaining)
+            if first_due is None:
+                first_due = due
+        pending += raw
+        lines += 1
+        if len(pending) >= batch_bytes:
+            flush()
+    flush()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "lines": lines,
+        "bytes": sent,
+        "elapsed_s": elapsed,
+        "lines_per_s": lines / elapsed if elapsed else 0.0,
+        "bytes_per_s": sent / elapsed if elapsed else 0.0,
+        "speedup": log_span_ms / 1000 / elapsed if elapsed else 0.0,
+        "max_lag_s": max_lag,
+        "blocked_s": sink.blocked_s - blocked_before,
+    }
+
+
+def parse_speed(text):
+    if text == "max":
+        return 0.0
+    speed = float(text)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError("speed must be positive or 'max'")
+    return speed
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="replay", description="Replay Triton-Lite logs through a pseudo-terminal")
+    parser.add_argument("logs", nargs="+")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="1, 10, 100, ... or max")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="std. dev. of per-line delay (log time)")
+    parser.add_argument("--stall-prob", type=float, default=0.0, help="probability of a long delay per line")
+    parser.add_argument("--stall-ms", type=float, default=200.0)
+    parser.add_argument("--seed", type=int, help="random seed for the jitter model")
+    parser.add_argument("--loop", type=int, default=1, help="replay the logs this many times")
+    parser.add_argument("--wait", type=float, default=0.0, help="seconds to wait for consumers before starting")
+    parser.add_argument("--link", help="create a symlink to the pty with this name")
+    parser.add_argument("--stdout", action="store_true", help="write to stdout instead of a pty")
+    args = parser.parse_args(argv)
+
+    try:
+        sink = StdoutSink() if args.stdout else PtySink(args.link)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return False
+    print(f"Replaying to {sink.name}" + (f" ({args.link})" if args.link else ""), file=sys.stderr, flush=True)
+    jitter = Jitter(args.jitter_ms, args.stall_prob, args.stall_ms, args.seed)
+    try:
+        time.sleep(args.wait)
+        for _ in range(args.loop):
+            stats = replay(schedule(log_lines(args.logs), jitter), sink, args.speed)
+            print(f"{stats['lines']} lines, {stats['bytes']} bytes in {stats['elapsed_s']:.2f} s: "
+                  f"{stats['lines_per_s']:.0f} lines/s, {stats['bytes_per_s'] / 1024:.0f} KiB/s, "
+                  f"{stats['speedup']:.1f}x log time, max lag {stats['max_lag_s'] * 1000:.1f} ms, "
+                  f"blocked {stats['blocked_s']:.2f} s", file=sys.stderr)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return False
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        sink.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() is not False else 1)
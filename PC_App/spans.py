@@ -0,0 +1,206 @@
+"""
+シリアル通信の各段階にかかった時間の記録（スパンとイベント）
+
+  with spans.span("port.open", port=port):
+      ...
+  spans.observe("send.wait_echo", 0.097)
+  spans.event("send.attempt", status="ok", rtt_s=0.26)
+
+記録は既定で無効で，そのときの span() / event() はほぼ何もしない（共有の空オブジェクトを返すだけ）．
+有効にすると
+  - JSON lines: 1 スパン／イベント 1 行（開始時刻，所要時間，スレッド，親スパン，属性）
+  - Prometheus のテキスト形式: スパン名ごとのヒストグラムとイベントの回数
+    （node_exporter の textfile collector で読めるよう，一時ファイルから置き換える）
+を書き出す．Prometheus のファイルは終了時（と export_prometheus() を呼んだとき）に書く．
+
+有効にする方法:
+  環境変数 TRITON_TRACE=trace.jsonl / TRITON_PROM=triton.prom（GUI や個別スクリプトでも効く）
+  または python triton.py --trace trace.jsonl --prom triton.prom <サブコマンド> ...
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+
+PROM_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROM_PREFIX = "triton"
+
+
+class _NoSpan:
+    """無効なときに返す何もしないスパン"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Recorder:
+    """記録を JSON lines に書き，Prometheus 用に集計する（スレッドから同時に使える）"""
+
+    def __init__(self, trace_path=None, prom_path=None):
+        self.trace_path = trace_path
+        self.prom_path = prom_path
+        self.lock = threading.Lock()
+        self.out = open(trace_path, "a", encoding="utf-8") if trace_path else None
+        self.histograms = {}  # スパン名 -> [バケットごとの数..., 合計, 回数]
+        self.events = {}  # (イベント名, status) -> 回数
+        self.local = threading.local()
+        self.next_id = 0
+
+    def new_id(self):
+        with self.lock:
+            self.next_id += 1
+            return self.next_id
+
+    def record(self, entry):
+        with self.lock:
+            if entry["type"] == "span":
+                histogram = self.histograms.setdefault(entry["name"], [0] * len(PROM_BUCKETS) + [0.0, 0])
+                for i, bound in enumerate(PROM_BUCKETS):
+                    if entry["duration_s"] <= bound:
+                        histogram[i] += 1
+                histogram[-2] += entry["duration_s"]
+                histogram[-1] += 1
+            else:
+                key = (entry["name"], str(entry["attrs"].get("status", "")))
+                self.events[key] = self.events.get(key, 0) + 1
+            if self.out:
+                self.out.write(json.dumps(entry, default=str) + "\n")
+
+    def prometheus_text(self):
+        name = f"{PROM_PREFIX}_span_duration_seconds"
+        lines = [f"# HELP {name} Duration of instrumented serial tool steps.", f"# TYPE {name} histogram"]
+        with self.lock:
+            for span_name, histogram in sorted(self.histograms.items()):
+                for bound, count in zip(PROM_BUCKETS, histogram):
+                    lines.append(f'{name}_bucket{{span="{span_name}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{span="{span_name}",le="+Inf"}} {histogram[-1]}')
+                lines.append(f'{name}_sum{{span="{span_name}"}} {histogram[-2]:.6f}')
+                lines.append(f'{name}_count{{span="{span_name}"}} {histogram[-1]}')
+            events = f"{PROM_PREFIX}_events_total"
+            lines += [f"# HELP {events} Instrumented serial tool events.", f"# TYPE {events} counter"]
+            for (event_name, status), count in sorted(self.events.items()):
+                lines.append(f'{events}{{event="{event_name}",status="{status}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, path=None):
+        path = path or self.prom_path
+        if not path:
+            return
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(path + ".tmp", path)
+
+    def close(self):
+        self.export_prometheus()
+        if self.out:
+            self.out.close()
+            self.out = None
+
+
+class Span:
+    def __init__(self, recorder, name, attrs):
+        self.recorder = recorder
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = getattr(self.recorder.local, "stack", None)
+        if stack is None:
+            stack = self.recorder.local.stack = []
+        self.parent = stack[-1] if stack else None
+        self.id = self.recorder.new_id()
+        stack.append(self.id)
+        self.wall = time.time()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.started
+        self.recorder.local.stack.pop()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.recorder.record({
+            "type": "span", "name": self.name, "id": self.id, "parent": self.parent,
+            "start": self.wall, "duration_s": duration, "thread": threading.current_thread().name,
+            "attrs": self.attrs,
+        })
+        return False
+
+
+_recorder = None
+
+
+# ------------------------------------------------------------
+# 公開の関数
+# ------------------------------------------------------------
+def enable(trace_path=None, prom_path=None):
+    """記録を始める（どちらのパスも None なら何もしない）"""
+    global _recorder
+    if not trace_path and not prom_path:
+        return
+    disable()
+    _recorder = Recorder(trace_path, prom_path)
+
+
+def disable():
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        _recorder = None
+
+
+def enabled():
+    return _recorder is not None
+
+
+def span(name, **attrs):
+    """with 文で囲んだ区間の所要時間を記録する．無効なら何もしない"""
+    if _recorder is None:
+        return _NO_SPAN
+    return Span(_recorder, name, attrs)
+
+
+def observe(name, duration_s, **attrs):
+    """今終わった区間を，測っておいた所要時間で記録する（with で囲みにくい待ち時間など）"""
+    if _recorder is None:
+        return
+    stack = getattr(_recorder.local, "stack", None)
+    _recorder.record({
+        "type": "span", "name": name, "id": _recorder.new_id(), "parent": stack[-1] if stack else None,
+        "start": time.time() - duration_s, "duration_s": duration_s,
+        "thread": threading.current_thread().name, "attrs": attrs,
+    })
+
+
+def event(name, **attrs):
+    """その時点の出来事を記録する（status 属性は Prometheus のラベルになる）"""
+    if _recorder is None:
+        return
+    stack = getattr(_recorder.local, "stack", None)
+    _recorder.record({
+        "type": "event", "name": name, "parent": stack[-1] if stack else None,
+        "start": time.time(), "thread": threading.current_thread().name, "attrs": attrs,
+    })
+
+
+def export_prometheus(path=None):
+    if _recorder is not None:
+        _recorder.export_prometheus(path)
+
+
+enable(os.environ.get("TRITON_TRACE"), os.environ.get("TRITON_PROM"))
+atexit.register(disable)
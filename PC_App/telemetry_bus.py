@@ -0,0 +1,330 @@
+"""
+1 つのシリアルポートの受信を，同じ PC の複数のプロセスに共有メモリで配る
+
+シリアルポートは 1 つのプロセスしか開けないので，ブローカーがポートを持ち，
+受信した行を 1 回だけ logparser.parse_line() で解析して共有メモリのリングバッファに書く．
+読み手（anomaly.py --bus，記録，表示など）はそれぞれの速さで読み，ブローカーを待たせない．
+本番ファームウェアはセンシング中に DATA / CTRL 行をシリアルに送らないので，実機のポートでは
+待機モードの返事（TEXT）しか流れない．ログ行は replay.py などで再生したものを受ける．
+
+共有メモリ（multiprocessing.shared_memory）の中身
+  ヘッダ : HEADER_DTYPE（最後に書いた記録の番号 head，スロット数，ブローカーの PID，終了フラグ，
+           ブローカーが受信待ちのたびに更新する時刻 heartbeat）
+  スロット: SLOT_DTYPE × slots（番号 seq, 種類, 値（DATA_COLUMNS / CTRL_COLUMNS の順．残りは NaN）, 元の行）
+記録 n は スロット n % slots に入る．書き手は 1 つだけで，スロットの seq を 0 にしてから
+中身を書き，seq = n，head = n の順に更新する．読み手は自分の次の番号から head までを
+NumPy の配列のビュー（コピーしない）で受け取り，使い終わってから seq が変わっていないか
+（書き手に追い越されていないか）を確かめる．追い越された分と，読むのが遅れて
+slots 件以上離された分は lost として数える．
+ブローカーが終了フラグを立てずに止まったときは，heartbeat が STALE_S 秒更新されないことで
+読み手が気づく（Windows では PID でプロセスが生きているかを確かめられない）．
+
+使い方:
+  python telemetry_bus.py broker COM3 [--name triton_bus] [--slots 16384]
+  python telemetry_bus.py tail [--name triton_bus]
+  python telemetry_bus.py record mission.csv [--name triton_bus]   # 受信したログ行をそのまま書く
+  python anomaly.py --bus triton_bus
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from logparser import CTRL_COLUMNS, DATA_COLUMNS, parse_line
+
+DEFAULT_NAME = "triton_bus"
+DEFAULT_SLOTS = 16384
+MAGIC = b"TRBUS1"
+TEXT_BYTES = 256  # handleSDcard() の buf[256]
+POLL_S = 0.02
+STALE_S = 5.0  # heartbeat がこれより古ければブローカーは止まっている
+
+KIND_NAMES = ("TEXT", "DATA", "CTRL")  # TEXT: ログ行でない行（ファームウェアの返事など）
+TEXT, DATA, CTRL = range(len(KIND_NAMES))
+
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"), ("slots", "<u8"), ("head", "<u8"), ("broker_pid", "<u8"),
+    ("started", "<f8"), ("heartbeat", "<f8"), ("closed", "u1"), ("pad", "u1", (15,)),
+])
+SLOT_DTYPE = np.dtype([
+    ("seq", "<u8"), ("kind", "u1"), ("length", "<u2"),
+    ("values", "<f8", (max(len(DATA_COLUMNS), len(CTRL_COLUMNS)),)),
+    ("text", f"S{TEXT_BYTES}"),
+])
+
+
+def _attach(name, create=False, size=0):
+    """
+    共有メモリを開く．読み手が終わるときに消されないよう，作ったプロセス以外は
+    resource_tracker の管理から外す（Python 3.13 からは track=False）
+    """
+    from multiprocessing import resource_tracker, shared_memory
+
+    if create:
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _views(shm):
+    header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)
+    slots = int(header["slots"])
+    ring = np.ndarray((slots,), dtype=SLOT_DTYPE, buffer=shm.buf, offset=HEADER_DTYPE.itemsize)
+    return header, ring
+
+
+def _close(shm):
+    try:
+        shm.close()
+    except BufferError:
+        pass  # 呼び出し側がまだビューを持っている（プロセスの終了時に解放される）
+
+
+def _alive(pid):
+    if os.name == "nt":
+        return True  # Windows の os.kill() はプロセスを終わらせてしまう（共有メモリも残らない）
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _stopped(header):
+    """ブローカーが終わった（終了フラグ，heartbeat が古い，プロセスが無い）"""
+    return (bool(header["closed"]) or time.time() - float(header["heartbeat"]) > STALE_S
+            or not _alive(int(header["broker_pid"])))
+
+
+def _remove_stale(name):
+    """前のブローカーが消さずに終わった共有メモリを消す．まだ動いていれば RuntimeError"""
+    from multiprocessing import shared_memory
+
+    old = shared_memory.SharedMemory(name=name)
+    header = np.ndarray((), dtype=HEADER_DTYPE, buffer=old.buf)
+    pid, stopped = int(header["broker_pid"]), _stopped(header)
+    del header
+    old.close()
+    if not stopped:
+        raise RuntimeError(f"bus {name!r} is already served by process {pid}")
+    old.unlink()
+
+
+# ------------------------------------------------------------
+# 書き手（ブローカー）
+# ------------------------------------------------------------
+class BusWriter:
+    def __init__(self, name=DEFAULT_NAME, slots=DEFAULT_SLOTS):
+        size = HEADER_DTYPE.itemsize + slots * SLOT_DTYPE.itemsize
+        try:
+            self.shm = _attach(name, create=True, size=size)
+        except FileExistsError:
+            _remove_stale(name)
+            self.shm = _attach(name, create=True, size=size)
+        self.name = name
+        self.slots = slots
+        self.head = 0
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        self.header["magic"] = MAGIC
+        self.header["slots"] = slots
+        self.header["broker_pid"] = os.getpid()
+        self.header["started"] = self.header["heartbeat"] = time.time()
+        self.ring = np.ndarray((slots,), dtype=SLOT_DTYPE, buffer=self.shm.buf, offset=HEADER_DTYPE.itemsize)
+
+    def publish(self, kind, values=(), text=b""):
+        self.head += 1
+        slot = self.ring[self.head % self.slots]
+        slot["seq"] = 0
+        slot["kind"] = kind
+        slot["values"] = np.nan
+        slot["values"][:len(values)] = values
+        slot["length"] = min(len(text), TEXT_BYTES)
+        slot["text"] = text[:TEXT_BYTES]
+        slot["seq"] = self.head
+        self.header["head"] = self.head
+
+    def beat(self):
+        self.header["heartbeat"] = time.time()
+
+    def publish_line(self, line, rtc_cache=None):
+        """行を解析して書く（ログ行でなければ TEXT）"""
+        parsed = parse_line(line, rtc_cache)
+        text = line.encode("ascii", errors="replace")
+        if parsed is None:
+            self.publish(TEXT, (), text)
+        else:
+            self.publish(DATA if parsed[0] == "DATA" else CTRL, parsed[1], text)
+
+    def close(self):
+        self.header["closed"] = 1
+        del self.header, self.ring
+        _close(self.shm)
+        self.shm.unlink()
+
+
+def run_broker(port, name=DEFAULT_NAME, slots=DEFAULT_SLOTS, report=print):
+    """ポートから行を受けて配り続ける（Ctrl+C で終わる）"""
+    from device import open_port
+
+    bus = BusWriter(name, slots)
+    ser = open_port(port, reset_wait=0)
+    report(f"Serving {port} on shared memory {name!r} ({slots} slots, {SLOT_DTYPE.itemsize} B each)")
+    rtc_cache = {}
+    buffer = b""  # device.read_lines() は時間切れで途中の行を捨てるので，行の残りはここで持つ
+    try:
+        while True:
+            bus.beat()
+            chunk = ser.read(ser.in_waiting or 1)  # open_port() の timeout（0.1 s）で戻る
+            if not chunk:
+                continue
+            *lines, buffer = (buffer + chunk).split(b"\n")
+            for line in lines:
+                bus.publish_line(line.decode("ascii", errors="replace").strip(), rtc_cache)
+    finally:
+        ser.close()
+        bus.close()
+
+
+# ------------------------------------------------------------
+# 読み手
+# ------------------------------------------------------------
+class BusReader:
+    """
+    poll() で新しい記録を SLOT_DTYPE の配列のビューで受け取る（コピーしない）
+    ビューは slots 件先まで書かれると上書きされるので，使い終わったら intact() で確かめる
+    """
+
+    def __init__(self, name=DEFAULT_NAME, from_start=False):
+        self.shm = _attach(name)
+        self.header, self.ring = _views(self.shm)
+        if self.header["magic"].item() != MAGIC:
+            raise ValueError(f"shared memory {name!r} is not a Triton telemetry bus")
+        self.slots = len(self.ring)
+        head = int(self.header["head"])
+        self.next = max(1, head - self.slots + 1) if from_start else head + 1
+        self.lost = 0
+
+    @property
+    def closed(self):
+        return _stopped(self.header)
+
+    def poll(self, max_records=None):
+        """
+        @return 次の記録からの配列のビュー（リングの終わりで切れるので，全部読むには繰り返す）
+        """
+        head = int(self.header["head"])
+        if head - self.next >= self.slots:
+            # 追いつけなかった分は飛ばす（書き手を待たせない）
+            skipped = head - self.slots + 1 - self.next
+            self.lost += skipped
+            self.next += skipped
+        count = head - self.next + 1
+        if count <= 0:
+            return self.ring[:0]
+        start = self.next % self.slots
+        count = min(count, self.slots - start)
+        if max_records is not None:
+            count = min(count, max_records)
+        view = self.ring[start:start + count]
+        self.next += count
+        return view
+
+    def intact(self, view):
+        """
+        ビューを読んでいる間に上書きされた記録を数える
+        @return 上書きされていなければ True
+        """
+        if not len(view):
+            return True
+        first = self.next - len(view)
+        overwritten = int(np.count_nonzero(view["seq"] != np.arange(first, self.next, dtype=np.uint64)))
+        self.lost += overwritten
+        return overwritten == 0
+
+    def records(self, idle_s=POLL_S):
+        """
+        (種類名, 値のタプル, 行) を順に返す（ブローカーが終わり，読み終えたら止まる）
+        値は parse_line() と同じ並び（DATA_COLUMNS / CTRL_COLUMNS の長さ）
+        """
+        widths = {DATA: len(DATA_COLUMNS), CTRL: len(CTRL_COLUMNS), TEXT: 0}
+        while True:
+            view = self.poll()
+            if not len(view):
+                if self.closed:
+                    return
+                time.sleep(idle_s)
+                continue
+            kinds, values, lengths, texts = view["kind"], view["values"], view["length"], view["text"]
+            batch = [(KIND_NAMES[kind], tuple(values[i, :widths[kind]].tolist()),
+                      texts[i][:lengths[i]].decode("ascii", errors="replace"))
+                     for i, kind in enumerate(kinds.tolist())]
+            seqs = view["seq"].copy()
+            if not self.intact(view):
+                # 読んでいる間に上書きされた記録は捨てる
+                expected = np.arange(self.next - len(view), self.next, dtype=np.uint64)
+                batch = [record for record, ok in zip(batch, seqs == expected) if ok]
+            yield from batch
+
+    def close(self):
+        del self.header, self.ring
+        _close(self.shm)
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="telemetry_bus", description="Share one serial port with many local readers")
+    commands = parser.add_subparsers(dest="command", required=True)
+    broker = commands.add_parser("broker", help="own the port and publish parsed lines")
+    broker.add_argument("port")
+    broker.add_argument("--slots", type=int, default=DEFAULT_SLOTS, help="ring buffer size in records")
+    tail = commands.add_parser("tail", help="print lines from the bus")
+    tail.add_argument("--from-start", action="store_true", help="start with the records still in the ring")
+    record = commands.add_parser("record", help="append received log lines to a file")
+    record.add_argument("output")
+    for command in (broker, tail, record):
+        command.add_argument("--name", default=DEFAULT_NAME, help="shared memory name")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "broker":
+            run_broker(args.port, args.name, args.slots, report=lambda text: print(text, flush=True))
+            return
+        reader = BusReader(args.name, getattr(args, "from_start", False))
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"Error: {e}")
+        return False
+    except KeyboardInterrupt:
+        return
+
+    out = open(args.output, "a", encoding="ascii", errors="replace") if args.command == "record" else None
+    count = 0
+    try:
+        for kind, _, line in reader.records():
+            if out is None:
+                print(f"{kind:4s} {line}", flush=True)
+            elif kind != "TEXT":
+                out.write(line + "\n")
+                count += 1
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    finally:
+        if out:
+            out.close()
+            print(f"{count} lines written to {args.output}", file=sys.stderr)
+        print(f"lost {reader.lost} records", file=sys.stderr)
+        reader.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() is not False else 1)
@@ -0,0 +1,253 @@
+"""
+1 機体分のログファイルを 1 本の単調な時間軸につなぐ
+
+ファイル名（MMDD_HH.csv）は設定を書き込んだときの時刻で決まるので，1 ファイルに
+何度もの起動（timeNowMs が 0 から始まる）が追記されたり，別の日のログと名前が
+重なったりする．また timeNowMs は約 49.7 日で 2^32 から 0 に戻る．
+
+  1. 各ファイルを 1 行ずつ読み，timeNowMs が戻った所で区間（起動 1 回分）に分ける
+     （一周して戻った時刻が直前の行から WRAP_GAP_MS 以内で，両方の行に RTC があれば
+     その差とも合うときだけ一周とみなして 2^32 を足す．約 24.8 日以上動いた後の
+     再起動も 2^31 以上戻るので，戻った量だけでは決めない）
+  2. 区間の最後の有効な RTC から絶対時刻へのずれを決める
+     （RTC が無い区間は同じファイルの直前の区間の直後に置く）
+  3. 内容が同じ区間（同じファイルのコピーなど）は重複として除き，時間が重なる区間を報告する
+  4. 区間を開始順につなぐ．前の区間が覆った時刻までの行は後の区間から捨てる
+     （一部だけ重なるコピーの行が 2 度出ないように．交互には並べない）
+
+どの段階でもファイル全体は読み込まず，メモリは区間の数に比例する．
+出力は "<絶対時刻 ms>,<ファイル名>,<区間番号>,<元の行>" の CSV．
+
+使い方: python timeline.py archive/TL-01/*.csv -o TL-01_timeline.csv
+"""
+
+import argparse
+import hashlib
+import os
+
+from logparser import parse_line
+
+WRAP_MS = 1 << 32
+WRAP_GAP_MS = 60 * 1000  # 一周とみなす，直前の行からの最大の経過時間（ログは 1 秒ごと）
+WRAP_RTC_TOLERANCE_MS = 5000  # RTC の差と経過時間のずれの許容（RTC は秒単位）
+MIN_VALID_RTC = 946684800  # 2000-01-01．GPS で合わせる前の RTC（0000/00/00 など）を除く
+
+
+class Segment:
+    """1 回の起動分の行（ファイル中のバイト範囲）"""
+
+    def __init__(self, path, index, start):
+        self.path = path
+        self.index = index
+        self.start = start  # バイト位置
+        self.end = start
+        self.rows = 0
+        self.first_ms = None
+        self.last_ms = None  # 一周分を足した後の値
+        self.offset_ms = None  # 絶対時刻 [ms] - timeNowMs
+        self.digest = hashlib.sha1()
+        self.status = "ok"
+        self.trimmed = 0  # 前の区間と重なって捨てた行数（merge() で数える）
+
+    @property
+    def anchored(self):
+        return self.offset_ms is not None
+
+    @property
+    def abs_start(self):
+        return self.offset_ms + self.first_ms
+
+    @property
+    def abs_end(self):
+        return self.offset_ms + self.last_ms
+
+    def label(self):
+        return f"{os.path.basename(self.path)}#{self.index}"
+
+
+# ------------------------------------------------------------
+# 1. 区間に分ける
+# ------------------------------------------------------------
+def _valid_rtc(rtc):
+    return rtc == rtc and rtc >= MIN_VALID_RTC
+
+
+def _unwrap(time_ms, previous, wraps, rtc=float("nan"), previous_rtc=float("nan")):
+    """
+    @return (一周分を足した時刻, 一周の回数, 起動し直したか)
+    """
+    if previous is None:
+        return time_ms, wraps, False
+    raw_previous = previous - wraps * WRAP_MS
+    if time_ms < raw_previous:
+        elapsed = time_ms + WRAP_MS - raw_previous  # 一周したとしたときの経過時間
+        wrapped = elapsed <= WRAP_GAP_MS
+        if wrapped and _valid_rtc(rtc) and _valid_rtc(previous_rtc):
+            wrapped = abs((rtc - previous_rtc) * 1000 - elapsed) <= WRAP_RTC_TOLERANCE_MS
+        if not wrapped:
+            return time_ms, 0, True
+        wraps += 1
+    return time_ms + wraps * WRAP_MS, wraps, False
+
+
+def scan_file(path):
+    """ファイルを 1 行ずつ読んで区間のリストを返す"""
+    segments = []
+    segment = None
+    previous = None
+    previous_rtc = float("nan")
+    wraps = 0
+    rtc_cache = {}
+    with open(path, "rb") as f:
+        position = 0
+        for raw in f:
+            line = raw.decode("ascii", errors="replace")
+            parsed = parse_line(line, rtc_cache)
+            start = position
+            position += len(raw)
+            if parsed is None:
+                continue
+            _, values = parsed
+            time_ms, rtc = values[0], values[1]
+            if time_ms != time_ms:
+                continue
+
+            time_ms, wraps, restarted = _unwrap(time_ms, previous, wraps, rtc, previous_rtc)
+            if segment is None or restarted:
+                segment = Segment(path, len(segments), start)
+                segments.append(segment)
+                segment.first_ms = time_ms
+            segment.end = position
+            segment.rows += 1
+            segment.last_ms = time_ms
+            segment.digest.update(raw.rstrip(b"\r\n"))
+            if _valid_rtc(rtc):
+                segment.offset_ms = rtc * 1000 - time_ms
+            previous = time_ms
+            previous_rtc = rtc
+    return segments
+
+
+# ------------------------------------------------------------
+# 2, 3. 時刻合わせと重複・重なりの検出
+# ------------------------------------------------------------
+def anchor_segments(segments):
+    """RTC の無い区間を同じファイルの直前の区間の直後に置く．置けなければ None のまま"""
+    for previous, segment in zip(segments, segments[1:]):
+        if not segment.anchored and previous.anchored and previous.path == segment.path:
+            segment.offset_ms = previous.abs_end + 1 - segment.first_ms
+
+
+def check_segments(segments):
+    """
+    重複（内容が同じ）の区間に status="duplicate"，時刻の無い区間に "unanchored" を付け，
+    重なりを [(区間, 区間, 重なり ms)] で返す
+    """
+    seen = {}
+    for segment in segments:
+        key = (segment.rows, segment.digest.digest())
+        if key in seen:
+            segment.status = "duplicate"
+        else:
+            seen[key] = segment
+        if not segment.anchored:
+            segment.status = "unanchored"
+
+    overlaps = []
+    active = sorted((s for s in segments if s.status == "ok"), key=lambda s: s.abs_start)
+    latest = None
+    for segment in active:
+        if latest is not None and segment.abs_start <= latest.abs_end:
+            overlaps.append((latest, segment, min(latest.abs_end, segment.abs_end) - segment.abs_start))
+        if latest is None or segment.abs_end > latest.abs_end:
+            latest = segment
+    return overlaps
+
+
+# ------------------------------------------------------------
+# 4. つなぐ
+# ------------------------------------------------------------
+def segment_rows(segment):
+    """区間の行を (絶対時刻, 区間ラベル, 行) で順に返す（開くファイルは 1 つ）"""
+    label = segment.label()
+    with open(segment.path, "rb") as f:
+        f.seek(segment.start)
+        previous = None
+        previous_rtc = float("nan")
+        wraps = 0
+        remaining = segment.end - segment.start
+        rtc_cache = {}
+        while remaining > 0:
+            raw = f.readline()
+            if not raw:
+                break
+            remaining -= len(raw)
+            line = raw.decode("ascii", errors="replace").rstrip("\r\n")
+            parsed = parse_line(line, rtc_cache)
+            if parsed is None or parsed[1][0] != parsed[1][0]:
+                continue
+            rtc = parsed[1][1]
+            time_ms, wraps, _ = _unwrap(parsed[1][0], previous, wraps, rtc, previous_rtc)
+            previous = time_ms
+            previous_rtc = rtc
+            yield segment.offset_ms + time_ms, label, line
+
+
+def merge(segments):
+    """
+    status が ok の区間を開始順につないだ行を返す
+    それまでの区間の最後の時刻以前の行（重なった部分）は捨てて segment.trimmed に数える
+    """
+    covered = None
+    for segment in sorted((s for s in segments if s.status == "ok"), key=lambda s: s.abs_start):
+        segment.trimmed = 0
+        limit = covered  # 同じ区間の中では同時刻の行（CTRL 行と DATA 行）も残す
+        for row in segment_rows(segment):
+            if limit is not None and row[0] <= limit:
+                segment.trimmed += 1
+                continue
+            covered = row[0] if covered is None else max(covered, row[0])
+            yield row
+
+
+def build_timeline(paths):
+    """@return (区間のリスト, 重なりのリスト)"""
+    segments = []
+    for path in sorted(paths):
+        segments.extend(scan_file(path))
+    anchor_segments(segments)
+    overlaps = check_segments(segments)
+    return segments, overlaps
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="timeline", description="Stitch one vehicle's logs into a monotonic timeline")
+    parser.add_argument("logs", nargs="+")
+    parser.add_argument("-o", "--output", help="write the merged rows as CSV")
+    args = parser.parse_args(argv)
+
+    segments, overlaps = build_timeline(args.logs)
+    for segment in segments:
+        span = "no RTC" if not segment.anchored else f"{(segment.last_ms - segment.first_ms) / 1000:.0f} s"
+        wrapped = " (millis() wrapped)" if segment.last_ms >= WRAP_MS else ""
+        print(f"{segment.label():<20} {segment.rows:>8} rows  {span}{wrapped}  {segment.status}")
+    for first, second, amount in overlaps:
+        print(f"Overlap: {first.label()} and {second.label()} share {amount / 1000:.0f} s")
+
+    if args.output:
+        count = 0
+        with open(args.output, "w", encoding="ascii", newline="\n") as out:
+            for abs_ms, label, line in merge(segments):
+                out.write(f"{abs_ms:.0f},{label},{line}\n")
+                count += 1
+        for segment in segments:
+            if segment.trimmed:
+                print(f"Trimmed: {segment.trimmed} rows of {segment.label()} already covered by earlier segments")
+        print(f"{count} rows -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""
+シリアル通信の接続先（トランスポート）
+
+device.open_port() はここの open_transport() で接続先を開く．どの接続先も pyserial の
+Serial と同じ read / write / in_waiting / reset_input_buffer / close を持ち，
+Metered で包んで通信量・書き込みから最初の受信までの遅延・エラーを数える．
+
+  COM3, /dev/ttyACM0 : 実機（serial.Serial．開くとボードがリセットされる）
+  loop://             : pyserial のループバック（書いたものがそのまま返る）
+  socket://host:port  : pyserial の TCP 接続（ser2net など）
+  emu://[イメージ]     : プロセス内のエミュレータ（firmware_model で handleEEPROMSerial() を再現）．
+                        EEPROM イメージのファイルを与えると起動時に読み，閉じるときに書き戻す
+  pty://[イメージ]     : pty の向こう側でエミュレータを動かす（OS のシリアル経路を通す．Linux のみ）
+
+emu:// と pty:// は ?baud=N でボーレートに応じた送信時間を再現する（既定は開くときの
+ボーレート，0 で待たない）．実機と違い，開いてもリセット待ちは要らない．
+キャプチャ（capture.py）が有効なら，Metered が送受信したバイトをそのまま記録する．
+
+使い方（接続先ごとの比較）:
+  python transport.py emu:// "emu://?baud=0" loop:// pty:// COM3 --rounds 50
+"""
+
+import argparse
+import os
+import statistics
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import capture
+from firmware_model import EEPROM, handle_serial_line
+
+BITS_PER_BYTE = 10  # 8N1
+EMULATOR_SCHEMES = ("emu", "pty")
+PYSERIAL_SCHEMES = ("loop", "socket", "rfc2217", "spy", "hwgrep", "alt")
+
+
+# ------------------------------------------------------------
+# エミュレータ
+# ------------------------------------------------------------
+class FirmwareEmulator:
+    """待機モードのボード．受け取った行に handleEEPROMSerial() と同じ行を返す"""
+
+    def __init__(self, image_path=None):
+        self.image_path = image_path
+        image = None
+        if image_path and os.path.exists(image_path):
+            with open(image_path, "rb") as f:
+                image = f.read()
+        self.eeprom = EEPROM(image)
+        self.pending = b""
+
+    def feed(self, data):
+        """@return 返す行のバイト列（Serial.println() と同じく CRLF で終わる）"""
+        self.pending += data
+        out = b""
+        while b"\n" in self.pending:
+            line, self.pending = self.pending.split(b"\n", 1)
+            for reply in handle_serial_line(self.eeprom, line.decode("ascii", errors="replace")):
+                out += reply.encode("ascii") + b"\r\n"
+        return out
+
+    def save(self):
+        if self.image_path:
+            with open(self.image_path, "wb") as f:
+                f.write(self.eeprom.data)
+
+
+class EmulatorPort:
+    """
+    プロセス内のエミュレータにつながる Serial 互換のポート
+    baudrate を与えると，送受信とも 1 Byte あたり 10 ビット分の時間をかけて届く
+    """
+
+    def __init__(self, image_path=None, baudrate=None, timeout=None):
+        self.emulator = FirmwareEmulator(image_path)
+        self.byte_s = BITS_PER_BYTE / baudrate if baudrate else 0.0
+        self.timeout = timeout
+        self.is_open = True
+        self._out = bytearray()
+        self._out_start = 0.0  # _out の先頭のバイトが届き始める時刻
+
+    def _available(self, now):
+        if not self.byte_s:
+            return len(self._out)
+        return max(0, min(len(self._out), int((now - self._out_start) / self.byte_s)))
+
+    def write(self, data):
+        now = time.monotonic()
+        reply = self.emulator.feed(bytes(data))
+        if reply:
+            if not self._out:
+                # 送った行が届いてから返事が始まる
+                self._out_start = now + len(data) * self.byte_s
+            self._out += reply
+        return len(data)
+
+    @property
+    def in_waiting(self):
+        return self._available(time.monotonic())
+
+    def read(self, size=1):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            now = time.monotonic()
+            count = min(size, self._available(now))
+            if count:
+                data = bytes(self._out[:count])
+                del self._out[:count]
+                self._out_start += count * self.byte_s
+                return data
+            if deadline is not None and now >= deadline:
+                return b""
+            # 次のバイトが届く時刻（何も無ければタイムアウト）まで待つ
+            if self._out:
+                wake = self._out_start + self.byte_s
+            else:
+                wake = now + 0.01 if deadline is None else deadline
+            if deadline is not None:
+                wake = min(wake, deadline)
+            time.sleep(max(0.0, wake - now))
+
+    def reset_input_buffer(self):
+        self._out.clear()
+
+    def close(self):
+        if self.is_open:
+            self.emulator.save()
+            self.is_open = False
+
+
+class PtyEmulator:
+    """pty を作り，向こう側でエミュレータを動かすスレッド（こちら側は serial.Serial で開く）"""
+
+    def __init__(self, image_path=None, baudrate=None):
+        import tty
+
+        self.emulator = FirmwareEmulator(image_path)
+        self.byte_s = BITS_PER_BYTE / baudrate if baudrate else 0.0
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.name = os.ttyname(self.slave)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        import select
+
+        while self.running:
+            ready, _, _ = select.select([self.master], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                break
+            time.sleep(len(data) * self.byte_s)
+            reply = self.emulator.feed(data)
+            # ボーレートを再現するときは 1 Byte ずつ，その送信時間をかけて書く
+            step = 1 if self.byte_s else len(reply)
+            for i in range(0, len(reply), step or 1):
+                time.sleep(step * self.byte_s)
+                os.write(self.master, reply[i:i + step])
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        self.emulator.save()
+        os.close(self.master)
+        os.close(self.slave)
+
+
+# ------------------------------------------------------------
+# 計測
+# ------------------------------------------------------------
+class Metered:
+    """
+    接続先を包んで計測する（それ以外の属性は中身にそのまま渡す）
+      遅延: 返事を待っている最初の write() から，次にデータを受け取った read() まで
+    """
+
+    def __init__(self, inner, kind, cleanup=None, capture=None, stream=0):
+        self.inner = inner
+        self.kind = kind
+        self._cleanup = cleanup
+        self.capture = capture  # capture.CaptureWriter（無効なら None）
+        self.stream = stream
+        self.opened_at = time.monotonic()
+        self.bytes_written = 0
+        self.bytes_read = 0
+        self.writes = 0
+        self.reads = 0
+        self.empty_reads = 0
+        self.errors = {}
+        self.latencies = []
+        self._write_at = None
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def _error(self, exc):
+        name = type(exc).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+        if self.capture:
+            self.capture.record(capture.ERROR, self.stream, f"{name}: {exc}".encode())
+
+    def write(self, data):
+        started = time.monotonic()
+        try:
+            written = self.inner.write(data)
+        except Exception as e:
+            self._error(e)
+            raise
+        if self.capture:
+            self.capture.record(capture.TX, self.stream, bytes(data))
+        if self._write_at is None:
+            self._write_at = started
+        self.writes += 1
+        self.bytes_written += len(data)
+        return written
+
+    def read(self, size=1):
+        try:
+            data = self.inner.read(size)
+        except Exception as e:
+            self._error(e)
+            raise
+        self.reads += 1
+        if data:
+            if self.capture:
+                self.capture.record(capture.RX, self.stream, data)
+            self.bytes_read += len(data)
+            if self._write_at is not None:
+                self.latencies.append(time.monotonic() - self._write_at)
+                self._write_at = None
+        else:
+            self.empty_reads += 1
+        return data
+
+    @property
+    def in_waiting(self):
+        try:
+            return self.inner.in_waiting
+        except Exception as e:
+            self._error(e)
+            raise
+
+    def reset_input_buffer(self):
+        self.inner.reset_input_buffer()
+
+    def close(self):
+        try:
+            self.inner.close()
+        finally:
+            if self.capture:
+                self.capture.record(capture.CLOSE, self.stream)
+                self.capture = None
+            if self._cleanup:
+                self._cleanup()
+                self._cleanup = None
+
+    def metrics(self):
+        elapsed = time.monotonic() - self.opened_at
+        latencies = sorted(self.latencies)
+        return {
+            "kind": self.kind,
+            "elapsed_s": elapsed,
+            "bytes_written": self.bytes_written,
+            "bytes_read": self.bytes_read,
+            "tx_bytes_per_s": self.bytes_written / elapsed if elapsed else 0.0,
+            "rx_bytes_per_s": self.bytes_read / elapsed if elapsed else 0.0,
+            "latency_samples": len(latencies),
+            "latency_median_s": statistics.median(latencies) if latencies else None,
+            "latency_max_s": latencies[-1] if latencies else None,
+            "empty_reads": self.empty_reads,
+            "errors": dict(self.errors),
+        }
+
+
+def format_metrics(metrics):
+    def ms(value):
+        return "-" if value is None else f"{value * 1000:.1f} ms"
+
+    errors = ", ".join(f"{name} x{count}" for name, count in metrics["errors"].items()) or "none"
+    return (f"{metrics['kind']}: tx {metrics['bytes_written']} B ({metrics['tx_bytes_per_s']:.0f} B/s), "
+            f"rx {metrics['bytes_read']} B ({metrics['rx_bytes_per_s']:.0f} B/s), "
+            f"first byte {ms(metrics['latency_median_s'])} median / {ms(metrics['latency_max_s'])} max "
+            f"({metrics['latency_samples']} samples), errors {errors}")
+
+
+# ------------------------------------------------------------
+# 接続先を開く
+# ------------------------------------------------------------
+def transport_kind(port):
+    """@return "serial" | "emu" | "pty" | pyserial の URL の種類"""
+    scheme = port.split("://", 1)[0] if "://" in port else ""
+    if scheme in EMULATOR_SCHEMES or scheme in PYSERIAL_SCHEMES:
+        return scheme
+    return "serial"
+
+
+def _open_inner(port, kind, baudrate, timeout):
+    """@return (接続先, 閉じた後に呼ぶ関数または None)"""
+    import serial
+
+    if kind in EMULATOR_SCHEMES:
+        url = urlsplit(port)
+        image_path = (url.netloc + url.path) or None
+        query = parse_qs(url.query)
+        emu_baud = int(query["baud"][0]) if "baud" in query else baudrate
+        if kind == "emu":
+            return EmulatorPort(image_path, emu_baud, timeout), None
+        emulator = PtyEmulator(image_path, emu_baud)
+        return serial.Serial(emulator.name, baudrate, timeout=timeout), emulator.stop
+    if kind == "serial":
+        return serial.Serial(port, baudrate, timeout=timeout), None
+    return serial.serial_for_url(port, baudrate, timeout=timeout), None
+
+
+def open_transport(port, baudrate=9600, timeout=0.1):
+    """接続先を開いて Metered で包んで返す（リセット待ちはしない）"""
+    kind = transport_kind(port)
+    inner, cleanup = _open_inner(port, kind, baudrate, timeout)
+    writer = capture.writer()
+    stream = writer.open_stream(port, kind, baudrate) if writer else 0
+    return Metered(inner, kind, cleanup, writer, stream)
+
+
+# ------------------------------------------------------------
+# 接続先ごとの比較
+# ------------------------------------------------------------
+def bench(port, rounds=20, command="R", timeout=3.0):
+    """
+    command を rounds 回送り，1 行返ってくるまでの時間を測る
+    @return (1 行が返るまでの時間のリスト [s], 計測値の辞書)
+    """
+    from device import open_port, read_lines
+
+    ser = open_port(port)
+    round_trips = []
+    try:
+        for _ in range(rounds):
+            started = time.monotonic()
+            ser.write((command + "\n").encode())
+            for _line in read_lines(ser, timeout):
+                round_trips.append(time.monotonic() - started)
+                break
+            ser.reset_input_buffer()
+    finally:
+        ser.close()
+    return round_trips, ser.metrics()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="transport", description="Compare serial transports (latency, throughput, errors)")
+    parser.add_argument("ports", nargs="+", help="COM3, loop://, socket://host:port, emu://, pty://, ...")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--command", default="R", help="line to send each round (default: readback)")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for port in args.ports:
+        try:
+            round_trips, metrics = bench(port, args.rounds, args.command)
+        except Exception as e:
+            print(f"{port}: Error: {e}")
+            failed = True
+            continue
+        line = f"{statistics.median(round_trips) * 1000:.1f} ms median" if round_trips else "no reply"
+        print(f"{port}: {len(round_trips)}/{args.rounds} replies, line round trip {line}")
+        print("  " + format_metrics(metrics))
+    return not failed
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() is not False else 1)
@@ -0,0 +1,264 @@
+"""
+Triton-Lite 用ツールをまとめたコマンドラインツール
+
+  python triton.py encode --sup_start 30 --sup_stop 6000 --exh_start 30 --exh_stop 3000 \\
+      --lcd_mode 0 --log_mode 0 --dive_count 10 --press_threshold 0
+  python triton.py decode 2419...3B [--firmware]   (18 Byte の旧版のフレームも読み，版を "version" で示す)
+  python triton.py send COM3 <encode と同じ設定> [--if-changed] [--metrics]
+  python triton.py sync-time COM3
+  （COM3 の代わりに emu:// などの transport.py の URL も使える）
+  python triton.py ports
+  python triton.py logs 0615_12.csv [--track track.geojson]
+  python triton.py timing 0615_12.csv [--frame 2419...3B]   (loop_timing.py に渡す)
+  python triton.py gas 0615_*.csv --flow V1SUP=0.8 --cylinder-nl 300   (gas_budget.py に渡す)
+  python triton.py calibrate archive/*/*.csv --profiles profiles.json   (calibration.py に渡す)
+  python triton.py anomaly 0615_12.csv | --port COM3   (anomaly.py に渡す)
+  python triton.py overview archive/TL-01/*.csv --column POUT_DEPTH   (pyramid.py に渡す)
+  python triton.py timeline archive/TL-01/*.csv -o TL-01_timeline.csv   (timeline.py に渡す)
+  python triton.py archive dives trials.db --min-depth 10 --pressurized (archive_db.py に渡す)
+  python triton.py follow "bench/*.csv"   (follow.py に渡す)
+  python triton.py replay 0615_12.csv --speed 100 --link /tmp/triton0   (replay.py に渡す．Linux のみ)
+  python triton.py link emu:// pty:// COM3 --rounds 50   (transport.py に渡す)
+  python triton.py scan capture.txt dumps/*.eep   (frame_scan.py に渡す)
+  python triton.py plan --frame 2419...3B [--sweep exh_start=10:600:10]   (mission_plan.py に渡す)
+  python triton.py --trace trace.jsonl --prom triton.prom send COM3 ...
+  （各段階の所要時間を記録する．spans.py を参照）
+  python triton.py --capture session.trcp send COM3 ...   (送受信のバイトを記録する．capture.py を参照)
+  python triton.py capture emulate session.trcp   (capture.py に渡す)
+  python triton.py bus broker COM3   (telemetry_bus.py に渡す．anomaly --bus などで受信を共有する)
+  python triton.py dives 0615_12.csv [--csv dives.csv]   (dive_detect.py に渡す．水深だけでダイブを見つける)
+
+起動を速くするため，pyserial・NumPy などはそのサブコマンドを実行するときだけ読み込む．
+encode / decode は標準ライブラリと frame.py だけで動く．
+"""
+
+import argparse
+import datetime
+import json
+import sys
+
+import capture
+import spans
+from frame import CLOCK_FIELDS, CONFIG_FIELDS, FIELD_LIMITS
+
+
+# ------------------------------------------------------------
+# 引数の共通処理
+# ------------------------------------------------------------
+def add_config_arguments(parser):
+    for key in CONFIG_FIELDS:
+        low, high = FIELD_LIMITS[key]
+        parser.add_argument(f"--{key}", type=int, required=True, help=f"{low}-{high}")
+
+
+def config_from_args(parser, args):
+    desired = {}
+    for key in CONFIG_FIELDS:
+        low, high = FIELD_LIMITS[key]
+        value = getattr(args, key)
+        if not low <= value <= high:
+            parser.error(f"--{key} must be between {low} and {high}")
+        desired[key] = value
+    return desired
+
+
+def with_clock(params, when=None):
+    if when is None:
+        when = datetime.datetime.now()
+    params = dict(params)
+    for key in CLOCK_FIELDS:
+        params[key] = getattr(when, key)
+    return params
+
+
+# ------------------------------------------------------------
+# サブコマンド
+# ------------------------------------------------------------
+def cmd_encode(parser, args):
+    from frame import encode_hex
+
+    when = datetime.datetime.fromisoformat(args.time) if args.time else None
+    print(encode_hex(**with_clock(config_from_args(parser, args), when)))
+
+
+def cmd_decode(parser, args):
+    from frame import decode_frame_any
+
+    texts = args.frames or [line.strip() for line in sys.stdin if line.strip()]
+    failed = False
+    for text in texts:
+        try:
+            if args.firmware:
+                from firmware_model import EEPROM, receive_line
+                status, result = receive_line(EEPROM(), text)
+                result = {"status": status, **(result or {})}
+            else:
+                version, params = decode_frame_any(bytes.fromhex(text))
+                result = {"version": version, **params}
+        except ValueError as e:
+            result = {"error": str(e)}
+            failed = True
+        print(json.dumps(result))
+    return not failed
+
+
+def cmd_send(parser, args):
+    from device import open_port
+    from provision import format_diff, provision_device, write_config
+
+    desired = config_from_args(parser, args)
+    ser = open_port(args.port)
+    try:
+        if args.if_changed:
+            status, diff = provision_device(ser, desired)
+            print(f"{args.port}: {status}" + (f" ({format_diff(diff)})" if diff else ""))
+        else:
+            attempts = write_config(ser, desired)
+            print(f"{args.port}: written")
+            if args.metrics:
+                from device import format_attempts
+                print(format_attempts(attempts))
+    finally:
+        ser.close()
+        if args.metrics:
+            from transport import format_metrics
+            print(format_metrics(ser.metrics()))
+
+
+def cmd_sync_time(parser, args):
+    """保存済みの設定をそのまま，現在時刻を付けて送り直す"""
+    from device import open_port, read_stored_frame, stored_params
+    from provision import write_config
+
+    ser = open_port(args.port)
+    try:
+        stored = stored_params(read_stored_frame(ser))
+        if stored is None:
+            print(f"{args.port}: no valid config stored; use 'send' first")
+            return False
+        write_config(ser, {key: stored[key] for key in CONFIG_FIELDS})
+        print(f"{args.port}: clock set to {datetime.datetime.now():%Y-%m-%d %H:%M:%S}")
+    finally:
+        ser.close()
+
+
+def cmd_ports(parser, args):
+    import serial.tools.list_ports
+
+    with spans.span("ports.enumerate"):
+        ports = serial.tools.list_ports.comports()
+    if not ports:
+        print("No COM ports found.")
+    for port in ports:
+        print(f"{port.device}\t{port.serial_number or '-'}\t{port.description}")
+
+
+def cmd_logs(parser, args):
+    import numpy as np
+    from logparser import load_log
+
+    for path in args.logs:
+        data, ctrl = load_log(path)
+        time_ms = data["time_ms"]
+        span = (time_ms[-1] - time_ms[0]) / 1000 if len(time_ms) else 0.0
+        # logMode 1/3 は LAT などを書かない．2/3 は CTRL 行を書かない
+        has_gps = bool(np.isfinite(data["LAT"]).any())
+        print(f"{path}: {len(time_ms)} DATA rows, {len(ctrl['time_ms'])} CTRL rows, {span:.0f} s, "
+              f"GPS {'yes' if has_gps else 'no'}")
+
+    if args.track:
+        from gps_track import build_track, write_geojson
+
+        parts = [load_log(path)[0] for path in args.logs]
+        data = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+        track = build_track(data)
+        write_geojson(track, args.track)
+        print(f"{track['source_points']} fixes -> {len(track['lat'])} points: {args.track}")
+
+
+# 個別のスクリプトに引数をそのまま渡すサブコマンド {名前: (モジュール, 説明)}
+DELEGATED = {
+    "timing": ("loop_timing", "loop period, stall and valve lateness analysis of logs"),
+    "gas": ("gas_budget", "valve open time, gas consumption and endurance estimate"),
+    "calibrate": ("calibration", "recompute internal pressure and pressurization with new calibration"),
+    "anomaly": ("anomaly", "streaming leak / stuck valve detection on log lines"),
+    "overview": ("pyramid", "min/max/mean overview of long logs from a precomputed pyramid"),
+    "timeline": ("timeline", "stitch one vehicle's logs into a monotonic timeline"),
+    "archive": ("archive_db", "SQLite archive of many logs"),
+    "follow": ("follow", "append new lines of growing logs to their column caches"),
+    "replay": ("replay", "replay logs through a pseudo-terminal at 1x-100x or max speed"),
+    "link": ("transport", "compare serial transports (real, loop://, socket://, pty://, emu://)"),
+    "scan": ("frame_scan", "decode 18/20-byte config frames in captures and EEPROM dumps"),
+    "plan": ("mission_plan", "valve timeline, mission duration and config warnings"),
+    "capture": ("capture", "inspect and replay raw serial captures (info, parse, emulate, pty)"),
+    "bus": ("telemetry_bus", "share one serial port with local readers over shared memory"),
+    "dives": ("dive_detect", "find dives from POUT_DEPTH alone (logMode 2/3 logs without CTRL rows)"),
+}
+
+
+def cmd_delegate(parser, args, rest):
+    import importlib
+
+    module = importlib.import_module(DELEGATED[args.command][0])
+    return module.main(rest)
+
+
+# ------------------------------------------------------------
+# 実行ブロック
+# ------------------------------------------------------------
+def build_parser():
+    parser = argparse.ArgumentParser(prog="triton", description="Triton-Lite command line tools")
+    parser.add_argument("--trace", help="append span/event timings to this JSON lines file")
+    parser.add_argument("--prom", help="write span histograms in Prometheus text format to this file on exit")
+    parser.add_argument("--capture", help="append raw TX/RX bytes of every serial connection to this file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    encode = commands.add_parser("encode", help="print the hex frame for a config")
+    add_config_arguments(encode)
+    encode.add_argument("--time", help="clock to embed (ISO format, default: now)")
+    encode.set_defaults(func=cmd_encode)
+
+    decode = commands.add_parser("decode", help="decode hex frames (arguments or stdin) to JSON lines")
+    decode.add_argument("frames", nargs="*")
+    decode.add_argument("--firmware", action="store_true", help="show how the firmware would interpret the frame")
+    decode.set_defaults(func=cmd_decode)
+
+    send = commands.add_parser("send", help="write a config to a board and verify it by readback")
+    send.add_argument("port")
+    add_config_arguments(send)
+    send.add_argument("--if-changed", action="store_true", help="skip the write if only the clock differs")
+    send.add_argument("--metrics", action="store_true", help="print link throughput, latency and error counts")
+    send.set_defaults(func=cmd_send)
+
+    sync_time = commands.add_parser("sync-time", help="resend the stored config with the current clock")
+    sync_time.add_argument("port")
+    sync_time.set_defaults(func=cmd_sync_time)
+
+    ports = commands.add_parser("ports", help="list serial ports")
+    ports.set_defaults(func=cmd_ports)
+
+    logs = commands.add_parser("logs", help="summarize SD card logs")
+    logs.add_argument("logs", nargs="+")
+    logs.add_argument("--track", help="also write a simplified GPS track as GeoJSON")
+    logs.set_defaults(func=cmd_logs)
+
+    for name, (_, description) in DELEGATED.items():
+        delegated = commands.add_parser(name, help=description, add_help=False)
+        delegated.set_defaults(func=cmd_delegate)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, rest = parser.parse_known_args(argv)
+    spans.enable(args.trace, args.prom)
+    capture.enable(args.capture)
+    if args.func is cmd_delegate:
+        return cmd_delegate(parser, args, rest) is not False
+    if rest:
+        parser.error("unrecognized arguments: " + " ".join(rest))
+    return args.func(parser, args) is not False
+
+
+if __name__ == "__main__":
+    raise SystemExit(0 if main() else 1)
@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import messagebox
 import customtkinter as ctk
 import datetime
+import threading
 
 # ------------------------------------------------------------
 # カラーパレット (CSSの:root変数を参考に)
@@ -80,6 +81,8 @@ class EncoderApp(ctk.CTk):
         self.configure(fg_color=COLORS["bg_dark"])
 
         self.is_connected = False # 接続状態
+        self.serial_port = None # device.open_port() の戻り値 (transport.Metered)
+        self.port_var = tk.StringVar(value="COM3") # COM ポート名または emu:// などの URL
         self.entries = {}
         self.current_encoded_data_var = tk.StringVar(value="エンコードデータがここに表示されます")
 
@@ -140,6 +143,14 @@ class EncoderApp(ctk.CTk):
         controls_frame.pack(fill="x", padx=24, pady=(0,20))
         controls_frame.grid_columnconfigure((0,1), weight=1)
 
+        # COM3, /dev/ttyACM0 のほか, loop:// や emu:// (エミュレータ) も指定できる
+        self.port_entry = ctk.CTkEntry(
+            controls_frame, textvariable=self.port_var,
+            font=ctk.CTkFont(family="Roboto Mono", size=14), fg_color=COLORS["bg_input"],
+            border_color=COLORS["border"], text_color=COLORS["text_primary"], height=36
+        )
+        self.port_entry.grid(row=1, column=0, columnspan=2, pady=(10,0), sticky="ew")
+
         self.connect_btn = ctk.CTkButton(
             controls_frame, text="🔌 Connect", command=self.toggle_connection,
             font=ctk.CTkFont(family="Roboto", size=14, weight="bold"),
@@ -369,25 +380,65 @@ class EncoderApp(ctk.CTk):
                 self.add_to_console(f"Encoding Error: {e}", COLORS["error"])
 
     def toggle_connection(self):
-        self.is_connected = not self.is_connected
+        if self.is_connected:
+            self._close_port()
+            self._set_connected(False)
+            return
+        port = self.port_var.get().strip()
+        self.connect_btn.configure(state="disabled", text="🔌 Connecting...")
+        self.add_to_console(f"Opening {port} (waiting for the board to reset)...")
+        threading.Thread(target=self._open_port, args=(port,), daemon=True).start()
+
+    def _open_port(self, port):
+        # ボードのリセット待ちで画面が止まらないよう別スレッドで開き, 結果は after() で戻す
+        import spans
+        from device import open_port
+        try:
+            with spans.span("gui.connect", port=port):
+                ser = open_port(port)
+        except Exception as e:
+            self.after(0, self._connect_failed, port, e)
+            return
+        self.after(0, self._connected, ser)
+
+    def _connected(self, ser):
+        self.serial_port = ser
+        self._set_connected(True)
+        self.add_to_console(f"Connected to {self.port_var.get().strip()} ({ser.kind}).")
+
+    def _connect_failed(self, port, error):
+        self.connect_btn.configure(state="normal", text="🔌 Connect")
+        self.add_to_console(f"Error: Could not open {port}: {error}", COLORS["error"])
+
+    def _close_port(self):
+        if self.serial_port is not None:
+            from transport import format_metrics
+            self.serial_port.close()
+            self.add_to_console(format_metrics(self.serial_port.metrics()), COLORS["text_secondary"])
+            self.serial_port = None
+
+    def _set_connected(self, connected):
+        self.is_connected = connected
         if self.is_connected:
             self.status_dot.configure(fg_color=COLORS["accent"])
             self.status_label.configure(text="Connected")
             self.connect_btn.configure(state="disabled", text="🔌 Connected")
             self.disconnect_btn.configure(state="normal")
             self.send_btn.configure(state="normal")
+            self.port_entry.configure(state="disabled")
             for _key, (_var, _min, _max, _last_valid, widget) in self.entries.items():
                 widget.configure(state="normal")
-            self.add_to_console("Device connected (simulated). Parameters enabled.")
+            self.add_to_console("Parameters enabled.")
         else:
             self.status_dot.configure(fg_color=COLORS["error"])
             self.status_label.configure(text="Disconnected")
             self.connect_btn.configure(state="normal", text="🔌 Connect")
             self.disconnect_btn.configure(state="disabled")
             self.send_btn.configure(state="disabled")
+            self.port_entry.configure(state="normal")
             for _key, (_var, _min, _max, _last_valid, widget) in self.entries.items():
                 widget.configure(state="disabled")
-            self.add_to_console("Device disconnected (simulated). Parameters disabled.")
+            self.add_to_console("Device disconnected. Parameters disabled.")
         self.update_encoded_data_display() # Update display based on state
 
     def send_data_action(self):
@@ -399,11 +450,52 @@ class EncoderApp(ctk.CTk):
         if "Error" in encoded_data or not encoded_data:
             self.add_to_console("Error: Invalid data to send.", COLORS["error"])
             return
-            
+
+        if not self._confirm_mission_plan(encoded_data):
+            self.add_to_console("Send cancelled.", COLORS["warning"])
+            return
+
         self.add_to_console(f"Sending data: {encoded_data}")
-        # ここで実際のシリアル送信処理を実装する
-        # 例: self.serial_port.write(bytes.fromhex(encoded_data))
-        self.add_to_console("Data sent successfully (simulated).")
+        self.send_btn.configure(state="disabled")
+        threading.Thread(target=self._send_frame, args=(bytes.fromhex(encoded_data),), daemon=True).start()
+
+    def _confirm_mission_plan(self, encoded_data):
+        # 送る前にバルブの予定を表示し, 警告があれば送るかどうか確かめる
+        from frame import decode_hex
+        from mission_plan import describe, format_duration, timeline
+        params = decode_hex(encoded_data)
+        for t, dive, name, valve, opened in timeline(params, max_dives=1):
+            self.add_to_console(f"Plan: +{format_duration(t)} {name} ({valve} {'open' if opened else 'close'})")
+        lines, messages = describe(params)
+        for line in lines:
+            self.add_to_console(f"Plan: {line}")
+        for message in messages:
+            self.add_to_console(f"Warning: {message}", COLORS["warning"])
+        if not messages:
+            return True
+        return messagebox.askyesno("Check the mission plan", "\n\n".join(messages) + "\n\nSend anyway?")
+
+    def _send_frame(self, frame):
+        import spans
+        from device import send_frame_acked
+        try:
+            with spans.span("gui.send"):
+                lines, attempts = send_frame_acked(self.serial_port, frame)
+        except Exception as e:
+            self.after(0, self._send_done, None, None, e)
+            return
+        self.after(0, self._send_done, lines, attempts, None)
+
+    def _send_done(self, lines, attempts, error):
+        if self.is_connected:
+            self.send_btn.configure(state="normal")
+        if error is not None:
+            self.add_to_console(f"Error: {error}", COLORS["error"])
+            return
+        from device import format_attempts
+        for line in lines:
+            self.add_to_console(line)
+        self.add_to_console(f"Data sent and verified ({format_attempts(attempts)}).", COLORS["accent"])
 
     def add_to_console(self, message, color=None):
         self.console_output.configure(state="normal") # Enable writing